@@ -0,0 +1,184 @@
+# Brandon Reyes Parra
+
+
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import subprocess
+import tempfile
+import time
+from contextlib import redirect_stdout
+from datetime import datetime
+from io import StringIO
+
+import mock_api
+import pokemon_collection
+import tcg_calculation
+import yugioh_collection
+from db_manager import connect
+from synthetic_db import generate_db
+from tcg_stats import clear_stats_cache
+from yearly_summary import install_summary
+
+CALCULATIONS = [
+    "calculate_pokemon_total_per_year",
+    "calculate_pokemon_sets_per_year",
+    "calculate_yugioh_total_per_year",
+    "calculate_yugioh_sets_per_year",
+    "joining_tables",
+    "calculate_average_cards_per_set",
+    "calculate_set_size_distribution",
+]
+
+
+def _timed(func, *args, repeat=1, **kwargs):
+    # Best of `repeat` runs, collector/report prints are swallowed
+    best = None
+    for _ in range(repeat):
+        with redirect_stdout(StringIO()):
+            start = time.perf_counter()
+            func(*args, **kwargs)
+            elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def bench_ingest(workdir, set_count):
+    """
+    Time both collectors' fetch_and_insert_data against the local mock API.
+
+    Returns:
+        dict: {benchmark name: seconds}
+    """
+    server, base_url = mock_api.start_server(mock_api.make_pokemon_sets(set_count), mock_api.make_yugioh_sets(set_count))
+    path = os.path.join(workdir, "ingest.db")
+    if os.path.exists(path):
+        os.remove(path)
+    results = {}
+    try:
+        with redirect_stdout(StringIO()):
+            conn = connect(path)
+            pokemon_collection.initialize_db(conn)
+            yugioh_collection.initialize_db(conn)
+        pages = (set_count + 24) // 25
+
+        def pokemon_pages():
+            for page in range(1, pages + 1):
+                pokemon_collection.fetch_and_insert_data(conn, "", page, base_url=f"{base_url}/v2")
+
+        def yugioh_pages():
+            for page in range(1, pages + 1):
+                yugioh_collection.fetch_and_insert_data(conn, page, 25, f"{base_url}/api/v7")
+
+        results["ingest.pokemon.fetch_and_insert_data"] = _timed(pokemon_pages)
+        with tempfile.TemporaryDirectory() as cache_dir:
+            # Keep the benchmark's cache entries out of the real one
+            cwd = os.getcwd()
+            os.chdir(cache_dir)
+            try:
+                results["ingest.yugioh.fetch_and_insert_data"] = _timed(yugioh_pages)
+            finally:
+                os.chdir(cwd)
+        conn.close()
+    finally:
+        server.shutdown()
+    return results
+
+
+def bench_calculations(path, repeat):
+    """
+    Time every calculate_* function, joining_tables and write_calculation_to_file.
+    Cold timings clear the stats cache first, warm ones reuse it.
+
+    Returns:
+        dict: {benchmark name: seconds}
+    """
+    results = {}
+    conn = connect(path)
+    install_summary(conn) # Like the writer tools do at startup, so the getters read the summary tables
+    for name in CALCULATIONS:
+        func = getattr(tcg_calculation, name)
+
+        def cold():
+            clear_stats_cache()
+            func(conn)
+
+        results[f"calc.{name}.cold"] = _timed(cold, repeat=repeat)
+        results[f"calc.{name}.warm"] = _timed(func, conn, repeat=repeat)
+
+    pokemon_cards = tcg_calculation.calculate_pokemon_total_per_year(conn)
+    pokemon_sets = tcg_calculation.calculate_pokemon_sets_per_year(conn)
+    yugioh_cards = tcg_calculation.calculate_yugioh_total_per_year(conn)
+    yugioh_sets = tcg_calculation.calculate_yugioh_sets_per_year(conn)
+
+    report_path = os.path.join(os.path.dirname(path), "All_calculation.txt")
+
+    def write_report():
+        clear_stats_cache()
+        tcg_calculation.write_calculation_to_file(conn, pokemon_cards, pokemon_sets, yugioh_cards, yugioh_sets, report_path)
+
+    results["calc.write_calculation_to_file"] = _timed(write_report, repeat=repeat)
+    conn.close()
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(sizes, start_year, end_year, ingest_sets, repeat):
+    """
+    Returns:
+        dict: machine-readable results, one entry per (size, benchmark)
+    """
+    runs = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for size in sizes:
+            path = os.path.join(workdir, f"synthetic_{size}.db")
+            generate_seconds = generate_db(path, size, size, start_year, end_year)
+            runs.append({'sets_per_game': size, 'benchmark': "generate_db", 'seconds': generate_seconds})
+            print(f"[{size} sets/game] generated in {generate_seconds:.2f}s")
+
+            for name, seconds in bench_calculations(path, repeat).items():
+                runs.append({'sets_per_game': size, 'benchmark': name, 'seconds': seconds})
+                print(f"[{size} sets/game] {name}: {seconds * 1000:.2f} ms")
+            os.remove(path)
+
+        if ingest_sets:
+            for name, seconds in bench_ingest(workdir, ingest_sets).items():
+                runs.append({'sets_per_game': ingest_sets, 'benchmark': name, 'seconds': seconds})
+                print(f"[{ingest_sets} sets/game] {name}: {seconds:.3f}s ({ingest_sets / seconds:,.0f} sets/sec)")
+
+    return {
+        'commit': git_commit(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'year_range': [start_year, end_year],
+        'results': runs,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ingest and calculations on synthetic databases")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000], help="sets per game for each synthetic database")
+    parser.add_argument("--start-year", type=int, default=1999)
+    parser.add_argument("--end-year", type=int, default=2025)
+    parser.add_argument("--ingest-sets", type=int, default=2500, help="sets per game served by the mock API for ingest timing (0 to skip)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per calculation benchmark, the best one is kept")
+    parser.add_argument("--output", default="bench_results.json")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.sizes, args.start_year, args.end_year, args.ingest_sets, args.repeat)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Benchmark results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
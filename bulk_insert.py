@@ -0,0 +1,166 @@
+# Lance
+
+import time
+from contextlib import contextmanager, nullcontext
+
+from instrumentation import span
+from set_search import rebuild_search
+from tcg_schema import GAMES
+from yearly_summary import rebuild_histogram, rebuild_summary
+
+# Below this many new rows the per-row insert triggers are cheaper than a rebuild
+DEFER_TRIGGERS_MIN_ROWS = 10000
+# Insert trigger suffix -> rebuild that replaces it
+TRIGGER_REBUILDS = {'_summary_insert': rebuild_summary, '_histogram_insert': rebuild_histogram, '_search_insert': rebuild_search}
+# Bound parameters per statement; SQLite before 3.32 allows only 999
+MAX_VARIABLES = 900
+
+
+def load_date_ids(cursor, game):
+    """
+    Read the whole release-date table once.
+
+    Returns:
+        dict: {date_text: date_id}
+    """
+    t = GAMES[game]
+    cursor.execute(f'SELECT "{t["date"]}", "{t["date_id"]}" FROM "{t["dates_table"]}"')
+    return dict(cursor.fetchall())
+
+
+def lookup_date_ids(cursor, game, dates):
+    """
+    Look up the ids of just these release dates, in chunks under SQLite's variable limit.
+
+    Returns:
+        dict: {date_text: date_id}
+    """
+    t = GAMES[game]
+    date_ids = {}
+    for i in range(0, len(dates), MAX_VARIABLES):
+        chunk = dates[i:i + MAX_VARIABLES]
+        cursor.execute(f'SELECT "{t["date"]}", "{t["date_id"]}" FROM "{t["dates_table"]}" WHERE "{t["date"]}" IN ({", ".join("?" * len(chunk))})', chunk)
+        date_ids.update(cursor.fetchall())
+    return date_ids
+
+
+def load_set_keys(cursor, game):
+    # (name, date_id) pairs already stored, used to honour an insert limit
+    t = GAMES[game]
+    cursor.execute(f'SELECT "{t["name"]}", "{t["date_id"]}" FROM "{t["sets_table"]}"')
+    return set(cursor.fetchall())
+
+
+@contextmanager
+def insert_triggers_deferred(conn, games):
+    """
+    Load rows into the games' sets tables without the per-row insert triggers.
+
+    The triggers are dropped on entry. On exit they are put back, and
+    yearly_summary, set_size_histogram and set_search are each rebuilt once.
+    The triggers come back before the rebuilds, so a row another connection
+    writes meanwhile is counted exactly once. Until then readers see the
+    summary tables as not installed and fall back to the joins. A crash
+    leaves the triggers missing, and the next install_summary / install_search
+    restores them.
+    """
+    cursor = conn.cursor()
+    tables = [GAMES[game]['sets_table'] for game in games]
+    cursor.execute(f"SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND tbl_name IN ({', '.join('?' * len(tables))})", tables)
+    triggers = [(name, sql) for name, sql in cursor.fetchall() if name.endswith(tuple(TRIGGER_REBUILDS))]
+
+    with conn:
+        for name, _ in triggers:
+            cursor.execute(f'DROP TRIGGER IF EXISTS "{name}"')
+    try:
+        yield
+    finally:
+        with conn:
+            for _, sql in triggers:
+                cursor.execute(sql)
+        for suffix, rebuild in TRIGGER_REBUILDS.items():
+            if any(name.endswith(suffix) for name, _ in triggers):
+                with span(f"db.{rebuild.__name__}"):
+                    rebuild(conn)
+
+
+def _stored_rows(cursor, game):
+    # Upper bound on the rows stored, from the rowid alone
+    cursor.execute(f'SELECT MAX(set_id) FROM "{GAMES[game]["sets_table"]}"')
+    return cursor.fetchone()[0] or 0
+
+
+def bulk_insert_sets(conn, game, records, limit=None, stats=None):
+    """
+    Insert validated set records in one transaction with executemany batches.
+
+    Release-date ids are resolved from an in-memory map loaded once per call;
+    dates this call adds are looked up on their own instead of reloading the map.
+    With a limit, records that already exist are skipped first so only
+    genuinely new sets count towards it. A batch at least
+    DEFER_TRIGGERS_MIN_ROWS long and as large as the table goes in without the
+    insert triggers (see insert_triggers_deferred), since rebuilding costs
+    about as much as the rows already stored.
+
+    Nothing is printed: a caller that reports the rate passes a stats dict,
+    which accumulates 'rows' and 'seconds' over every call it is given to.
+
+    Args:
+        conn: SQLite database connection
+        game: 'pokemon' or 'yugioh'
+        records: list of (name, release_date, card_count) tuples
+        limit: optional max number of new sets to insert
+        stats: optional dict to add this call's rows and seconds to
+    Returns:
+        int: number of set rows inserted
+    """
+    t = GAMES[game]
+    start = time.perf_counter()
+    cursor = conn.cursor()
+    defer = len(records) >= max(DEFER_TRIGGERS_MIN_ROWS, _stored_rows(cursor, game))
+
+    with insert_triggers_deferred(conn, [game]) if defer else nullcontext(), span(f"db.insert_sets.{game}") as s, conn:
+        date_ids = load_date_ids(cursor, game)
+
+        if limit is not None:
+            # A record whose date is not stored yet cannot exist already
+            existing = load_set_keys(cursor, game)
+            new_records = []
+            for name, date, count in records:
+                key = (name, date_ids.get(date))
+                if key in existing: continue
+                existing.add(key)
+                new_records.append((name, date, count))
+                if len(new_records) == limit: break
+            records = new_records
+
+        # INSERTING DATES
+        new_dates = sorted({date for _, date, _ in records if date not in date_ids})
+        if new_dates:
+            cursor.executemany(f'INSERT OR IGNORE INTO "{t["dates_table"]}" ("{t["date"]}") VALUES (?)', [(date,) for date in new_dates])
+            date_ids.update(lookup_date_ids(cursor, game, new_dates))
+
+        rows = [(name, count, date_ids[date]) for name, date, count in records]
+
+        # INSERTING SETS
+        cursor.executemany(f"""
+        INSERT OR IGNORE INTO "{t["sets_table"]}" ("{t["name"]}", "{t["count"]}", "{t["date_id"]}")
+        VALUES (?, ?, ?)
+        """, rows)
+        inserted = cursor.rowcount # Unlike total_changes this leaves out trigger writes
+        s.add(rows=inserted)
+
+    if stats is not None:
+        stats['rows'] = stats.get('rows', 0) + inserted
+        stats['seconds'] = stats.get('seconds', 0.0) + time.perf_counter() - start
+    return inserted
+
+
+def format_insert_stats(game, stats):
+    """
+    Returns:
+        str: the rows/sec line for stats filled by bulk_insert_sets
+    """
+    rows, seconds = stats.get('rows', 0), stats.get('seconds', 0.0)
+    rate = rows / seconds if seconds > 0 else 0
+    return f"-> Bulk insert: {rows} {GAMES[game]['label']} sets in {seconds:.3f}s ({rate:,.0f} rows/sec)"
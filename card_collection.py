@@ -0,0 +1,350 @@
+# Lance
+
+import argparse
+import itertools
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import requests
+
+from db_manager import open_db
+from http_cache import cached_get_json
+from pokemon_collection import MAX_PAGE_SIZE, POKEMON_API_URL, create_session, get_api_key
+from pokemon_collection import initialize_db as initialize_pokemon_db
+from tcg_schema import GAMES
+from yugioh_collection import YUGIOH_API_URL
+from yugioh_collection import initialize_db as initialize_yugioh_db
+
+CARD_TABLES = {'pokemon': "Pokemon Cards", 'yugioh': "Yu-Gi-Oh Cards"}
+YUGIOH_PAGE_SIZE = 1000 # cardinfo.php rows per request (num=)
+
+
+def initialize_card_tables(conn):
+    """
+    Create the card tables, their indexes and the paging progress table.
+
+    A Yu-Gi-Oh card is stored once per printing and rarity, since the same
+    card is reprinted in many sets. (set_id, rarity) indexes cover rarity
+    breakdowns and (set_id, set_code) covers the per-set printing counts,
+    without touching the card rows themselves.
+    """
+    initialize_pokemon_db(conn)
+    initialize_yugioh_db(conn)
+    cursor = conn.cursor()
+    with conn:
+        # TABLE: Pokemon Cards (card_id, upstream_id, name, number, rarity, set_id)
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS "Pokemon Cards" (
+            card_id INTEGER PRIMARY KEY,
+            upstream_id TEXT UNIQUE NOT NULL,
+            name TEXT,
+            number TEXT,
+            rarity TEXT,
+            set_id INTEGER,
+            FOREIGN KEY (set_id)
+                REFERENCES "Pokemon Sets" (set_id)
+        );
+        """)
+
+        # TABLE: Yu-Gi-Oh Cards, one row per printing (card_id, passcode, name, set_code, rarity, set_id)
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS "Yu-Gi-Oh Cards" (
+            card_id INTEGER PRIMARY KEY,
+            passcode INTEGER,
+            name TEXT,
+            set_code TEXT NOT NULL,
+            rarity TEXT,
+            set_id INTEGER,
+            FOREIGN KEY (set_id)
+                REFERENCES "Yu-Gi-Oh Sets" (set_id)
+            UNIQUE(set_code, rarity)
+        );
+        """)
+
+        for game, table in CARD_TABLES.items():
+            cursor.execute(f'CREATE INDEX IF NOT EXISTS "{game}_cards_set_rarity" ON "{table}" (set_id, rarity)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS "yugioh_cards_set_code" ON "Yu-Gi-Oh Cards" (set_id, set_code)')
+
+        # TABLE: where each card crawl stopped, so an interrupted run picks up from there
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS card_sync (
+            game TEXT PRIMARY KEY,
+            next_offset INTEGER NOT NULL,
+            page_size INTEGER NOT NULL,
+            total_count INTEGER,
+            updated_at TEXT,
+            completed_at TEXT
+        );
+        """)
+
+
+def load_set_ids(cursor, game, set_infos=()):
+    """
+    Map the set fields cards carry to stored set ids, read once per run.
+
+    Set names are not unique (sets are unique on name plus release date), so
+    Yu-Gi-Oh printings are matched on their set code prefix instead: the
+    cardsets.php list gives each code's name and date, which pick the stored set.
+
+    Args:
+        cursor: SQLite cursor
+        game: 'pokemon' or 'yugioh'
+        set_infos: cardsets.php items, only used for Yu-Gi-Oh
+    Returns:
+        dict: Pokemon {(name, releaseDate): set_id}, Yu-Gi-Oh {set_code: set_id}
+    """
+    t = GAMES[game]
+    cursor.execute(f"""
+    SELECT s."{t["name"]}", rd."{t["date"]}", MIN(s.set_id)
+    FROM "{t["sets_table"]}" s
+    JOIN "{t["dates_table"]}" rd ON rd."{t["date_id"]}" = s."{t["date_id"]}"
+    GROUP BY s."{t["name"]}", rd."{t["date"]}"
+    """)
+    set_ids = {(name, date): set_id for name, date, set_id in cursor.fetchall()}
+    if game == 'pokemon':
+        return set_ids
+
+    by_code = {}
+    for set_info in set_infos:
+        set_id = set_ids.get((set_info.get('set_name'), set_info.get('tcg_date')))
+        if set_info.get('set_code') and set_id is not None:
+            by_code[set_info['set_code']] = set_id
+    return by_code
+
+
+def pokemon_card_rows(cards, set_ids):
+    # (upstream_id, name, number, rarity, set_id); set_id is None for sets we have not stored
+    rows = []
+    for card in cards:
+        upstream_id = card.get('id')
+        if not upstream_id: continue
+        card_set = card.get('set') or {}
+        set_id = set_ids.get((card_set.get('name'), card_set.get('releaseDate')))
+        rows.append((upstream_id, card.get('name'), card.get('number'), card.get('rarity'), set_id))
+    return rows
+
+
+def yugioh_card_rows(cards, set_ids):
+    # (passcode, name, set_code, rarity, set_id), one row per printing; "LOB-EN001" belongs to set "LOB"
+    rows = []
+    for card in cards:
+        for printing in card.get('card_sets') or []:
+            set_code = printing.get('set_code')
+            if not set_code: continue
+            rows.append((card.get('id'), card.get('name'), set_code, printing.get('set_rarity'), set_ids.get(set_code.split('-')[0])))
+    return rows
+
+
+# A card seen again gets its set re-pointed: one stored before its set existed has set_id NULL,
+# and Yu-Gi-Oh printings stored when cards were matched on set name alone may point at the wrong set
+REPOINT_SET = "DO UPDATE SET set_id = COALESCE(excluded.set_id, set_id) WHERE set_id IS NOT COALESCE(excluded.set_id, set_id)"
+INSERT_CARDS = {
+    'pokemon': f"""
+        INSERT INTO "Pokemon Cards" (upstream_id, name, number, rarity, set_id) VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (upstream_id) {REPOINT_SET}
+    """,
+    'yugioh': f"""
+        INSERT INTO "Yu-Gi-Oh Cards" (passcode, name, set_code, rarity, set_id) VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (set_code, rarity) {REPOINT_SET}
+    """,
+}
+CARD_ROWS = {'pokemon': pokemon_card_rows, 'yugioh': yugioh_card_rows}
+
+
+def fetch_cards_page(session, game, offset, page_size, base_url):
+    """
+    Fetch one page of cards starting at `offset`.
+
+    Returns:
+        tuple: (cards, total_count)
+    """
+    if game == 'pokemon':
+        params = {'page': offset // page_size + 1, 'pageSize': page_size, 'select': "id,name,number,rarity,set"}
+        response = session.get(f"{base_url}/cards", params=params, timeout=60)
+        response.raise_for_status()
+        body = response.json()
+        return body.get('data', []), body.get('totalCount')
+
+    response = session.get(f"{base_url}/cardinfo.php", params={'num': page_size, 'offset': offset}, timeout=60)
+    response.raise_for_status()
+    body = response.json()
+    meta = body.get('meta') or {}
+    return body.get('data', []), meta.get('total_rows')
+
+
+def get_progress(cursor, game):
+    cursor.execute("SELECT next_offset, page_size, total_count, completed_at FROM card_sync WHERE game = ?", (game,))
+    return cursor.fetchone()
+
+
+def write_page(conn, game, rows, next_offset, page_size, total_count, completed=False):
+    # The card rows and the new offset commit together, so a crash never skips or half-writes a page
+    now = datetime.now().isoformat(timespec='seconds')
+    cursor = conn.cursor()
+    with conn:
+        cursor.executemany(INSERT_CARDS[game], rows)
+        inserted = cursor.rowcount
+        cursor.execute("""
+        INSERT INTO card_sync (game, next_offset, page_size, total_count, updated_at, completed_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT (game) DO UPDATE SET
+            next_offset = excluded.next_offset, page_size = excluded.page_size, total_count = excluded.total_count,
+            updated_at = excluded.updated_at, completed_at = excluded.completed_at
+        """, (game, 0 if completed else next_offset, page_size, total_count, now, now if completed else None))
+    return inserted
+
+
+def sync_cards(conn, game, api_key=None, page_size=None, max_workers=4, base_url=None, restart=False):
+    """
+    Page through a game's card endpoint and insert every card, resuming where the last run stopped.
+
+    Page 1 (or the resume page) is fetched first to learn the total, then the
+    rest are fetched concurrently and written strictly in order, one
+    transaction per page. A finished crawl resets to offset 0, and since rows
+    are keyed on their upstream id a re-run only adds new cards.
+
+    Args:
+        conn: SQLite database connection
+        game: 'pokemon' or 'yugioh'
+        api_key: Pokemon TCG API key (optional)
+        page_size: cards per request (defaults to each API's maximum)
+        max_workers: max concurrent requests
+        base_url: API root, e.g. a local stub server
+        restart: ignore saved progress and start from the first page
+    Returns:
+        dict: {'inserted': n, 'pages': n, 'complete': bool}
+    """
+    initialize_card_tables(conn)
+    cursor = conn.cursor()
+    base_url = base_url or (POKEMON_API_URL if game == 'pokemon' else YUGIOH_API_URL)
+    page_size = page_size or (MAX_PAGE_SIZE if game == 'pokemon' else YUGIOH_PAGE_SIZE)
+    if game == 'pokemon':
+        page_size = min(page_size, MAX_PAGE_SIZE)
+
+    offset = 0
+    progress = get_progress(cursor, game)
+    if progress and not restart and progress[3] is None:
+        # Keep the interrupted run's page size so its offsets stay page-aligned
+        offset, page_size = progress[0], progress[1]
+        print(f"-> Resuming {GAMES[game]['label']} cards at offset {offset}")
+
+    to_rows = CARD_ROWS[game]
+    session = create_session(api_key if game == 'pokemon' else None, max_workers)
+    counts = {'inserted': 0, 'pages': 0, 'complete': False}
+    start = time.perf_counter()
+
+    try:
+        # Yu-Gi-Oh needs every set's code; cardsets.php is usually a 304 from the response cache
+        set_infos = cached_get_json(f"{base_url}/cardsets.php", session)[0] if game == 'yugioh' else ()
+        set_ids = load_set_ids(cursor, game, set_infos or ())
+
+        cards, total_count = fetch_cards_page(session, game, offset, page_size, base_url)
+        if total_count is None:
+            # No total in the response (e.g. no paging support): the page is everything
+            total_count = offset + len(cards)
+        remaining = math.ceil(max(total_count - offset - len(cards), 0) / page_size) if len(cards) == page_size else 0
+        offsets = [offset + page_size * (i + 1) for i in range(remaining)]
+        print(f"-> Fetching {remaining + 1} page(s) of {GAMES[game]['label']} cards ({total_count} upstream, {max_workers} in flight)...")
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # map() yields in order, so each page is written as soon as it and every page before it arrived
+            later_pages = (page for page, _ in executor.map(lambda o: fetch_cards_page(session, game, o, page_size, base_url), offsets))
+            for page in itertools.chain([cards], later_pages):
+                complete = len(page) < page_size or offset + len(page) >= total_count
+                counts['inserted'] += write_page(conn, game, to_rows(page, set_ids), offset + len(page), page_size, total_count, complete)
+                counts['pages'] += 1
+                counts['complete'] = complete
+                offset += len(page)
+                if complete: break
+    except requests.exceptions.RequestException as e:
+        print(f"Error fetching cards from API: {e} (progress saved at offset {offset})")
+    finally:
+        session.close()
+
+    elapsed = time.perf_counter() - start
+    rate = counts['inserted'] / elapsed if elapsed > 0 else 0
+    print(f"-> {GAMES[game]['label']} cards: {counts['inserted']} inserted over {counts['pages']} page(s) in {elapsed:.2f}s ({rate:,.0f} rows/sec)")
+    return counts
+
+
+def verify_card_counts(conn, game):
+    """
+    Compare each set's stated card count with the cards actually stored for it.
+
+    Only sets with at least one stored card are checked. A Yu-Gi-Oh card
+    printed in several rarities is stored once per rarity, so its sets count
+    distinct set codes. Either count is answered from a (set_id, ...) index alone.
+
+    Returns:
+        list: (set_name, stated_count, stored_cards) for every set that does not match
+    """
+    t = GAMES[game]
+    stored = "COUNT(DISTINCT set_code)" if game == 'yugioh' else "COUNT(*)"
+    cursor = conn.cursor()
+    cursor.execute(f"""
+    SELECT s."{t["name"]}", s."{t["count"]}", c.stored
+    FROM (SELECT set_id, {stored} AS stored FROM "{CARD_TABLES[game]}" WHERE set_id IS NOT NULL GROUP BY set_id) c
+    JOIN "{t["sets_table"]}" s ON s.set_id = c.set_id
+    WHERE s."{t["count"]}" IS NOT c.stored
+    ORDER BY s.set_id
+    """)
+    return cursor.fetchall()
+
+
+def has_card_table(conn, game):
+    # Read-only check, so --verify never creates tables on a database without cards
+    row = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (CARD_TABLES[game],)).fetchone()
+    return row is not None
+
+
+def cards_per_year(conn, game):
+    """
+    Stored cards per release year, e.g. to set against the per-set totals.
+
+    Returns:
+        dict: {year: card count} with years as strings
+    """
+    t = GAMES[game]
+    cursor = conn.cursor()
+    cursor.execute(f"""
+    SELECT rd.year, COUNT(*)
+    FROM "{CARD_TABLES[game]}" c
+    JOIN "{t["sets_table"]}" s ON s.set_id = c.set_id
+    JOIN "{t["dates_table"]}" rd ON rd."{t["date_id"]}" = s."{t["date_id"]}"
+    WHERE rd.year > 0
+    GROUP BY rd.year
+    """)
+    return {str(year): count for year, count in cursor.fetchall()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Collect individual Pokemon and Yu-Gi-Oh cards into tcg_data.db")
+    parser.add_argument("--game", choices=["pokemon", "yugioh", "both"], default="both")
+    parser.add_argument("--page-size", type=int, default=None, help="cards per request (default: the API maximum)")
+    parser.add_argument("--workers", type=int, default=4, help="max concurrent requests")
+    parser.add_argument("--pokemon-base-url", default=POKEMON_API_URL)
+    parser.add_argument("--yugioh-base-url", default=YUGIOH_API_URL)
+    parser.add_argument("--restart", action="store_true", help="ignore saved progress and start from the first page")
+    parser.add_argument("--verify", action="store_true", help="list sets whose stated card count differs from the stored cards")
+    args = parser.parse_args()
+
+    games = ["pokemon", "yugioh"] if args.game == "both" else [args.game]
+    with open_db("tcg_data.db") as conn:
+        for game in games:
+            if not args.verify:
+                base_url = args.pokemon_base_url if game == 'pokemon' else args.yugioh_base_url
+                sync_cards(conn, game, get_api_key("pokemon_api_key.txt") if game == 'pokemon' else None, args.page_size, args.workers, base_url, args.restart)
+
+            if not has_card_table(conn, game):
+                print(f"{GAMES[game]['label']}: no cards collected")
+                continue
+            mismatches = verify_card_counts(conn, game)
+            print(f"{GAMES[game]['label']}: {len(mismatches)} set(s) whose stored cards differ from the stated count")
+            for name, stated, stored in mismatches[:20]:
+                print(f"  {name}: states {stated}, {stored} stored")
+
+
+if __name__ == "__main__":
+    main()
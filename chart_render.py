@@ -0,0 +1,102 @@
+# Brandon Reyes Parra
+
+
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib
+matplotlib.use("Agg") # Non-interactive backend, no display needed
+
+import tcg_calculation
+from instrumentation import span
+from growth_analytics import load_series
+from tcg_stats import get_yearly_stats
+
+HASH_FILE = ".chart_hashes.json"
+RENDER_VERSION = 1 # Bump when a create_* function changes how it draws
+
+
+def chart_jobs(conn):
+    """
+    List every chart main() draws as (name, create_* function name, args).
+    """
+    stats = get_yearly_stats(conn)
+    pokemon_cards, yugioh_cards = stats.cards['pokemon'], stats.cards['yugioh']
+    return [
+        ("pokemon_cards_per_year", "create_pokemon_histogram", (pokemon_cards, "Total Pokemon Cards Released Per Year", "Year", "Total Cards Released")),
+        ("pokemon_sets_per_year", "create_pokemon_histogram", (stats.sets['pokemon'], "Total Pokemon Sets Released Per Year", "Year", "Total Sets Released Per Year")),
+        ("yugioh_cards_per_year", "create_yugioh_histogram", (yugioh_cards, "Total Yu-Gi-Oh Cards Released Per Year", "Year", "Total Cards Released")),
+        ("yugioh_sets_per_year", "create_yugioh_histogram", (stats.sets['yugioh'], "Total Yu-Gi-Oh Sets Released Per Year", "Year", "Total Sets Released Per Year")),
+        ("combined_cards_per_year", "create_combined_histogram", (pokemon_cards, yugioh_cards, stats.combined)),
+        ("average_set_size", "create_average_sets_line_chart", (stats.average['pokemon'], stats.average['yugioh'])),
+        ("rolling_average_set_size", "create_rolling_average_chart", (
+            load_series(conn, 'pokemon').rolling_average_set_size(tcg_calculation.ROLLING_WINDOW),
+            load_series(conn, 'yugioh').rolling_average_set_size(tcg_calculation.ROLLING_WINDOW),
+            tcg_calculation.ROLLING_WINDOW)),
+    ]
+
+
+def chart_hash(function_name, args, formats):
+    # Stable fingerprint of everything that decides what the image looks like
+    payload = json.dumps([RENDER_VERSION, function_name, args, sorted(formats)], sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _render_chart(job):
+    # Runs inside a worker process
+    function_name, args, paths = job
+    getattr(tcg_calculation, function_name)(*args, output_path=paths)
+    return paths
+
+
+def render_all(conn, output_dir="charts", formats=("png",), jobs=None, force=False):
+    """
+    Render every chart to image files without opening any windows.
+
+    Charts whose input data and formats hash the same as the last run (and whose
+    files still exist) are skipped. The rest render in a process pool.
+
+    Args:
+        conn: SQLite database connection
+        output_dir: directory to write the images to
+        formats: file extensions to write, e.g. ('png', 'svg')
+        jobs: worker processes (default: one per CPU)
+        force: render even if nothing changed
+    Returns:
+        tuple: (rendered chart names, skipped chart names)
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    hash_path = os.path.join(output_dir, HASH_FILE)
+    try:
+        with open(hash_path, 'r') as f:
+            previous_hashes = json.load(f)
+    except (OSError, ValueError):
+        previous_hashes = {}
+
+    hashes = {}
+    pending = []
+    skipped = []
+    for name, function_name, args in chart_jobs(conn):
+        paths = [os.path.join(output_dir, f"{name}.{ext}") for ext in formats]
+        hashes[name] = chart_hash(function_name, args, formats)
+        if not force and previous_hashes.get(name) == hashes[name] and all(os.path.exists(path) for path in paths):
+            skipped.append(name)
+            continue
+        pending.append((name, (function_name, args, paths)))
+
+    with span("chart.render_all", rows=len(pending)):
+        if len(pending) > 1 and jobs != 1:
+            with ProcessPoolExecutor(max_workers=jobs) as executor:
+                list(executor.map(_render_chart, [job for _, job in pending]))
+        else:
+            for _, job in pending:
+                _render_chart(job)
+
+    with open(hash_path, 'w') as f:
+        json.dump(hashes, f, indent=2)
+
+    rendered = [name for name, _ in pending]
+    print(f"Charts written to {output_dir}: {len(rendered)} rendered, {len(skipped)} unchanged")
+    return rendered, skipped
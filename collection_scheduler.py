@@ -0,0 +1,239 @@
+# Lance
+
+import argparse
+import asyncio
+import random
+import time
+
+import requests
+
+import pokemon_collection
+import yugioh_collection
+from bulk_insert import bulk_insert_sets
+from db_manager import open_db
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """
+    Allows `rate` requests per second on average with bursts of up to `capacity`.
+
+    The rate adapts: it halves on every 429 and creeps back up towards
+    max_rate on successes, so we settle just under the upstream quota.
+    """
+
+    def __init__(self, rate, capacity):
+        self.max_rate = rate
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def slow_down(self):
+        self.rate = max(self.max_rate / 16, self.rate / 2)
+
+    def speed_up(self):
+        self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+
+class SourceAdapter:
+    """
+    One upstream API. Subclasses say what to request and how to store what comes back.
+
+    A request is a (url, params) tuple. handle_response() returns the records
+    to store plus any follow-up requests discovered from the response.
+    """
+    name = "source"
+    rate = 5 # requests per second
+    burst = 5
+
+    def __init__(self):
+        self.session = requests.Session()
+
+    def initial_requests(self):
+        raise NotImplementedError
+
+    def handle_response(self, request, data):
+        raise NotImplementedError
+
+    def store(self, conn, records):
+        raise NotImplementedError
+
+
+class PokemonAdapter(SourceAdapter):
+    name = "pokemon"
+    rate = 5
+    burst = 5
+
+    def __init__(self, api_key=None, base_url=pokemon_collection.POKEMON_API_URL, page_size=pokemon_collection.MAX_PAGE_SIZE):
+        super().__init__()
+        if api_key:
+            self.session.headers['X-Api-Key'] = api_key
+        self.base_url = base_url
+        self.page_size = page_size
+
+    def _page(self, page_number):
+        return (f"{self.base_url}/sets", (('pageSize', self.page_size), ('page', page_number)))
+
+    def initial_requests(self):
+        return [self._page(1)]
+
+    def handle_response(self, request, data):
+        follow_ups = []
+        if dict(request[1])['page'] == 1:
+            page_count = -(-data.get('totalCount', 0) // self.page_size)
+            follow_ups = [self._page(page) for page in range(2, page_count + 1)]
+        return data.get('data', []), follow_ups
+
+    def store(self, conn, records):
+        return pokemon_collection.insert_sets(conn, records)
+
+
+class YugiohAdapter(SourceAdapter):
+    name = "yugioh"
+    rate = 15 # ygoprodeck allows 20 requests per second
+    burst = 5
+
+    def __init__(self, base_url=yugioh_collection.YUGIOH_API_URL):
+        super().__init__()
+        self.base_url = base_url
+
+    def initial_requests(self):
+        return [(f"{self.base_url}/cardsets.php", ())]
+
+    def handle_response(self, request, data):
+        return data, []
+
+    def store(self, conn, records):
+        return bulk_insert_sets(conn, 'yugioh', list(yugioh_collection.iter_valid_sets(records)))
+
+
+async def fetch_with_retry(adapter, bucket, request, stats, max_retries=5, base_delay=0.5, max_delay=30):
+    """
+    GET one request under the adapter's rate limit.
+
+    429 and 5xx answers, dropped connections and timeouts are retried with
+    full-jitter exponential backoff, honouring a Retry-After header when the
+    server sends one.
+    """
+    url, params = request
+    for attempt in range(max_retries + 1):
+        await bucket.acquire()
+        stats['requests'] += 1
+        try:
+            response = await asyncio.to_thread(adapter.session.get, url, params=params, timeout=60)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            if attempt == max_retries:
+                raise
+            response = None
+
+        if response is not None and response.status_code not in RETRY_STATUSES:
+            response.raise_for_status()
+            bucket.speed_up()
+            return response.json()
+        if attempt == max_retries:
+            response.raise_for_status()
+        if response is not None and response.status_code == 429:
+            bucket.slow_down()
+
+        stats['retries'] += 1
+        delay = random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, int(retry_after))
+        await asyncio.sleep(delay)
+
+
+async def run_source(conn, adapter, concurrency):
+    """
+    Drain one adapter's request queue with up to `concurrency` requests in flight.
+
+    Returns:
+        dict: requests, retries, inserted, errors and seconds for this source
+    """
+    bucket = TokenBucket(adapter.rate, adapter.burst)
+    stats = {'requests': 0, 'retries': 0, 'inserted': 0, 'errors': 0}
+    queue = asyncio.Queue()
+    for request in adapter.initial_requests():
+        queue.put_nowait(request)
+    start = time.perf_counter()
+
+    async def worker():
+        while True:
+            request = await queue.get()
+            try:
+                data = await fetch_with_retry(adapter, bucket, request, stats)
+                records, follow_ups = adapter.handle_response(request, data)
+                for follow_up in follow_ups:
+                    queue.put_nowait(follow_up)
+                # SQLite writes stay on the event loop thread, one at a time
+                stats['inserted'] += adapter.store(conn, records)
+            except (requests.exceptions.RequestException, ValueError) as e:
+                stats['errors'] += 1
+                print(f"Error fetching data from {adapter.name} API: {e}")
+            except Exception as e:
+                # e.g. sqlite3.Error while storing: count it and keep the worker alive, or queue.join() never returns
+                stats['errors'] += 1
+                print(f"Error processing {adapter.name} response: {e!r}")
+            finally:
+                queue.task_done()
+
+    workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+    await queue.join()
+    for task in workers:
+        task.cancel()
+    adapter.session.close()
+
+    stats['seconds'] = time.perf_counter() - start
+    return stats
+
+
+async def run_all(conn, adapters, concurrency=4):
+    """
+    Run every source concurrently in one event loop.
+
+    Returns:
+        dict: {adapter name: stats}
+    """
+    results = await asyncio.gather(*(run_source(conn, adapter, concurrency) for adapter in adapters))
+    return {adapter.name: stats for adapter, stats in zip(adapters, results)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Collect every source concurrently with per-source rate limits and retries")
+    parser.add_argument("--pokemon-url", default=pokemon_collection.POKEMON_API_URL)
+    parser.add_argument("--yugioh-url", default=yugioh_collection.YUGIOH_API_URL)
+    parser.add_argument("--concurrency", type=int, default=4, help="requests in flight per source")
+    args = parser.parse_args()
+
+    api_key = pokemon_collection.get_api_key("pokemon_api_key.txt")
+    with open_db("tcg_data.db") as conn:
+        pokemon_collection.initialize_db(conn)
+        yugioh_collection.initialize_db(conn)
+
+        adapters = [PokemonAdapter(api_key, args.pokemon_url), YugiohAdapter(args.yugioh_url)]
+        results = asyncio.run(run_all(conn, adapters, args.concurrency))
+
+    # Feedback for user
+    print("\n" + "-" * 50)
+    print("Run Summary (Scheduler):")
+    for name, stats in results.items():
+        print(f"  - {name}: {stats['inserted']} new sets, {stats['requests']} requests, {stats['retries']} retries, {stats['errors']} errors in {stats['seconds']:.2f}s")
+    print("-" * 50)
+
+
+if __name__ == "__main__":
+    main()
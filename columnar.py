@@ -0,0 +1,195 @@
+# Brandon Reyes Parra
+
+
+import argparse
+import json
+import os
+
+import numpy as np
+
+from db_manager import open_db
+from tcg_schema import GAMES, year_sql
+
+CACHE_DIR = ".columnar_cache"
+
+
+class GameColumns:
+    """
+    One game's sets as typed columns: the release year of every set and its card count.
+    Rows are sorted by (year, card count), so every year is one contiguous run.
+
+    Attributes:
+        first_year: year stored as index 0
+        year_index: int16 array, year - first_year for every set
+        cards: int64 array, card count for every set (missing counts are 0)
+    """
+
+    def __init__(self, first_year, year_index, cards):
+        self.first_year = first_year
+        self.year_index = year_index
+        self.cards = cards
+
+    @property
+    def year_count(self):
+        return int(self.year_index.max()) + 1 if len(self.year_index) else 0
+
+    def years(self):
+        return np.arange(self.first_year, self.first_year + self.year_count)
+
+
+def db_fingerprint(db_name):
+    # Any committed write touches the database file or its WAL
+    parts = []
+    for path in (db_name, db_name + "-wal"):
+        if os.path.exists(path):
+            stat = os.stat(path)
+            parts.append([stat.st_size, stat.st_mtime_ns])
+        else:
+            parts.append(None)
+    return parts
+
+
+def _read_columns(conn, game):
+    # Read-only: the year comes from year_sql, so older databases are never altered
+    t = GAMES[game]
+    names = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    if t["sets_table"] not in names or t["dates_table"] not in names:
+        return GameColumns(0, np.zeros(0, dtype=np.int16), np.zeros(0, dtype=np.int64))
+    year = year_sql(conn, game)
+    cursor = conn.execute(f"""
+        SELECT {year}, COALESCE(s."{t["count"]}", 0)
+        FROM "{t["sets_table"]}" s
+        JOIN "{t["dates_table"]}" rd ON rd."{t["date_id"]}" = s."{t["date_id"]}"
+        WHERE {year} > 0
+    """)
+    rows = np.array(cursor.fetchall(), dtype=np.int64).reshape(-1, 2)
+    first_year = int(rows[:, 0].min()) if len(rows) else 0
+    # Sorting once here means per-year percentiles never have to sort
+    rows = rows[np.lexsort((rows[:, 1], rows[:, 0]))]
+    return GameColumns(first_year, (rows[:, 0] - first_year).astype(np.int16), rows[:, 1])
+
+
+def load_columns(db_name, game, cache_dir=CACHE_DIR, conn=None):
+    """
+    Load one game's columns, from the .npy cache when the database has not changed.
+
+    Cached arrays are memory-mapped, so only the pages that get touched are read.
+    A cache miss reads through `conn` when given, otherwise through a new connection.
+
+    Returns:
+        GameColumns
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    meta_path = os.path.join(cache_dir, f"{game}.json")
+    year_path = os.path.join(cache_dir, f"{game}_year_index.npy")
+    cards_path = os.path.join(cache_dir, f"{game}_cards.npy")
+    fingerprint = db_fingerprint(db_name)
+
+    try:
+        with open(meta_path, 'r') as f:
+            meta = json.load(f)
+        if meta['db'] == os.path.abspath(db_name) and meta['fingerprint'] == fingerprint:
+            return GameColumns(meta['first_year'], np.load(year_path, mmap_mode='r'), np.load(cards_path, mmap_mode='r'))
+    except (OSError, ValueError, KeyError):
+        pass
+
+    if conn is not None:
+        columns = _read_columns(conn, game)
+    else:
+        with open_db(db_name) as conn:
+            columns = _read_columns(conn, game)
+    np.save(year_path, columns.year_index)
+    np.save(cards_path, columns.cards)
+    with open(meta_path, 'w') as f:
+        json.dump({'db': os.path.abspath(db_name), 'fingerprint': fingerprint, 'first_year': columns.first_year}, f)
+    return columns
+
+
+def per_year_stats(columns, percentiles=(50, 90)):
+    """
+    Card sums, set counts, averages, spread and percentiles of set size for every year, vectorized.
+
+    Percentiles use linear interpolation like np.percentile and are read
+    straight from the pre-sorted columns for all years at once, as are the
+    smallest and largest set. The standard deviation is the population one.
+
+    Returns:
+        dict: {year: {'cards', 'sets', 'average', 'min', 'max', 'stddev', 'p50', ...}} for years with sets
+    """
+    year_count = columns.year_count
+    if not year_count:
+        return {}
+
+    year_index = columns.year_index
+    cards = columns.cards
+    set_counts = np.bincount(year_index, minlength=year_count)
+    card_sums = np.bincount(year_index, weights=cards, minlength=year_count).astype(np.int64)
+    square_sums = np.bincount(year_index, weights=cards.astype(np.float64) ** 2, minlength=year_count)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        averages = np.round(card_sums / set_counts, 1)
+        means = card_sums / set_counts
+        stddevs = np.sqrt(np.maximum(square_sums / set_counts - means * means, 0.0))
+
+    starts = np.concatenate(([0], np.cumsum(set_counts)[:-1]))
+    ends = (starts + set_counts - 1).clip(min=0, max=max(len(cards) - 1, 0))
+    results = {}
+    for p in percentiles:
+        position = starts + (set_counts - 1).clip(min=0) * (p / 100)
+        low = np.floor(position).astype(np.int64)
+        high = np.minimum(low + 1, starts + set_counts - 1).clip(min=0)
+        fraction = position - low
+        low = low.clip(max=len(cards) - 1)
+        high = high.clip(max=len(cards) - 1)
+        results[f"p{p}"] = cards[low] + (cards[high] - cards[low]).astype(np.float64) * fraction
+
+    stats = {}
+    for i, year in enumerate(columns.years()):
+        if set_counts[i] == 0: continue
+        stats[str(year)] = {
+            'cards': int(card_sums[i]),
+            'sets': int(set_counts[i]),
+            'average': float(averages[i]),
+            'min': int(cards[starts[i]]),
+            'max': int(cards[ends[i]]),
+            'stddev': round(float(stddevs[i]), 1),
+            **{name: round(float(values[i]), 1) for name, values in results.items()},
+        }
+    return stats
+
+
+def distribution_stats(conn, cache_dir=CACHE_DIR):
+    """
+    Per-year spread of set size for both games, in get_distribution_stats' shape.
+
+    Columns come from the cache next to the database file; an in-memory
+    database is read directly every time.
+
+    Returns:
+        dict: {'pokemon': {year: {'median', 'p90', 'min', 'max', 'stddev', 'sets'}}, 'yugioh': {...}}
+    """
+    db_name = conn.execute("PRAGMA database_list").fetchone()[2]
+    distribution = {}
+    for game in GAMES:
+        columns = load_columns(db_name, game, cache_dir, conn) if db_name else _read_columns(conn, game)
+        distribution[game] = {
+            year: {'median': row['p50'], 'p90': row['p90'], 'min': row['min'], 'max': row['max'], 'stddev': row['stddev'], 'sets': row['sets']}
+            for year, row in per_year_stats(columns).items()
+        }
+    return distribution
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vectorized per-year statistics from the cached columnar dataset")
+    parser.add_argument("--db", default="tcg_data.db")
+    args = parser.parse_args()
+
+    for game in GAMES:
+        stats = per_year_stats(load_columns(args.db, game))
+        print(f"{GAMES[game]['label']}:")
+        print(f"  {'Year':<6} | {'Cards':>8} | {'Sets':>6} | {'Avg':>7} | {'P50':>7} | {'P90':>7}")
+        for year, row in stats.items():
+            print(f"  {year:<6} | {row['cards']:>8} | {row['sets']:>6} | {row['average']:>7} | {row['p50']:>7} | {row['p90']:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+# Lance
+
+import os
+import sqlite3
+from contextlib import contextmanager
+from urllib.request import pathname2url
+
+DB_NAME = "tcg_data.db"
+
+# Applied to every connection we open
+PRAGMAS = [
+    "PRAGMA journal_mode = WAL", # Readers keep reading while a collector writes
+    "PRAGMA synchronous = NORMAL", # Safe with WAL, skips an fsync per commit
+    "PRAGMA cache_size = -65536", # 64 MB page cache
+    "PRAGMA mmap_size = 268435456", # Read through a 256 MB memory map
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA foreign_keys = ON",
+]
+
+
+def connect(db_name=DB_NAME, timeout=30, check_same_thread=True, read_only=False):
+    """
+    Open a tuned connection. The caller owns it and must close it.
+
+    A large statement cache means the INSERT/SELECT strings the collectors and
+    calculations run over and over are prepared once per connection.
+    Pass check_same_thread=False only if the caller serializes access itself.
+    With read_only=True the file is opened with mode=ro, so nothing through
+    this connection (not even the journal mode) can change the database.
+    """
+    if read_only:
+        uri = f"file:{pathname2url(os.path.abspath(db_name))}?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, timeout=timeout, cached_statements=256, check_same_thread=check_same_thread)
+    else:
+        conn = sqlite3.connect(db_name, timeout=timeout, cached_statements=256, check_same_thread=check_same_thread)
+    for pragma in PRAGMAS:
+        if read_only and "journal_mode" in pragma: continue
+        conn.execute(pragma)
+    return conn
+
+
+@contextmanager
+def open_db(db_name=DB_NAME):
+    """
+    with open_db() as conn: ... - one connection, closed exactly once at the end.
+    """
+    conn = connect(db_name)
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+@contextmanager
+def read_snapshot(conn):
+    """
+    Run several queries against one consistent snapshot.
+
+    With WAL the snapshot is not blocked by a collector committing meanwhile
+    and does not block it either.
+    """
+    if conn.in_transaction:
+        # Already inside a transaction, which is a snapshot once it has read
+        yield conn
+        return
+
+    conn.execute("BEGIN")
+    try:
+        yield conn
+    finally:
+        if conn.in_transaction:
+            conn.execute("COMMIT")
@@ -0,0 +1,205 @@
+# Brandon Reyes Parra
+
+
+import argparse
+
+from db_manager import open_db
+from tcg_schema import GAMES, month_sql, year_sql
+
+PERIODS_PER_YEAR = {'year': 1, 'quarter': 4, 'month': 12}
+
+SERIES_QUERY = """
+    SELECT {year}, {month}, COALESCE(SUM(s."{count}"), 0), COUNT(s.set_id)
+    FROM "{dates_table}" rd
+    JOIN "{sets_table}" s ON rd."{date_id}" = s."{date_id}"
+    WHERE {year} > 0
+    GROUP BY {year}, {month}
+"""
+
+
+class PrefixSeries:
+    """
+    Prefix sums over a list of numbers: any window sum or mean is O(1) after an O(n) build.
+    Windows are half-open, [start, end).
+    """
+
+    def __init__(self, values):
+        self.prefix = [0]
+        for value in values:
+            self.prefix.append(self.prefix[-1] + value)
+
+    def __len__(self):
+        return len(self.prefix) - 1
+
+    def window_sum(self, start, end):
+        return self.prefix[end] - self.prefix[start]
+
+    def window_mean(self, start, end):
+        return self.window_sum(start, end) / (end - start) if end > start else None
+
+    def sliding_means(self, width):
+        # Mean of every full window of `width` values, oldest first
+        return [self.window_mean(i, i + width) for i in range(len(self) - width + 1)]
+
+
+class TimeSeries:
+    """
+    One game's cards and sets per period (year, quarter or month), with empty periods filled in.
+
+    Attributes:
+        granularity: 'year', 'quarter' or 'month'
+        labels: period labels like '1999', '1999-Q1' or '1999-01'
+        cards, sets: PrefixSeries over the card sums and set counts of each period
+    """
+
+    def __init__(self, granularity, buckets):
+        self.granularity = granularity
+        self.periods_per_year = PERIODS_PER_YEAR[granularity]
+        first = min(buckets) if buckets else 0
+        last = max(buckets) if buckets else -1
+        self.first_period = first
+        self.labels = [self._label(period) for period in range(first, last + 1)]
+        self.cards = PrefixSeries([buckets.get(period, (0, 0))[0] for period in range(first, last + 1)])
+        self.sets = PrefixSeries([buckets.get(period, (0, 0))[1] for period in range(first, last + 1)])
+
+    def _label(self, period):
+        year, part = divmod(period, self.periods_per_year)
+        if self.granularity == 'quarter':
+            return f"{year}-Q{part + 1}"
+        if self.granularity == 'month':
+            return f"{year}-{part + 1:02d}"
+        return str(year)
+
+    def index(self, label):
+        return self.labels.index(label)
+
+    def average_set_size(self, start, end):
+        # Cards per set over a window, weighted by sets rather than averaging averages
+        sets = self.sets.window_sum(start, end)
+        return self.cards.window_sum(start, end) / sets if sets else None
+
+    def window_value(self, metric, start, end):
+        # 'cards' and 'sets' are window sums; 'avg_size' is their ratio (None for a window without sets)
+        if metric == 'avg_size':
+            return self.average_set_size(start, end)
+        return getattr(self, metric).window_sum(start, end)
+
+    def sliding_average_set_size(self, width):
+        return [self.average_set_size(i, i + width) for i in range(len(self.labels) - width + 1)]
+
+    def rolling_average_set_size(self, width):
+        """
+        Average set size over every `width`-period window, keyed by the window's last period.
+
+        Returns:
+            dict: {label: cards per set} for windows that contain at least one set
+        """
+        rolling = {}
+        for i, value in enumerate(self.sliding_average_set_size(width)):
+            if value is not None:
+                rolling[self.labels[i + width - 1]] = round(value, 1)
+        return rolling
+
+    def year_over_year(self, metric='cards'):
+        """
+        Percent change of each period against the same period one year earlier.
+
+        Args:
+            metric: 'cards', 'sets' or 'avg_size' (cards per set in the period)
+        Returns:
+            dict: {label: percent or None when either period is 0 or has no sets}
+        """
+        lag = self.periods_per_year
+        growth = {}
+        for i in range(lag, len(self.labels)):
+            previous = self.window_value(metric, i - lag, i - lag + 1)
+            current = self.window_value(metric, i, i + 1)
+            growth[self.labels[i]] = (current - previous) / previous * 100 if previous and current is not None else None
+        return growth
+
+    def cagr(self, start, end, metric='cards', width=None):
+        """
+        Compound annual growth rate between the window starting at `start` and the one ending at `end`.
+
+        Each end is the sum over `width` periods (default one year's worth), which
+        smooths out single empty months or quarters. For 'avg_size' each end is
+        the window's card sum over its set sum.
+
+        Returns:
+            float or None: growth rate as a percent
+        """
+        width = width or self.periods_per_year
+        first = self.window_value(metric, start, start + width)
+        last = self.window_value(metric, end - width, end)
+        years = (end - width - start) / self.periods_per_year
+        if first is None or last is None or first <= 0 or last <= 0 or years <= 0:
+            return None
+        return ((last / first) ** (1 / years) - 1) * 100
+
+
+def _period(year, month, granularity):
+    month = month if 1 <= (month or 0) <= 12 else 1
+    if granularity == 'quarter':
+        return year * 4 + (month - 1) // 3
+    if granularity == 'month':
+        return year * 12 + month - 1
+    return year
+
+
+def load_series(conn, game, granularity='year'):
+    """
+    Build a game's TimeSeries with one grouped query on the indexed year/month columns.
+    Never writes: on a database from before migration 2 the year and month are parsed from the date text.
+
+    Returns:
+        TimeSeries
+    """
+    cursor = conn.execute(SERIES_QUERY.format(year=year_sql(conn, game), month=month_sql(conn, game), **GAMES[game]))
+    buckets = {}
+    for year, month, cards, sets in cursor.fetchall():
+        period = _period(year, month, granularity)
+        old_cards, old_sets = buckets.get(period, (0, 0))
+        buckets[period] = (old_cards + cards, old_sets + sets)
+    return TimeSeries(granularity, buckets)
+
+
+def edge_window_growth(averages, window=5):
+    """
+    Mean of the first `window` values against the mean of the last `window` values.
+
+    Used by Section 3 of the report with the per-year average set sizes.
+
+    Returns:
+        tuple: (early_mean, recent_mean) or None for an empty list
+    """
+    series = PrefixSeries(averages)
+    if not len(series):
+        return None
+    width = min(window, len(series))
+    return series.window_mean(0, width), series.window_mean(len(series) - width, len(series))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Windowed growth analytics over the release history")
+    parser.add_argument("--db", default="tcg_data.db")
+    parser.add_argument("--granularity", choices=list(PERIODS_PER_YEAR), default="year")
+    parser.add_argument("--window", type=int, default=3, help="sliding window size in periods")
+    args = parser.parse_args()
+
+    with open_db(args.db) as conn:
+        for game in GAMES:
+            series = load_series(conn, game, args.granularity)
+            if not series.labels:
+                continue
+            n = len(series.labels)
+            print(f"{GAMES[game]['label']} ({series.labels[0]} to {series.labels[-1]}):")
+            cagr = series.cagr(0, n)
+            print(f"  Cards CAGR: {cagr:.1f}%" if cagr is not None else "  Cards CAGR: n/a")
+            cagr = series.cagr(0, n, metric='avg_size')
+            print(f"  Average set size CAGR: {cagr:.1f}%" if cagr is not None else "  Average set size CAGR: n/a")
+            for label, value in series.rolling_average_set_size(args.window).items():
+                print(f"  {args.window} {args.granularity}s to {label}: {value:.1f} cards per set")
+
+
+if __name__ == "__main__":
+    main()
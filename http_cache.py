@@ -0,0 +1,164 @@
+# Lance
+
+import gzip
+import hashlib
+import json
+import marshal
+import os
+import sys
+import time
+
+import requests
+
+from instrumentation import span
+
+CACHE_DIR = ".http_cache"
+MAX_CACHE_BYTES = 50 * 1024 * 1024 # 50 MB
+# marshal data is only readable by the Python that wrote it, so snapshots are tagged with this
+PARSED_FORMAT = f"{sys.version_info[0]}.{sys.version_info[1]}/marshal{marshal.version}"
+
+
+def _entry_paths(cache_dir, url):
+    key = hashlib.sha256(url.encode()).hexdigest()
+    base = os.path.join(cache_dir, key)
+    return base + ".meta.json", base + ".body.gz", base + ".parsed"
+
+
+def _read_meta(meta_path):
+    try:
+        with open(meta_path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _replace(path, write, mode='wb'):
+    # Write to a temporary file and swap it in, so readers never see half a file
+    tmp_path = path + ".tmp"
+    with open(tmp_path, mode) as f:
+        write(f)
+    os.replace(tmp_path, path)
+
+
+def _write_meta(meta_path, meta):
+    _replace(meta_path, lambda f: json.dump(meta, f), 'w')
+
+
+def _load_parsed(parsed_path, body_path, meta):
+    # The marshal snapshot skips the JSON parse; the gzip body is the fallback,
+    # and the only option when the snapshot was written by another Python
+    if meta.get('parsed_format') == PARSED_FORMAT:
+        try:
+            with open(parsed_path, 'rb') as f:
+                return marshal.load(f)
+        except (OSError, EOFError, ValueError, TypeError):
+            pass
+    try:
+        with gzip.open(body_path, 'rb') as f:
+            return json.loads(f.read())
+    except (OSError, ValueError):
+        return None
+
+
+def _store(cache_dir, url, response, data):
+    meta_path, body_path, parsed_path = _entry_paths(cache_dir, url)
+    _replace(body_path, lambda f: f.write(gzip.compress(response.content, compresslevel=6)))
+    _replace(parsed_path, lambda f: marshal.dump(data, f))
+
+    now = time.time()
+    _write_meta(meta_path, {
+        'url': url,
+        'etag': response.headers.get('ETag'),
+        'last_modified': response.headers.get('Last-Modified'),
+        'fetched_at': now,
+        'last_used': now,
+        'parsed_format': PARSED_FORMAT,
+        'size': os.path.getsize(body_path) + os.path.getsize(parsed_path),
+    })
+
+
+def evict(cache_dir=CACHE_DIR, max_bytes=MAX_CACHE_BYTES, keep=None):
+    """
+    Remove least recently used entries until the cache fits in max_bytes.
+
+    The entry for url `keep` (the one just stored) is never removed, so a
+    payload larger than max_bytes is still served from the cache next time.
+
+    Returns:
+        int: number of entries removed
+    """
+    entries = []
+    for filename in os.listdir(cache_dir):
+        if filename.endswith(".meta.json"):
+            meta = _read_meta(os.path.join(cache_dir, filename))
+            if meta:
+                entries.append((meta.get('last_used', 0), meta.get('size', 0), meta['url']))
+
+    total_size = sum(size for _, size, _ in entries)
+    removed = 0
+    for _, size, url in sorted(entries):
+        if total_size <= max_bytes:
+            break
+        if url == keep: continue
+        for path in _entry_paths(cache_dir, url):
+            if os.path.exists(path):
+                os.remove(path)
+        total_size -= size
+        removed += 1
+    return removed
+
+
+def cached_get_json(url, session=None, cache_dir=CACHE_DIR, max_bytes=MAX_CACHE_BYTES, max_age=0, timeout=60):
+    """
+    GET a JSON url through the on-disk cache.
+
+    Entries younger than max_age seconds are served without touching the network.
+    Older entries are revalidated with If-None-Match / If-Modified-Since, and a
+    304 answer is served from the parsed snapshot on disk, so unchanged payloads
+    are neither downloaded nor re-parsed.
+
+    Returns:
+        tuple: (data, status) - status is 'fresh', 'revalidated' or 'downloaded'
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    meta_path, body_path, parsed_path = _entry_paths(cache_dir, url)
+    meta = _read_meta(meta_path)
+    http = session or requests
+
+    headers = {}
+    if meta:
+        if max_age and time.time() - meta['fetched_at'] < max_age:
+            data = _load_parsed(parsed_path, body_path, meta)
+            if data is not None:
+                meta['last_used'] = time.time()
+                _write_meta(meta_path, meta)
+                return data, 'fresh'
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+
+    with span("http.fetch") as s:
+        response = http.get(url, headers=headers, timeout=timeout)
+        s.add(bytes=len(response.content))
+
+    if response.status_code == 304:
+        data = _load_parsed(parsed_path, body_path, meta) if meta else None
+        if data is not None:
+            meta['fetched_at'] = meta['last_used'] = time.time()
+            _write_meta(meta_path, meta)
+            return data, 'revalidated'
+        # Nothing local to serve (snapshot gone, or a 304 we never asked for): fetch once unconditionally.
+        # None drops the header even when the session sets it.
+        with span("http.fetch") as s:
+            response = http.get(url, headers={'If-None-Match': None, 'If-Modified-Since': None}, timeout=timeout)
+            s.add(bytes=len(response.content))
+        if response.status_code == 304:
+            raise requests.exceptions.HTTPError(f"304 Not Modified without a cached copy for url: {url}", response=response)
+
+    response.raise_for_status()
+    with span("http.parse", bytes=len(response.content)):
+        data = response.json()
+    _store(cache_dir, url, response, data)
+    evict(cache_dir, max_bytes, keep=url)
+    return data, 'downloaded'
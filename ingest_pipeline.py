@@ -0,0 +1,331 @@
+# Lance
+
+import argparse
+import json
+import queue
+import threading
+import time
+
+import requests
+
+import pokemon_collection
+import yugioh_collection
+from bulk_insert import bulk_insert_sets
+from db_manager import open_db
+from json_stream import iter_json_array
+from migrations import migrate
+
+_DONE = object() # End-of-stream marker passed down each queue
+
+
+class PipelineSource:
+    """
+    One upstream API split into pipeline stages.
+
+    jobs() lists what the fetchers work through, fetch() yields the raw payload
+    pieces of one job and parse() turns a stream of pieces into lists of
+    (name, release_date, card_count) records. An ordered source streams one
+    payload in pieces, so it runs with a single fetcher and a single parser.
+    """
+    game = None
+    ordered = False
+
+    def open_session(self, pool_size):
+        return pokemon_collection.create_session(None, pool_size)
+
+    def jobs(self, session):
+        raise NotImplementedError
+
+    def fetch(self, session, job):
+        raise NotImplementedError
+
+    def parse(self, pieces):
+        raise NotImplementedError
+
+
+class PokemonSource(PipelineSource):
+    game = 'pokemon'
+
+    def __init__(self, api_key=None, base_url=pokemon_collection.POKEMON_API_URL, page_size=pokemon_collection.MAX_PAGE_SIZE):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.page_size = min(page_size, pokemon_collection.MAX_PAGE_SIZE)
+        self.first_page = None
+
+    def open_session(self, pool_size):
+        return pokemon_collection.create_session(self.api_key, pool_size)
+
+    def _get(self, session, page_number):
+        response = session.get(f"{self.base_url}/sets", params={'pageSize': self.page_size, 'page': page_number}, timeout=30)
+        response.raise_for_status()
+        return response.content
+
+    def jobs(self, session):
+        # Page 1 tells us how many pages there are; keep its body so it is not fetched twice
+        self.first_page = self._get(session, 1)
+        total_count = json.loads(self.first_page).get('totalCount', 0)
+        return list(range(1, -(-total_count // self.page_size) + 1)) or [1]
+
+    def fetch(self, session, job):
+        if job == 1 and self.first_page is not None:
+            yield self.first_page
+        else:
+            yield self._get(session, job)
+
+    def parse(self, pieces):
+        for body in pieces:
+            records = []
+            for set_info in json.loads(body).get('data', []):
+                name = set_info.get('name')
+                release_date = set_info.get('releaseDate')
+                total = set_info.get('total')
+
+                # Filtering out incomplete data
+                if not all([name, release_date, total is not None]): continue
+                records.append((name, release_date, total))
+            yield records
+
+
+class YugiohSource(PipelineSource):
+    game = 'yugioh'
+    ordered = True # cardsets.php is one JSON array, parsed while it downloads
+
+    def __init__(self, base_url=yugioh_collection.YUGIOH_API_URL, batch_size=500):
+        self.base_url = base_url
+        self.batch_size = batch_size
+
+    def jobs(self, session):
+        return [f"{self.base_url}/cardsets.php"]
+
+    def fetch(self, session, job):
+        with session.get(job, stream=True, timeout=60) as response:
+            response.raise_for_status()
+            yield from response.iter_content(64 * 1024)
+
+    def parse(self, pieces):
+        batch = []
+        for record in yugioh_collection.iter_valid_sets(iter_json_array(pieces)):
+            batch.append(record)
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+
+def _drain(q, counts):
+    # Yield items from a queue until the end marker, counting what went through and the time spent waiting
+    while True:
+        began = time.perf_counter()
+        item = q.get()
+        counts['wait_seconds'] += time.perf_counter() - began
+        if item is _DONE:
+            counts['done'] = True
+            return
+        counts['items'] += 1
+        counts['bytes'] += len(item)
+        yield item
+
+
+def run_pipeline(conn, source, fetchers=4, parsers=2, queue_size=16, batch_rows=5000):
+    """
+    Ingest one source through fetch -> parse -> write stages joined by bounded queues.
+
+    Fetcher and parser threads run in the background; the calling thread is the
+    only SQLite writer and groups records into transactions of about batch_rows.
+    When writing falls behind the queues fill up and block the stages before
+    them, so at most about queue_size payloads and record lists are held in memory.
+
+    Args:
+        conn: SQLite database connection (only used from the calling thread)
+        source: a PipelineSource
+        fetchers: concurrent fetcher threads (1 for ordered sources)
+        parsers: parser threads (1 for ordered sources)
+        queue_size: capacity of each queue between stages
+        batch_rows: records per write transaction
+    Returns:
+        dict: inserted, seconds, errors and per-stage / per-queue stats
+    """
+    if source.ordered:
+        fetchers = parsers = 1
+    migrate(conn) # Unique (name, date) rows, so a page seen twice is not stored twice
+
+    raw_q = queue.Queue(maxsize=queue_size)
+    record_q = queue.Queue(maxsize=queue_size)
+    job_q = queue.Queue()
+    stages = {
+        'fetch': {'threads': fetchers, 'items': 0, 'bytes': 0, 'busy_seconds': 0.0},
+        'parse': {'threads': parsers, 'items': 0, 'bytes': 0, 'rows': 0, 'busy_seconds': 0.0},
+        'write': {'threads': 1, 'batches': 0, 'rows': 0, 'inserted': 0, 'busy_seconds': 0.0},
+    }
+    depth = {'raw': [0, 0], 'records': [0, 0]} # [max, sum of samples]
+    errors = []
+    lock = threading.Lock()
+    start = time.perf_counter()
+
+    session = source.open_session(fetchers)
+    try:
+        for job in source.jobs(session):
+            job_q.put(job)
+    except requests.exceptions.RequestException as e:
+        session.close()
+        print(f"Error fetching data from API: {e}")
+        return {'inserted': 0, 'seconds': time.perf_counter() - start, 'errors': [str(e)], 'stages': stages, 'queues': {}}
+
+    def fetcher():
+        counts = {'items': 0, 'bytes': 0, 'busy_seconds': 0.0}
+        try:
+            while True:
+                try:
+                    job = job_q.get_nowait()
+                except queue.Empty:
+                    break
+                pieces = source.fetch(session, job)
+                while True:
+                    began = time.perf_counter()
+                    try:
+                        piece = next(pieces)
+                    except StopIteration:
+                        break
+                    except requests.exceptions.RequestException as e:
+                        with lock:
+                            errors.append(f"{job}: {e}")
+                        break
+                    counts['busy_seconds'] += time.perf_counter() - began
+                    counts['items'] += 1
+                    counts['bytes'] += len(piece)
+                    raw_q.put(piece) # Blocks while the parsers are behind
+        except Exception as e:
+            # Anything else ends this fetcher; the others and close_fetch_stage carry on
+            with lock:
+                errors.append(f"fetch: {e!r}")
+        finally:
+            with lock:
+                for key, value in counts.items():
+                    stages['fetch'][key] += value
+
+    def parser():
+        counts = {'items': 0, 'bytes': 0, 'wait_seconds': 0.0, 'done': False}
+        busy = 0.0
+        rows = 0
+        pieces = _drain(raw_q, counts)
+        try:
+            batches = source.parse(pieces)
+            while True:
+                began = time.perf_counter()
+                try:
+                    records = next(batches, None)
+                finally:
+                    busy += time.perf_counter() - began
+                if records is None:
+                    break
+                rows += len(records)
+                record_q.put(records) # Blocks while the writer is behind
+        except Exception as e:
+            with lock:
+                errors.append(f"parse: {e}" if isinstance(e, ValueError) else f"parse: {e!r}")
+            if not counts['done']:
+                for _ in iter(raw_q.get, _DONE): pass # Keep consuming so the fetchers are never stuck
+        finally:
+            with lock:
+                stages['parse']['items'] += counts['items']
+                stages['parse']['bytes'] += counts['bytes']
+                stages['parse']['busy_seconds'] += busy - counts['wait_seconds'] # Parsing only, not waiting for input
+                stages['parse']['rows'] += rows
+            record_q.put(_DONE) # Always, or the writer would wait for this parser forever
+
+    def close_fetch_stage(threads):
+        # Once every fetcher is done, tell each parser there is nothing more coming
+        for thread in threads:
+            thread.join()
+        for _ in range(parsers):
+            raw_q.put(_DONE)
+
+    fetch_threads = [threading.Thread(target=fetcher, daemon=True) for _ in range(fetchers)]
+    parse_threads = [threading.Thread(target=parser, daemon=True) for _ in range(parsers)]
+    for thread in fetch_threads + parse_threads:
+        thread.start()
+    threading.Thread(target=close_fetch_stage, args=(fetch_threads,), daemon=True).start()
+
+    # WRITER: this thread, so the connection never crosses threads
+    write = stages['write']
+    pending = []
+    samples = 0
+    finished_parsers = 0
+
+    def flush():
+        began = time.perf_counter()
+        write['inserted'] += bulk_insert_sets(conn, source.game, pending)
+        write['busy_seconds'] += time.perf_counter() - began
+        write['batches'] += 1
+        write['rows'] += len(pending)
+        pending.clear()
+
+    try:
+        while finished_parsers < parsers:
+            records = record_q.get()
+            for name, q in (('raw', raw_q), ('records', record_q)):
+                size = q.qsize()
+                depth[name][0] = max(depth[name][0], size)
+                depth[name][1] += size
+            samples += 1
+            if records is _DONE:
+                finished_parsers += 1
+                continue
+            pending.extend(records)
+            if len(pending) >= batch_rows:
+                flush()
+        if pending:
+            flush()
+    finally:
+        # Stage threads are daemons, so a writer error cannot leave the process hanging on them
+        session.close()
+
+    seconds = time.perf_counter() - start
+    for name, stage in stages.items():
+        count = stage.get('rows', stage.get('items', 0))
+        stage['per_second'] = round(count / seconds, 1) if seconds > 0 else 0.0
+    queues = {name: {'capacity': queue_size, 'max_depth': peak, 'avg_depth': round(total / samples, 2) if samples else 0.0}
+              for name, (peak, total) in depth.items()}
+    return {'inserted': write['inserted'], 'seconds': seconds, 'errors': errors, 'stages': stages, 'queues': queues}
+
+
+def print_pipeline_report(game, result):
+    print("\n" + "-" * 50)
+    print(f"Pipeline Summary ({game}, {result['seconds']:.2f}s):")
+    print(f"  - Inserted {result['inserted']} new sets")
+    for name, stage in result['stages'].items():
+        print(f"  - {name:<5} x{stage['threads']}: {stage.get('rows', stage.get('items', 0))} items, {stage['per_second']:,.0f}/s, busy {stage['busy_seconds']:.2f}s")
+    for name, q in result['queues'].items():
+        print(f"  - {name} queue: max depth {q['max_depth']}/{q['capacity']}, avg {q['avg_depth']}")
+    for error in result['errors']:
+        print(f"  ! {error}")
+    print("-" * 50)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pipelined set ingest: concurrent fetchers, parsers and one SQLite writer")
+    parser.add_argument("--game", choices=["pokemon", "yugioh", "both"], default="both")
+    parser.add_argument("--pokemon-base-url", default=pokemon_collection.POKEMON_API_URL)
+    parser.add_argument("--yugioh-base-url", default=yugioh_collection.YUGIOH_API_URL)
+    parser.add_argument("--fetchers", type=int, default=4)
+    parser.add_argument("--parsers", type=int, default=2)
+    parser.add_argument("--queue-size", type=int, default=16)
+    parser.add_argument("--batch-rows", type=int, default=5000)
+    args = parser.parse_args()
+
+    with open_db("tcg_data.db") as conn:
+        sources = []
+        if args.game in ("pokemon", "both"):
+            pokemon_collection.initialize_db(conn)
+            sources.append(PokemonSource(pokemon_collection.get_api_key("pokemon_api_key.txt"), args.pokemon_base_url))
+        if args.game in ("yugioh", "both"):
+            yugioh_collection.initialize_db(conn)
+            sources.append(YugiohSource(args.yugioh_base_url))
+        for source in sources:
+            result = run_pipeline(conn, source, args.fetchers, args.parsers, args.queue_size, args.batch_rows)
+            print_pipeline_report(source.game, result)
+
+
+if __name__ == "__main__":
+    main()
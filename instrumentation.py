@@ -0,0 +1,225 @@
+# Lance
+
+import argparse
+import atexit
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+
+METRICS_ENV = "TCG_METRICS_DIR" # Turns metrics on without touching the command line
+PROFILE_ENV = "TCG_PROFILE_DIR"
+
+_run = None # The active Run, or None when instrumentation is off
+
+
+class _NoopSpan:
+    # Returned by span() while instrumentation is off: entering, leaving and add() do nothing
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def add(self, rows=0, bytes=0):
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+class Span:
+    """
+    One timed stage. Rows and bytes can be added while it runs, e.g. span.add(rows=len(records)).
+    """
+    __slots__ = ('run', 'name', 'rows', 'bytes', 'start')
+
+    def __init__(self, run, name, rows, bytes):
+        self.run = run
+        self.name = name
+        self.rows = rows
+        self.bytes = bytes
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.run.record(self.name, time.perf_counter() - self.start, self.rows, self.bytes, exc_type is not None)
+        return False
+
+    def add(self, rows=0, bytes=0):
+        self.rows += rows
+        self.bytes += bytes
+
+
+class Run:
+    """
+    Totals for every span name over one script run, safe to record into from any thread.
+    """
+
+    def __init__(self, script, metrics_dir=None, profile_dir=None):
+        self.script = script
+        self.metrics_dir = metrics_dir
+        self.profile_dir = profile_dir
+        self.started_at = datetime.now()
+        self.start = time.perf_counter()
+        self.spans = {}
+        self.lock = threading.Lock()
+        self.profiler = None
+        if profile_dir:
+            import cProfile # Only paid for when profiling
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+
+    def record(self, name, seconds, rows, bytes, failed):
+        with self.lock:
+            stats = self.spans.get(name)
+            if stats is None:
+                stats = self.spans[name] = {'count': 0, 'seconds': 0.0, 'max_seconds': 0.0, 'rows': 0, 'bytes': 0, 'errors': 0}
+            stats['count'] += 1
+            stats['seconds'] += seconds
+            stats['max_seconds'] = max(stats['max_seconds'], seconds)
+            stats['rows'] += rows
+            stats['bytes'] += bytes
+            stats['errors'] += failed
+
+    def summary(self):
+        with self.lock:
+            spans = {name: dict(stats) for name, stats in sorted(self.spans.items())}
+        for stats in spans.values():
+            stats['seconds'] = round(stats['seconds'], 6)
+            stats['max_seconds'] = round(stats['max_seconds'], 6)
+            if stats['seconds'] > 0 and stats['rows']:
+                stats['rows_per_second'] = round(stats['rows'] / stats['seconds'], 1)
+        return {
+            'script': self.script,
+            'started_at': self.started_at.isoformat(timespec='seconds'),
+            'wall_seconds': round(time.perf_counter() - self.start, 6),
+            'argv': sys.argv[1:],
+            'spans': spans,
+        }
+
+    def finish(self):
+        """
+        Write the metrics JSON and the pstats dump (if profiling).
+
+        Returns:
+            list: paths written
+        """
+        stamp = self.started_at.strftime("%Y%m%d-%H%M%S")
+        written = []
+        if self.profiler:
+            self.profiler.disable()
+            os.makedirs(self.profile_dir, exist_ok=True)
+            path = os.path.join(self.profile_dir, f"{self.script}-{stamp}-{os.getpid()}.pstats")
+            self.profiler.dump_stats(path)
+            written.append(path)
+        if self.metrics_dir:
+            os.makedirs(self.metrics_dir, exist_ok=True)
+            path = os.path.join(self.metrics_dir, f"{self.script}-{stamp}-{os.getpid()}.json")
+            with open(path, 'w') as f:
+                json.dump(self.summary(), f, indent=2)
+            written.append(path)
+        return written
+
+
+def span(name, rows=0, bytes=0):
+    """
+    Time a stage: with span("http.fetch") as s: ...; s.add(bytes=len(body))
+
+    While instrumentation is off this is one global lookup and returns a shared no-op.
+    """
+    run = _run
+    if run is None:
+        return _NOOP
+    return Span(run, name, rows, bytes)
+
+
+def timed(name):
+    """
+    Decorator form of span() for a whole function.
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if _run is None:
+                return function(*args, **kwargs)
+            with Span(_run, name, 0, 0):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def enabled():
+    return _run is not None
+
+
+def enable(script=None, metrics_dir=None, profile_dir=None):
+    """
+    Start recording for this process. Arguments left as None fall back to the
+    TCG_METRICS_DIR / TCG_PROFILE_DIR environment variables; if neither is
+    set anywhere instrumentation stays off.
+
+    The metrics file (and pstats dump) is written when the process exits,
+    or earlier with finish().
+
+    Returns:
+        bool: True if instrumentation is now on
+    """
+    global _run
+    metrics_dir = metrics_dir or os.environ.get(METRICS_ENV)
+    profile_dir = profile_dir or os.environ.get(PROFILE_ENV)
+    if _run is not None or not (metrics_dir or profile_dir):
+        return _run is not None
+
+    script = script or os.path.splitext(os.path.basename(sys.argv[0] or "python"))[0]
+    _run = Run(script, metrics_dir, profile_dir)
+    atexit.register(finish)
+    return True
+
+
+def finish():
+    """
+    Stop recording and write this run's files.
+
+    Returns:
+        list: paths written (empty if instrumentation was off)
+    """
+    global _run
+    run, _run = _run, None
+    if run is None:
+        return []
+    written = run.finish()
+    for path in written:
+        print(f"-> Metrics written to {path}")
+    return written
+
+
+def add_arguments(parser):
+    # The same two flags on every script
+    parser.add_argument("--metrics", metavar="DIR", default=None, help=f"write a per-run JSON timing file to DIR (or set {METRICS_ENV})")
+    parser.add_argument("--profile", metavar="DIR", default=None, help=f"write a cProfile .pstats dump of the whole run to DIR (or set {PROFILE_ENV})")
+
+
+def main():
+    # Summarize a metrics file: python instrumentation.py metrics/run.json
+    parser = argparse.ArgumentParser(description="Print the slowest stages of a metrics file")
+    parser.add_argument("path")
+    args = parser.parse_args()
+
+    with open(args.path, 'r') as f:
+        summary = json.load(f)
+    print(f"{summary['script']} at {summary['started_at']}: {summary['wall_seconds']:.3f}s wall")
+    print(f"  {'Stage':<32} | {'Count':>6} | {'Seconds':>9} | {'Rows':>9} | {'Bytes':>11}")
+    for name, stats in sorted(summary['spans'].items(), key=lambda item: -item[1]['seconds']):
+        print(f"  {name:<32} | {stats['count']:>6} | {stats['seconds']:>9.4f} | {stats['rows']:>9} | {stats['bytes']:>11}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+# Lance
+
+import codecs
+import json
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\n\r"
+
+
+def _skip(buffer, pos, chars):
+    while pos < len(buffer) and buffer[pos] in chars:
+        pos += 1
+    return pos
+
+
+def iter_json_array(chunks):
+    """
+    Yield the items of a top-level JSON array as the bytes arrive.
+
+    Only the items not yet yielded are kept in memory, so a huge array is
+    parsed in roughly constant memory and the first items are available
+    before the download finishes.
+
+    Args:
+        chunks: iterable of bytes, e.g. response.iter_content(65536)
+    Yields:
+        each decoded array item
+    """
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    chunks = iter(chunks)
+    buffer = ""
+    pos = 0
+    started = False
+    finished = False
+
+    while True:
+        pos = _skip(buffer, pos, _WHITESPACE + ("," if started else ""))
+
+        if pos < len(buffer):
+            if not started:
+                if buffer[pos] != "[":
+                    raise ValueError("Expected a JSON array")
+                started = True
+                pos += 1
+                continue
+            if buffer[pos] == "]":
+                return
+            try:
+                item, end = _decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if finished:
+                    raise
+            else:
+                # The item may be cut short (e.g. a number) if it ends the buffer
+                if end < len(buffer) or finished:
+                    yield item
+                    pos = end
+                    continue
+
+        if finished:
+            raise ValueError("Unexpected end of JSON array")
+
+        # Drop what has been consumed and read more
+        buffer = buffer[pos:]
+        pos = 0
+        chunk = next(chunks, None)
+        if chunk is None:
+            buffer += utf8.decode(b"", final=True)
+            finished = True
+        else:
+            buffer += utf8.decode(chunk)
@@ -0,0 +1,257 @@
+# Lance
+
+import argparse
+import re
+import sqlite3
+import sys
+from datetime import datetime
+
+from db_manager import open_db
+from tcg_schema import GAMES, add_date_columns
+
+ANALYSIS_LIMIT = 1000 # Rows ANALYZE samples per index, keeps it quick on millions of sets
+
+
+def _table_exists(cursor, name):
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,))
+    return cursor.fetchone() is not None
+
+
+# Every migration is idempotent, so one interrupted before its schema_version
+# row is written is simply run again next time.
+
+def _base_tables(conn):
+    # The tables both collectors used to create in initialize_db
+    with conn:
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS "Pokemon Release Dates" (
+            releaseDate_id INTEGER PRIMARY KEY,
+            releaseDate TEXT UNIQUE NOT NULL
+        );
+        """)
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS "Pokemon Sets" (
+            set_id INTEGER PRIMARY KEY,
+            name TEXT,
+            total INTEGER,
+            releaseDate_id INTEGER,
+            FOREIGN KEY (releaseDate_id)
+                REFERENCES "Pokemon Release Dates" (releaseDate_id)
+        );
+        """)
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS "Yu-Gi-Oh Release Dates" (
+            tcg_date_id INTEGER PRIMARY KEY,
+            tcg_date TEXT UNIQUE NOT NULL
+        );
+        """)
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS "Yu-Gi-Oh Sets" (
+            set_id INTEGER PRIMARY KEY,
+            set_name TEXT,
+            num_of_cards INTEGER,
+            tcg_date_id INTEGER,
+            FOREIGN KEY (tcg_date_id)
+                REFERENCES "Yu-Gi-Oh Release Dates" (tcg_date_id)
+            UNIQUE(set_name, tcg_date_id)
+        );
+        """)
+
+
+def _date_columns(conn):
+    for game in GAMES:
+        add_date_columns(conn, game)
+
+
+def _covering_indexes(conn):
+    # (date id, card count) answers every per-year join from the index alone
+    with conn:
+        for game, t in GAMES.items():
+            conn.execute(f'CREATE INDEX IF NOT EXISTS "{game}_sets_date_count" ON "{t["sets_table"]}" ("{t["date_id"]}", "{t["count"]}")')
+
+
+def analyze(conn):
+    """
+    Refresh the planner statistics. Worth re-running after a large bulk load.
+    """
+    conn.execute(f"PRAGMA analysis_limit = {ANALYSIS_LIMIT}")
+    conn.execute("ANALYZE")
+    conn.commit()
+
+
+# Rows that point at a "Pokemon Sets" set_id, as (table, extra WHERE condition)
+POKEMON_SET_REFERENCES = [
+    ("Pokemon Cards", ""),
+    ("sync_state", " AND game = 'pokemon'"),
+]
+
+
+def _unique_pokemon_sets(conn):
+    # Every insert path uses INSERT OR IGNORE, which needs this index to ignore against.
+    # Duplicates left by earlier runs go first (keeping the oldest), so they stop inflating the per-year sums.
+    cursor = conn.cursor()
+    cursor.execute("""
+    SELECT s.set_id, k.keep_id
+    FROM "Pokemon Sets" s
+    JOIN (SELECT name, releaseDate_id, MIN(set_id) AS keep_id FROM "Pokemon Sets" GROUP BY name, releaseDate_id) k
+        ON s.name IS k.name AND s.releaseDate_id IS k.releaseDate_id
+    WHERE s.set_id != k.keep_id
+    """)
+    duplicates = cursor.fetchall()
+
+    with conn:
+        # Cards and sync rows move to the surviving set first, so nothing dangles (or trips foreign_keys)
+        for table, condition in POKEMON_SET_REFERENCES:
+            if _table_exists(cursor, table):
+                cursor.executemany(f'UPDATE "{table}" SET set_id = ? WHERE set_id = ?{condition}', [(keep, old) for old, keep in duplicates])
+        cursor.executemany('DELETE FROM "Pokemon Sets" WHERE set_id = ?', [(old,) for old, _ in duplicates])
+        cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS pokemon_sets_name_date ON "Pokemon Sets" (name, releaseDate_id)')
+
+
+# (version, name, function) in the order they are applied. Only ever append.
+MIGRATIONS = [
+    (1, "base tables", _base_tables),
+    (2, "year and month date columns", _date_columns),
+    (3, "covering (date id, card count) indexes", _covering_indexes),
+    (4, "planner statistics", analyze),
+    (5, "unique Pokemon sets per (name, release date)", _unique_pokemon_sets),
+]
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def current_version(conn):
+    """
+    Returns:
+        int: highest migration applied to this database (0 if none)
+    """
+    cursor = conn.cursor()
+    if not _table_exists(cursor, 'schema_version'):
+        return 0
+    cursor.execute("SELECT MAX(version) FROM schema_version")
+    return cursor.fetchone()[0] or 0
+
+
+def migrate(conn, target=LATEST_VERSION, verbose=False):
+    """
+    Bring the database schema up to `target` in place, applying each pending migration once.
+
+    Cheap when nothing is pending (one lookup), so it is safe to call on every open.
+
+    Args:
+        conn: SQLite database connection
+        target: stop after this version
+        verbose: print each migration as it is applied
+    Returns:
+        list: versions applied by this call
+    """
+    version = current_version(conn)
+    if version >= target:
+        return []
+
+    with conn:
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TEXT NOT NULL
+        );
+        """)
+
+    applied = []
+    for number, name, function in MIGRATIONS:
+        if number <= version or number > target: continue
+        if verbose:
+            print(f"-> Applying migration {number}: {name}")
+        function(conn)
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO schema_version (version, name, applied_at) VALUES (?, ?, ?)",
+                         (number, name, datetime.now().isoformat(timespec='seconds')))
+        applied.append(number)
+    return applied
+
+
+def plan_queries():
+    """
+    The SQL behind the calculate_* functions, as (label, sql, tables that must be read through an index).
+
+    get_yearly_stats and get_distribution_stats normally read the small
+    trigger-maintained tables; their fallbacks and the growth series join the
+    sets tables directly, which is where a missing index would hurt.
+    """
+    # Imported here: both modules sit above this one (yearly_summary runs migrate())
+    import tcg_stats
+    from growth_analytics import SERIES_QUERY
+
+    queries = []
+    for game, t in GAMES.items():
+        queries.append((f"{game} yearly stats (fallback join)", tcg_stats.YEARLY_STATS_QUERY.format(game=game, year="rd.year", **t), {"s", "rd"}))
+        queries.append((f"{game} size distribution (histogram table)",
+                        tcg_stats.DISTRIBUTION_QUERY.format(histogram=tcg_stats.HISTOGRAM_TABLE.format(game=game)), {"set_size_histogram"}))
+        queries.append((f"{game} size distribution (fallback join)",
+                        tcg_stats.DISTRIBUTION_QUERY.format(histogram=tcg_stats.HISTOGRAM_SCAN.format(year="rd.year", **t)), {"s", "rd"}))
+        queries.append((f"{game} growth series", SERIES_QUERY.format(year="rd.year", month="rd.month", **t), {"s", "rd"}))
+    return queries
+
+
+def check_query_plans(conn):
+    """
+    Run EXPLAIN QUERY PLAN on every calculation query and flag full table scans.
+
+    A step like "SCAN ps" (no index) on one of the watched tables is a
+    regression; "SEARCH ..." and "SCAN ... USING COVERING INDEX" are fine.
+    Only reads: a query whose table is missing (e.g. set_size_histogram
+    before install_summary) is skipped rather than created.
+
+    Returns:
+        tuple: (failures, skipped) - failures is (label, plan step) for every offending step,
+        skipped is (label, error) for every query that could not be planned
+    """
+    failures = []
+    skipped = []
+    for label, sql, watched in plan_queries():
+        try:
+            plan = conn.execute("EXPLAIN QUERY PLAN " + sql).fetchall()
+        except sqlite3.OperationalError as e:
+            skipped.append((label, str(e)))
+            continue
+        for row in plan:
+            detail = row[3]
+            match = re.match(r"SCAN (\S+)", detail)
+            if match and match.group(1) in watched and "INDEX" not in detail:
+                failures.append((label, detail))
+    return failures, skipped
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Versioned schema migrations for tcg_data.db")
+    parser.add_argument("command", choices=["status", "migrate", "analyze", "check-plans"])
+    parser.add_argument("--db", default="tcg_data.db")
+    parser.add_argument("--target", type=int, default=LATEST_VERSION, help="migrate up to this version")
+    args = parser.parse_args()
+
+    with open_db(args.db) as conn:
+        if args.command == "status":
+            version = current_version(conn)
+            print(f"Schema version {version} of {LATEST_VERSION}")
+            for number, name, _ in MIGRATIONS:
+                print(f"  [{'x' if number <= version else ' '}] {number}: {name}")
+        elif args.command == "migrate":
+            applied = migrate(conn, args.target, verbose=True)
+            print(f"Schema at version {current_version(conn)} ({len(applied)} migration(s) applied)")
+        elif args.command == "analyze":
+            analyze(conn)
+            print("Planner statistics refreshed")
+        else:
+            migrate(conn)
+            failures, skipped = check_query_plans(conn)
+            for label, error in skipped:
+                print(f"  {label}: skipped ({error})")
+            for label, detail in failures:
+                print(f"  {label}: {detail}")
+            print(f"Query plans: {'FULL SCANS FOUND' if failures else 'every calculation query uses an index'} ({len(failures)} problem(s))")
+            if failures:
+                sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
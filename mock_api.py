@@ -0,0 +1,360 @@
+# Lance
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import requests
+
+FIXTURE_FILES = {'pokemon': "pokemon_sets.json", 'yugioh': "yugioh_sets.json"}
+ERROR_STATUSES = (500, 502, 503)
+# Recording always reads the real APIs, whatever TCG_*_API_URL points the collectors at
+POKEMON_UPSTREAM_URL = "https://api.pokemontcg.io/v2"
+YUGIOH_UPSTREAM_URL = "https://db.ygoprodeck.com/api/v7"
+
+
+def make_pokemon_sets(count):
+    # Synthetic sets shaped like the /v2/sets response items
+    sets = []
+    for i in range(count):
+        year = 1999 + (i % 25)
+        sets.append({
+            'id': f"mock{i + 1}",
+            'name': f"Mock Set {i + 1}",
+            'total': 60 + (i * 7) % 150,
+            'releaseDate': f"{year}/{(i % 12) + 1:02d}/{(i % 28) + 1:02d}",
+            'updatedAt': "2024/01/01 00:00:00",
+        })
+    return sets
+
+
+def make_yugioh_sets(count):
+    # Synthetic sets shaped like the cardsets.php response items
+    sets = []
+    for i in range(count):
+        year = 2002 + (i % 22)
+        sets.append({
+            'set_name': f"Mock Yu-Gi-Oh Set {i + 1}",
+            'set_code': f"MYS{i + 1:04d}",
+            'num_of_cards': 20 + (i * 11) % 100,
+            'tcg_date': f"{year}-{(i % 12) + 1:02d}-{(i % 28) + 1:02d}",
+        })
+    return sets
+
+
+def scale_sets(sets, factor):
+    """
+    Repeat a list of set dicts `factor` times. Copies after the first get a
+    " #n" name suffix and suffixed ids/codes, so they are distinct sets with
+    the same sizes and release dates as the originals.
+    """
+    scaled = list(sets)
+    for copy in range(2, factor + 1):
+        for set_info in sets:
+            set_info = dict(set_info)
+            name_key = 'name' if 'name' in set_info else 'set_name'
+            set_info[name_key] = f"{set_info[name_key]} #{copy}"
+            for key in ('id', 'set_code'):
+                if key in set_info:
+                    set_info[key] = f"{set_info[key]}x{copy}"
+            scaled.append(set_info)
+    return scaled
+
+
+def record_fixtures(fixture_dir, api_key=None, pokemon_base_url=POKEMON_UPSTREAM_URL, yugioh_base_url=YUGIOH_UPSTREAM_URL):
+    """
+    Download every set from the real APIs into fixture files the server can replay.
+
+    Only the set lists are recorded; pagination, card lists and conditions
+    are produced by the server, so one recording serves any page size or scale.
+
+    Returns:
+        dict: {game: number of sets recorded}
+    """
+    import pokemon_collection
+
+    recorded = {
+        'pokemon': pokemon_collection.fetch_all_sets(api_key, base_url=pokemon_base_url),
+    }
+    response = requests.get(f"{yugioh_base_url}/cardsets.php", timeout=60)
+    response.raise_for_status()
+    recorded['yugioh'] = response.json()
+
+    os.makedirs(fixture_dir, exist_ok=True)
+    for game, sets in recorded.items():
+        with open(os.path.join(fixture_dir, FIXTURE_FILES[game]), 'w') as f:
+            json.dump(sets, f)
+    return {game: len(sets) for game, sets in recorded.items()}
+
+
+def load_fixtures(fixture_dir):
+    """
+    Returns:
+        dict: {game: list of set dicts} for every fixture file present in fixture_dir
+    """
+    fixtures = {}
+    for game, filename in FIXTURE_FILES.items():
+        path = os.path.join(fixture_dir, filename)
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                fixtures[game] = json.load(f)
+    return fixtures
+
+
+def make_pokemon_cards(sets):
+    # One /v2/cards item per card each set says it has
+    rarities = ["Common", "Uncommon", "Rare", "Rare Holo"]
+    cards = []
+    for set_info in sets:
+        card_set = {key: set_info[key] for key in ('id', 'name', 'total', 'releaseDate')}
+        for number in range(1, set_info['total'] + 1):
+            cards.append({
+                'id': f"{set_info['id']}-{number}",
+                'name': f"{set_info['name']} Card {number}",
+                'number': str(number),
+                'rarity': rarities[number % len(rarities)],
+                'set': card_set,
+            })
+    return cards
+
+
+def make_yugioh_cards(sets):
+    # cardinfo.php items, one printing per card in each set
+    rarities = ["Common", "Rare", "Super Rare", "Ultra Rare"]
+    cards = []
+    for set_info in sets:
+        for number in range(1, set_info['num_of_cards'] + 1):
+            cards.append({
+                'id': 10000000 + len(cards),
+                'name': f"{set_info['set_name']} Card {number}",
+                'card_sets': [{
+                    'set_name': set_info['set_name'],
+                    'set_code': f"{set_info['set_code']}-EN{number:03d}",
+                    'set_rarity': rarities[number % len(rarities)],
+                }],
+            })
+    return cards
+
+
+class MockAPIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1" # Keep-alive, like the real API
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+
+        # Simulated upstream conditions
+        condition = self.server.condition()
+        if condition == 'throttled':
+            self.send_json({'error': 'Too Many Requests'}, status=429, headers={'Retry-After': '0'})
+            return
+        if condition:
+            self.send_json({'error': 'Injected failure'}, status=condition)
+            return
+
+        if url.path == "/v2/sets":
+            page = int(query.get('page', ['1'])[0])
+            page_size = min(int(query.get('pageSize', ['250'])[0]), 250)
+            sets = self.server.pokemon_sets
+            data = sets[(page - 1) * page_size:page * page_size]
+            self.send_json({'data': data, 'page': page, 'pageSize': page_size, 'count': len(data), 'totalCount': len(sets)})
+        elif url.path == "/api/v7/cardsets.php":
+            self.send_json(self.server.yugioh_sets, conditional=True, cache_key='cardsets')
+        elif url.path == "/v2/cards":
+            page = int(query.get('page', ['1'])[0])
+            page_size = min(int(query.get('pageSize', ['250'])[0]), 250)
+            cards = self.server.cards('pokemon')
+            data = cards[(page - 1) * page_size:page * page_size]
+            self.send_json({'data': data, 'page': page, 'pageSize': page_size, 'count': len(data), 'totalCount': len(cards)})
+        elif url.path == "/api/v7/cardinfo.php":
+            cards = self.server.cards('yugioh')
+            if 'num' not in query:
+                self.send_json({'data': cards}, cache_key='cardinfo')
+                return
+            num = int(query['num'][0])
+            offset = int(query.get('offset', ['0'])[0])
+            remaining = max(len(cards) - offset - num, 0)
+            meta = {'total_rows': len(cards), 'rows_remaining': remaining, 'next_page_offset': offset + num if remaining else None}
+            self.send_json({'data': cards[offset:offset + num], 'meta': meta})
+        else:
+            self.send_json({'error': 'Not Found'}, status=404)
+
+    def send_json(self, payload, status=200, conditional=False, headers=None, cache_key=None):
+        # Whole-list payloads never change, so they are encoded once instead of per request
+        body, etag = self.server.encoded(cache_key, payload)
+        if conditional and self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        if conditional:
+            self.send_header("ETag", etag)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.count('bytes', len(body))
+
+    def log_message(self, format, *args):
+        pass # Keep the console quiet during test runs
+
+
+class MockAPIServer(ThreadingHTTPServer):
+    """
+    Both upstream APIs on one local port, with optional simulated conditions.
+
+    latency (+ up to jitter) seconds are added to every response. throttle_rate
+    and error_rate are the fractions of requests answered with 429 and with a
+    5xx; rate_limit answers 429 to whatever goes over that many requests per
+    second. seed makes the injected failures repeatable.
+    """
+    daemon_threads = True
+
+    def __init__(self, address, pokemon_sets, yugioh_sets, latency=0, jitter=0, throttle_rate=0, error_rate=0, rate_limit=0, seed=None):
+        super().__init__(address, MockAPIHandler)
+        self.pokemon_sets = pokemon_sets
+        self.yugioh_sets = yugioh_sets
+        self.latency = latency
+        self.jitter = jitter
+        self.throttle_rate = throttle_rate
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.random = random.Random(seed)
+        self.tokens = rate_limit
+        self.refilled = time.monotonic()
+        self.stats = {'requests': 0, 'throttled': 0, 'errors': 0, 'bytes': 0}
+        self.lock = threading.Lock()
+        self.card_lists = {}
+        self.cards_lock = threading.Lock()
+        self.bodies = {}
+
+    def count(self, key, amount=1):
+        with self.lock:
+            self.stats[key] += amount
+
+    def condition(self):
+        """
+        Sleep for the configured latency, then decide how this request is answered.
+
+        Returns:
+            None to serve it normally, 'throttled' for a 429, or a 5xx status
+        """
+        with self.lock:
+            self.stats['requests'] += 1
+            delay = self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0)
+            roll = self.random.random()
+            status = self.random.choice(ERROR_STATUSES)
+
+            over_limit = False
+            if self.rate_limit:
+                now = time.monotonic()
+                self.tokens = min(self.rate_limit, self.tokens + (now - self.refilled) * self.rate_limit)
+                self.refilled = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                else:
+                    over_limit = True
+
+            if over_limit or roll < self.throttle_rate:
+                self.stats['throttled'] += 1
+                result = 'throttled'
+            elif roll < self.throttle_rate + self.error_rate:
+                self.stats['errors'] += 1
+                result = status
+            else:
+                result = None
+        if delay:
+            time.sleep(delay)
+        return result
+
+    def encoded(self, cache_key, payload):
+        # (body, etag) for a payload, remembered under cache_key when one is given
+        if cache_key and cache_key in self.bodies:
+            return self.bodies[cache_key]
+        body = json.dumps(payload).encode()
+        result = (body, '"' + hashlib.md5(body).hexdigest() + '"')
+        if cache_key:
+            self.bodies[cache_key] = result
+        return result
+
+    def cards(self, game):
+        # Card lists are large, so build them the first time they are asked for
+        with self.cards_lock:
+            if game not in self.card_lists:
+                self.card_lists[game] = make_pokemon_cards(self.pokemon_sets) if game == 'pokemon' else make_yugioh_cards(self.yugioh_sets)
+            return self.card_lists[game]
+
+
+def start_server(pokemon_sets=None, yugioh_sets=None, host="127.0.0.1", port=0, latency=0, throttle_rate=0, **conditions):
+    """
+    Start the mock API in a background thread.
+
+    latency adds that many seconds to every response and throttle_rate is the
+    fraction of requests answered with 429 Too Many Requests. Other conditions
+    (jitter, error_rate, rate_limit, seed) are passed on to MockAPIServer.
+
+    Returns:
+        tuple: (server, base_url) - call server.shutdown() when done
+    """
+    server = MockAPIServer((host, port),
+                           pokemon_sets if pokemon_sets is not None else make_pokemon_sets(170),
+                           yugioh_sets if yugioh_sets is not None else make_yugioh_sets(1006),
+                           latency=latency, throttle_rate=throttle_rate, **conditions)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the Pokemon TCG /v2/sets, /v2/cards and ygoprodeck cardsets.php, cardinfo.php endpoints")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--record", metavar="DIR", help="download every set from the real APIs into fixture files in DIR, then exit")
+    parser.add_argument("--fixtures", metavar="DIR", help="serve the sets recorded in DIR instead of synthetic ones")
+    parser.add_argument("--scale", type=int, default=1, help="serve every set this many times over (e.g. 100 for 100x volume)")
+    parser.add_argument("--pokemon-sets", type=int, default=170, help="number of synthetic Pokemon sets to serve")
+    parser.add_argument("--yugioh-sets", type=int, default=1006, help="number of synthetic Yu-Gi-Oh sets to serve")
+    parser.add_argument("--latency", type=float, default=0, help="seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0, help="up to this many extra random seconds per response")
+    parser.add_argument("--throttle-rate", type=float, default=0, help="fraction of requests answered with 429")
+    parser.add_argument("--rate-limit", type=float, default=0, help="requests per second allowed before answering 429")
+    parser.add_argument("--error-rate", type=float, default=0, help="fraction of requests answered with a 500/502/503")
+    parser.add_argument("--seed", type=int, default=None, help="make injected failures repeatable")
+    args = parser.parse_args()
+
+    if args.record:
+        import pokemon_collection
+        for game, count in record_fixtures(args.record, pokemon_collection.get_api_key("pokemon_api_key.txt")).items():
+            print(f"Recorded {count} {game} sets to {os.path.join(args.record, FIXTURE_FILES[game])}")
+        return
+
+    fixtures = load_fixtures(args.fixtures) if args.fixtures else {}
+    pokemon_sets = scale_sets(fixtures.get('pokemon') or make_pokemon_sets(args.pokemon_sets), args.scale)
+    yugioh_sets = scale_sets(fixtures.get('yugioh') or make_yugioh_sets(args.yugioh_sets), args.scale)
+
+    server = MockAPIServer((args.host, args.port), pokemon_sets, yugioh_sets, latency=args.latency, jitter=args.jitter,
+                           throttle_rate=args.throttle_rate, error_rate=args.error_rate, rate_limit=args.rate_limit, seed=args.seed)
+    root = f"http://{args.host}:{server.server_address[1]}"
+    print(f"Mock API serving {len(pokemon_sets)} Pokemon and {len(yugioh_sets)} Yu-Gi-Oh sets on {root}")
+    print(f"  export TCG_POKEMON_API_URL={root}/v2 TCG_YUGIOH_API_URL={root}/api/v7")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"Served {server.stats['requests']} requests ({server.stats['throttled']} throttled, {server.stats['errors']} errors, {server.stats['bytes']:,} bytes)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,28 @@
 # Lance
 
-import requests
+import argparse
+import math
+import os
 import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from bulk_insert import bulk_insert_sets, format_insert_stats
+from db_manager import connect, open_db
+from instrumentation import add_arguments, enable, span
+from migrations import migrate
+from set_search import install_search
+from sync_state import get_last_marker, initialize_sync_state, timed_sync
+from yearly_summary import install_summary
+
+POKEMON_URL_ENV = "TCG_POKEMON_API_URL" # Points every script at another server, e.g. mock_api.py
+POKEMON_API_URL = os.environ.get(POKEMON_URL_ENV) or "https://api.pokemontcg.io/v2"
+MAX_PAGE_SIZE = 250 # Largest pageSize the API accepts
+RUN_PAGE_SIZE = 25 # Sets added per run in the default one-page-per-run mode
+TARGET_SETS = 170
 
 def get_api_key(filename):
     try:
@@ -13,32 +34,16 @@ def get_api_key(filename):
         return None
 
 
-def initialize_db(db_name):
-    conn = sqlite3.connect(db_name)
+def initialize_db(db):
+    # Takes an open connection, or a file name to open one (the caller closes it either way)
+    conn = db if isinstance(db, sqlite3.Connection) else connect(db)
     cursor = conn.cursor()
     cursor.execute("PRAGMA foreign_keys = ON;") # Foreign keys need to be explicitly turned on
 
-    # TABLE 1: Pokemon Release Dates (releaseDate_id, releaseDate)
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS "Pokemon Release Dates" (
-        releaseDate_id INTEGER PRIMARY KEY,
-        releaseDate TEXT UNIQUE NOT NULL
-    );
-    """)
-
-    # TABLE 2: Pokemon Sets (set_id, total, releaseDate_id)
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS "Pokemon Sets" (
-        set_id INTEGER PRIMARY KEY,
-        name TEXT,
-        total INTEGER,
-        releaseDate_id INTEGER,
-        FOREIGN KEY (releaseDate_id) 
-            REFERENCES "Pokemon Release Dates" (releaseDate_id)
-    );
-    """)
-    
-    conn.commit()
+    # Tables, indexes and date columns all come from the versioned migrations
+    migrate(conn)
+    install_summary(conn)
+    install_search(conn)
     return conn
 
 
@@ -49,15 +54,52 @@ def get_current_state(cursor):
     return total_sets
 
 
-def fetch_and_insert_data(conn, api_key, page_number):
+def create_session(api_key, pool_size=4):
+    # One keep-alive session so every page reuses the same TLS connections
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    if api_key:
+        session.headers['X-Api-Key'] = api_key
+    return session
+
+
+def fetch_sets_page(session, page_number, page_size=25, base_url=POKEMON_API_URL):
+    # Returns the whole response body: data, page, pageSize, count, totalCount
+    with span("pokemon.fetch") as s:
+        response = session.get(f"{base_url}/sets", params={'pageSize': page_size, 'page': page_number}, timeout=30)
+        response.raise_for_status()
+        s.add(bytes=len(response.content))
+    with span("pokemon.parse") as s:
+        body = response.json()
+        s.add(rows=len(body.get('data', [])))
+    return body
+
+
+def insert_sets(conn, sets_data, stats=None):
+    records = []
+    for set_info in sets_data:
+        name = set_info.get('name')
+        release_date = set_info.get('releaseDate')
+        total = set_info.get('total')
+
+        # Filtering out incomplete data
+        if not all([name, release_date, total is not None]): continue
+        records.append((name, release_date, total))
+
+    return bulk_insert_sets(conn, 'pokemon', records, stats=stats)
+
+
+def fetch_and_insert_data(conn, api_key, page_number, session=None, base_url=POKEMON_API_URL, stats=None):
     # Feedback for user
     print(f"-> Fetching page {page_number} (Page Size: 25)...")
     
     # FETCHING DATA
+    # A session we open here is closed here; one passed in stays open for the caller
     try:
-        response = requests.get(f"https://api.pokemontcg.io/v2/sets?pageSize=25&page={page_number}", headers={'X-Api-Key': api_key}) 
-        response.raise_for_status()
-        sets_data = response.json().get('data', [])
+        with create_session(api_key) if session is None else nullcontext(session) as session:
+            sets_data = fetch_sets_page(session, page_number, 25, base_url).get('data', [])
     except requests.exceptions.RequestException as e:
         print(f"Error fetching data from API: {e}")
         return 0, False
@@ -66,50 +108,195 @@ def fetch_and_insert_data(conn, api_key, page_number):
         return 0, False
 
     # INSERTING DATA
-    cursor = conn.cursor()
-    sets_inserted_count = 0
+    return insert_sets(conn, sets_data, stats), True
+
+
+def fetch_all_sets(api_key, page_size=MAX_PAGE_SIZE, max_workers=4, base_url=POKEMON_API_URL):
+    """
+    Fetch every page of /v2/sets in one run.
+
+    Page 1 is fetched first to learn totalCount, the remaining pages are fetched
+    concurrently over one pooled session with at most max_workers requests in flight.
+
+    Returns:
+        list: set dicts in upstream order
+    """
+    page_size = min(page_size, MAX_PAGE_SIZE)
+    session = create_session(api_key, max_workers)
+
+    try:
+        first_page = fetch_sets_page(session, 1, page_size, base_url)
+        total_count = first_page.get('totalCount', len(first_page.get('data', [])))
+        page_count = math.ceil(total_count / page_size)
+        print(f"-> Fetching {page_count} page(s) of {page_size} ({total_count} sets upstream, {max_workers} in flight)...")
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            other_pages = list(executor.map(lambda page: fetch_sets_page(session, page, page_size, base_url), range(2, page_count + 1)))
+    finally:
+        session.close()
+
+    sets_data = []
+    for page in [first_page] + other_pages:
+        sets_data.extend(page.get('data', []))
+    return sets_data
+
+
+def sync_all_sets(conn, api_key, page_size=MAX_PAGE_SIZE, max_workers=4, base_url=POKEMON_API_URL, stats=None):
+    """
+    Fetch every page of /v2/sets and insert them in upstream order.
+    Sets already stored are ignored by the unique (name, release date) index,
+    so nothing depends on the local row count matching the upstream order.
+    A stats dict, if given, collects the insert rows and seconds (see bulk_insert_sets).
+
+    Returns:
+        tuple: (sets_inserted, success)
+    """
+    # FETCHING DATA
+    try:
+        sets_data = fetch_all_sets(api_key, page_size, max_workers, base_url)
+    except requests.exceptions.RequestException as e:
+        print(f"Error fetching data from API: {e}")
+        return 0, False
+
+    if not sets_data:
+        return 0, False
+
+    # INSERTING DATA
+    return insert_sets(conn, sets_data, stats), True
+
+
+def collect_to_target(conn, api_key, target=TARGET_SETS, page_size=MAX_PAGE_SIZE, max_workers=4, base_url=POKEMON_API_URL):
+    """
+    Store the same sets repeated one-page-per-run invocations would until `target`
+    is met, in one call: only the upstream range they would cover is fetched,
+    in large pages and concurrently.
+
+    Returns:
+        tuple: (sets_inserted, success)
+    """
+    total_sets = get_current_state(conn.cursor())
+    if total_sets >= target:
+        return 0, True
+
+    # Runs always add whole pages of 25, starting at the page the row count points to
+    start = (total_sets // RUN_PAGE_SIZE) * RUN_PAGE_SIZE
+    end = math.ceil(target / RUN_PAGE_SIZE) * RUN_PAGE_SIZE
+    page_size = min(page_size, MAX_PAGE_SIZE)
+    pages = range(start // page_size + 1, (end - 1) // page_size + 2)
+    print(f"-> Fetching sets {start + 1}-{end} in {len(pages)} page(s) of {page_size}...")
+
+    session = create_session(api_key, max_workers)
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            bodies = list(executor.map(lambda page: fetch_sets_page(session, page, page_size, base_url), pages))
+    except requests.exceptions.RequestException as e:
+        print(f"Error fetching data from API: {e}")
+        return 0, False
+    finally:
+        session.close()
 
-    with conn: 
-        for set_info in sets_data:
-            name = set_info.get('name')
-            release_date = set_info.get('releaseDate')
-            total = set_info.get('total')
+    sets_data = [set_info for body in bodies for set_info in body.get('data', [])]
+    offset = (pages[0] - 1) * page_size
+    sets_data = sets_data[start - offset:end - offset]
+    if not sets_data:
+        return 0, False
+    return insert_sets(conn, sets_data), True
 
-            # Filtering out incomplete data
-            if not all([name, release_date, total is not None]): continue
 
-            cursor.execute("INSERT OR IGNORE INTO 'Pokemon Release Dates' (releaseDate) VALUES (?)", (release_date,))
-            cursor.execute("SELECT releaseDate_id FROM 'Pokemon Release Dates' WHERE releaseDate = ?", (release_date,))
-            release_date_id = cursor.fetchone()[0]
+def delta_sync(conn, api_key, page_size=MAX_PAGE_SIZE, max_workers=4, base_url=POKEMON_API_URL):
+    """
+    Sync sets keyed on their upstream id instead of the row count.
 
-            cursor.execute("""
-            INSERT OR IGNORE INTO "Pokemon Sets" (name, total, releaseDate_id)
-            VALUES (?, ?, ?)
-            """, (name, total, release_date_id)) 
-            
-            if cursor.rowcount > 0:
-                sets_inserted_count += 1
+    Only sets whose updatedAt is newer than the last sync are hashed and
+    compared, and only changed ones are written.
 
-    return sets_inserted_count, True
+    Returns:
+        dict: {'inserted': n, 'updated': n, 'unchanged': n} or None on a fetch error
+    """
+    initialize_sync_state(conn)
+    last_marker = get_last_marker(conn.cursor(), 'pokemon')
+
+    try:
+        sets_data = fetch_all_sets(api_key, page_size, max_workers, base_url)
+    except requests.exceptions.RequestException as e:
+        print(f"Error fetching data from API: {e}")
+        return None
+
+    records = []
+    marker = last_marker
+    for set_info in sets_data:
+        updated_at = set_info.get('updatedAt') or ''
+        if marker is None or updated_at > marker:
+            marker = updated_at
+        if last_marker and updated_at and updated_at <= last_marker: continue
+
+        upstream_id = set_info.get('id')
+        name = set_info.get('name')
+        release_date = set_info.get('releaseDate')
+        total = set_info.get('total')
+
+        # Filtering out incomplete data
+        if not all([upstream_id, name, release_date, total is not None]): continue
+        records.append((upstream_id, name, release_date, total))
+
+    return timed_sync(conn, 'pokemon', records, marker or None)
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Collect Pokemon TCG sets into tcg_data.db")
+    parser.add_argument("--all", action="store_true", help="fetch every page in one run instead of one page per run")
+    parser.add_argument("--delta", action="store_true", help="sync only sets that changed upstream since the last sync")
+    parser.add_argument("--pipeline", action="store_true", help="fetch, parse and write every page concurrently through bounded queues")
+    parser.add_argument("--page-size", type=int, default=MAX_PAGE_SIZE, help="page size used with --all/--delta/--pipeline (max 250)")
+    parser.add_argument("--workers", type=int, default=4, help="max concurrent requests used with --all/--delta/--pipeline")
+    parser.add_argument("--base-url", default=POKEMON_API_URL, help=f"API root, e.g. a local stub server (or set {POKEMON_URL_ENV})")
+    parser.add_argument("--target", type=int, default=TARGET_SETS, help=f"sets to collect in one-page-per-run mode (default {TARGET_SETS})")
+    add_arguments(parser)
+    args = parser.parse_args()
+    enable("pokemon_collection", args.metrics, args.profile)
+
     api_key = get_api_key("pokemon_api_key.txt")
-    with sqlite3.connect("tcg_data.db") as conn:
+    with open_db("tcg_data.db") as conn:
         cursor = conn.cursor()
-        initialize_db("tcg_data.db") 
+        initialize_db(conn)
         total_sets = get_current_state(cursor) 
 
+        if args.delta:
+            delta_sync(conn, api_key, args.page_size, args.workers, args.base_url)
+            return
+
+        if args.pipeline:
+            from ingest_pipeline import PokemonSource, print_pipeline_report, run_pipeline
+            print_pipeline_report('pokemon', run_pipeline(conn, PokemonSource(api_key, args.base_url, args.page_size), fetchers=args.workers))
+            return
+
+        if args.all:
+            stats = {}
+            sets_inserted, fetch_success = sync_all_sets(conn, api_key, args.page_size, args.workers, args.base_url, stats)
+            if stats:
+                print(format_insert_stats('pokemon', stats))
+
+            # Feedback for user
+            print("\n" + "-" * 50)
+            print("Run Summary (Full Sync):")
+            print(f"  - Inserted {sets_inserted} new sets!")
+            print(f"  - Total sets in databse: {total_sets + sets_inserted}")
+            print("-" * 50)
+            return
+
         # Feedback for user
-        print(f"DATABASE STATUS: {total_sets} sets currently stored (Target: 170)")
-        if total_sets >= 170:
+        print(f"DATABASE STATUS: {total_sets} sets currently stored (Target: {args.target})")
+        if total_sets >= args.target:
             print("\n" + "-" * 50)
             print("Target met. Congratulations!")
             print("-" * 50)
             return
 
-        next_page = (total_sets // 25) + 1 
-        sets_inserted, fetch_success = fetch_and_insert_data(conn, api_key, next_page)
+        next_page = (total_sets // RUN_PAGE_SIZE) + 1
+        stats = {}
+        sets_inserted, fetch_success = fetch_and_insert_data(conn, api_key, next_page, base_url=args.base_url, stats=stats)
+        if stats:
+            print(format_insert_stats('pokemon', stats))
         if sets_inserted > 0:
             new_total_sets = total_sets + sets_inserted
 
@@ -117,7 +304,7 @@ def main():
             print("\n" + "-" * 50)
             print(f"Run Summary (Page {next_page}):")
             print(f"  - Inserted {sets_inserted} new sets!")
-            print(f"  - Total sets in databse: {new_total_sets} out of 170")
+            print(f"  - Total sets in databse: {new_total_sets} out of {args.target}")
             print("-" * 50)
         elif fetch_success is False and next_page > 1:
             print("\n" + "-" * 50)
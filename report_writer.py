@@ -0,0 +1,230 @@
+# Brandon Reyes Parra
+
+
+import csv
+import hashlib
+import io
+import json
+import os
+import stat
+import tempfile
+
+from growth_analytics import edge_window_growth
+from tcg_stats import get_distribution_stats, get_yearly_stats
+
+EXTENSIONS = {'text': ".txt", 'csv': ".csv", 'json': ".json", 'markdown': ".md"}
+FINGERPRINT_FILE = ".report_fingerprints.json"
+GROWTH_WINDOW = 5 # Years compared at each end in Section 3
+REPORT_VERSION = 2 # Bump when the report layout changes so old fingerprints stop matching
+DISTRIBUTION_FIELDS = ('sets', 'median', 'p90', 'min', 'max', 'stddev')
+
+
+def growth_entry(label, averages, window=GROWTH_WINDOW):
+    """
+    Compare the average set size of the first and last `window` years.
+
+    Returns:
+        dict or None: label, early_avg, recent_avg and change_pct (None when the game has no years)
+    """
+    edges = edge_window_growth([averages[year] for year in sorted(averages)], window)
+    if edges is None:
+        return None
+    early_avg, recent_avg = edges
+    change_pct = (recent_avg - early_avg) / early_avg * 100 if early_avg > 0 else None
+    return {'label': label, 'early_avg': early_avg, 'recent_avg': recent_avg, 'change_pct': change_pct}
+
+
+def build_model(pokemon_total_cards, pokemon_sets, yugioh_total_cards, yugioh_sets, pokemon_average, yugioh_average,
+                pokemon_distribution=None, yugioh_distribution=None):
+    """
+    The four report sections as plain data, shared by every output format.
+    The distributions are {year: {'sets', 'median', 'p90', 'min', 'max', 'stddev'}} from tcg_stats.get_distribution_stats.
+    """
+    years = sorted(set(pokemon_total_cards) | set(pokemon_sets) | set(yugioh_total_cards) | set(yugioh_sets))
+    totals = [{
+        'year': year,
+        'pokemon_cards': pokemon_total_cards.get(year, 0),
+        'pokemon_sets': pokemon_sets.get(year, 0),
+        'yugioh_cards': yugioh_total_cards.get(year, 0),
+        'yugioh_sets': yugioh_sets.get(year, 0),
+    } for year in years]
+    averages = [{'year': year, 'pokemon_avg': pokemon_average.get(year, 0), 'yugioh_avg': yugioh_average.get(year, 0)} for year in years]
+    growth = [entry for entry in (growth_entry("Pokemon", pokemon_average), growth_entry("Yu-Gi-Oh", yugioh_average)) if entry]
+    distribution = []
+    for year in sorted(set(pokemon_distribution or {}) | set(yugioh_distribution or {})):
+        for game, per_year in (("pokemon", pokemon_distribution or {}), ("yugioh", yugioh_distribution or {})):
+            if year in per_year:
+                distribution.append({'year': year, 'game': game, **{field: per_year[year][field] for field in DISTRIBUTION_FIELDS}})
+    return {'totals': totals, 'averages': averages, 'growth': growth, 'distribution': distribution}
+
+
+def model_from_db(conn):
+    stats = get_yearly_stats(conn)
+    distribution = get_distribution_stats(conn)
+    return build_model(stats.cards['pokemon'], stats.sets['pokemon'], stats.cards['yugioh'], stats.sets['yugioh'], stats.average['pokemon'], stats.average['yugioh'],
+                       distribution['pokemon'], distribution['yugioh'])
+
+
+def growth_sentence(entry):
+    if entry['change_pct'] is None:
+        return None
+    direction = "grew" if entry['recent_avg'] > entry['early_avg'] else "declined"
+    return f"{entry['label']} sets {direction} by {abs(entry['change_pct']):.1f}% (from {entry['early_avg']:.1f} to {entry['recent_avg']:.1f} cards per set)"
+
+
+def render_text(model):
+    # Same fixed-width layout All_calculation.txt has always had
+    column_widths = 12
+    year_widths = 6
+    rule = "=" * 100
+    lines = [
+        "Section 1:Pokemon & Yu-Gi-Oh Calculation Results:",
+        "Functions Generated Table: calculating total cards and sets released per year",
+        rule,
+        f'{"Year":<{year_widths}} | {"Pokemon Cards":<{column_widths}} | {"Pokemon Sets":>{column_widths}} | {"Yu-Gi-Oh Cards":<{column_widths}} | {"Yu-Gi-Oh Sets":<{column_widths}}',
+        rule,
+    ]
+    for row in model['totals']:
+        lines.append(f'{row["year"]:<{year_widths}} | {row["pokemon_cards"]:<{column_widths}} | {row["pokemon_sets"]:<{column_widths}} | {row["yugioh_cards"]:<{column_widths}} | {row["yugioh_sets"]:<{column_widths}}')
+
+    lines += [rule, "Section 2: Average cards per set for all years:", rule]
+    lines.append(f'{"Year":<{year_widths}} | {"Pokemon Avg":<{column_widths}} | {"Yu-Gi-Oh Avg":<{column_widths}}')
+    lines.append(rule)
+    for row in model['averages']:
+        lines.append(f'{row["year"]:<{year_widths}} | {row["pokemon_avg"]:<{column_widths}} | {row["yugioh_avg"]:<{column_widths}}')
+
+    lines += [rule, "Section 3: Growth Analysis:", rule]
+    lines += [sentence for sentence in map(growth_sentence, model['growth']) if sentence]
+
+    lines += [rule, "Section 4: Set size distribution per year (cards per set):", rule]
+    lines.append(f'{"Year":<{year_widths}} | {"Game":<8} | {"Sets":>7} | {"Median":>8} | {"P90":>8} | {"Min":>6} | {"Max":>6} | {"Std Dev":>8}')
+    lines.append(rule)
+    for row in model['distribution']:
+        lines.append(f'{row["year"]:<{year_widths}} | {row["game"]:<8} | {row["sets"]:>7} | {row["median"]:>8} | {row["p90"]:>8} | {row["min"]:>6} | {row["max"]:>6} | {row["stddev"]:>8}')
+    lines.append(rule)
+    return "\n".join(lines) + "\n"
+
+
+def render_csv(model):
+    # One tidy table: section, game, year, metric, value
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(["section", "game", "year", "metric", "value"])
+    for row in model['totals']:
+        for game in ("pokemon", "yugioh"):
+            writer.writerow(["totals", game, row['year'], "cards", row[f"{game}_cards"]])
+            writer.writerow(["totals", game, row['year'], "sets", row[f"{game}_sets"]])
+    for row in model['averages']:
+        for game in ("pokemon", "yugioh"):
+            writer.writerow(["averages", game, row['year'], "avg_cards_per_set", row[f"{game}_avg"]])
+    for entry in model['growth']:
+        for metric in ("early_avg", "recent_avg", "change_pct"):
+            value = entry[metric]
+            writer.writerow(["growth", entry['label'], "", metric, "" if value is None else round(value, 1)])
+    for row in model['distribution']:
+        for metric in DISTRIBUTION_FIELDS:
+            writer.writerow(["distribution", row['game'], row['year'], metric, row[metric]])
+    return buffer.getvalue()
+
+
+def render_json(model):
+    return json.dumps(model, indent=2) + "\n"
+
+
+def render_markdown(model):
+    lines = ["# Pokemon & Yu-Gi-Oh Calculation Results", "", "## Section 1: Cards and sets released per year", ""]
+    lines.append("| Year | Pokemon Cards | Pokemon Sets | Yu-Gi-Oh Cards | Yu-Gi-Oh Sets |")
+    lines.append("| --- | ---: | ---: | ---: | ---: |")
+    for row in model['totals']:
+        lines.append(f"| {row['year']} | {row['pokemon_cards']} | {row['pokemon_sets']} | {row['yugioh_cards']} | {row['yugioh_sets']} |")
+
+    lines += ["", "## Section 2: Average cards per set", "", "| Year | Pokemon Avg | Yu-Gi-Oh Avg |", "| --- | ---: | ---: |"]
+    for row in model['averages']:
+        lines.append(f"| {row['year']} | {row['pokemon_avg']} | {row['yugioh_avg']} |")
+
+    lines += ["", "## Section 3: Growth Analysis", ""]
+    lines += [f"- {sentence}" for sentence in map(growth_sentence, model['growth']) if sentence]
+
+    lines += ["", "## Section 4: Set size distribution per year", "", "| Year | Game | Sets | Median | P90 | Min | Max | Std Dev |", "| --- | --- | ---: | ---: | ---: | ---: | ---: | ---: |"]
+    for row in model['distribution']:
+        lines.append(f"| {row['year']} | {row['game']} | {row['sets']} | {row['median']} | {row['p90']} | {row['min']} | {row['max']} | {row['stddev']} |")
+    return "\n".join(lines) + "\n"
+
+
+RENDERERS = {'text': render_text, 'csv': render_csv, 'json': render_json, 'markdown': render_markdown}
+
+
+def _file_mode(path):
+    # Keep an existing file's permissions, otherwise what open() would have given it under the umask
+    try:
+        return stat.S_IMODE(os.stat(path).st_mode)
+    except FileNotFoundError:
+        umask = os.umask(0)
+        os.umask(umask)
+        return 0o666 & ~umask
+
+
+def atomic_write(path, text):
+    # Readers see either the old file or the new one, never half of it
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp_", suffix=os.path.basename(path))
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(text)
+        os.chmod(tmp_path, _file_mode(path)) # mkstemp files are owner-only
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def table_fingerprint(conn):
+    """
+    Hash of the data every report is built from.
+    Both inputs are cached per connection, so the report built right after
+    reuses them; with the trigger-maintained tables installed they read
+    O(years) and O(distinct set sizes) rows rather than every set.
+    """
+    stats = get_yearly_stats(conn)
+    payload = [REPORT_VERSION, stats.cards, stats.sets, get_distribution_stats(conn)]
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+def write_reports(conn, output_base="All_calculation", formats=("text",), force=False):
+    """
+    Write the report in every requested format, skipping formats that are already up to date.
+
+    Args:
+        conn: SQLite database connection
+        output_base: path without extension, e.g. 'All_calculation'
+        formats: any of 'text', 'csv', 'json', 'markdown'
+        force: rewrite even if the table fingerprint matches the last run
+    Returns:
+        dict: {path: True if written, False if skipped}
+    """
+    directory = os.path.dirname(os.path.abspath(output_base))
+    fingerprint_path = os.path.join(directory, FINGERPRINT_FILE)
+    try:
+        with open(fingerprint_path, 'r') as f:
+            previous = json.load(f)
+    except (OSError, ValueError):
+        previous = {}
+
+    fingerprint = table_fingerprint(conn)
+    results = {}
+    model = None
+    for fmt in formats:
+        path = output_base + EXTENSIONS[fmt]
+        key = os.path.basename(path)
+        if not force and previous.get(key) == fingerprint and os.path.exists(path):
+            results[path] = False
+            continue
+        if model is None:
+            model = model_from_db(conn)
+        atomic_write(path, RENDERERS[fmt](model))
+        previous[key] = fingerprint
+        results[path] = True
+
+    if any(results.values()):
+        atomic_write(fingerprint_path, json.dumps(previous, indent=2) + "\n")
+    return results
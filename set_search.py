@@ -0,0 +1,240 @@
+# Lance
+
+import argparse
+import itertools
+import sqlite3
+import time
+
+from db_manager import open_db
+from tcg_schema import GAMES
+
+SEARCH_TABLE = "set_search"
+GAME_KEYS = {game: i for i, game in enumerate(GAMES)} # rowid = set_id * len(GAMES) + key
+FUZZY_CANDIDATES = 200 # Max names scored for fuzzy matches
+FUZZY_TRIGRAMS = 4 # Rarest query trigrams used to find fuzzy candidates
+FUZZY_THRESHOLD = 0.3 # Minimum trigram similarity for a fuzzy match
+MATCH_ORDER = {'exact': 0, 'prefix': 1, 'substring': 2, 'fuzzy': 3}
+CREATE_SEARCH_TABLE = f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5(name, game UNINDEXED, tokenize = 'trigram')"
+
+
+def _table_exists(cursor, name):
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (name,))
+    return cursor.fetchone() is not None
+
+
+def _rowid(game, set_id_sql):
+    # Both games share one index, so their set ids are interleaved into distinct rowids
+    return f"{set_id_sql} * {len(GAMES)} + {GAME_KEYS[game]}"
+
+
+def _search_triggers(game):
+    """
+    SQL for the triggers that keep set_search in step with one game's sets table.
+    """
+    t = GAMES[game]
+    sets, name = t['sets_table'], t['name']
+    insert = f"""INSERT INTO {SEARCH_TABLE} (rowid, name, game) SELECT {_rowid(game, 'NEW.set_id')}, NEW."{name}", '{game}' WHERE NEW."{name}" IS NOT NULL;"""
+    delete = f"DELETE FROM {SEARCH_TABLE} WHERE rowid = {_rowid(game, 'OLD.set_id')};"
+    return [
+        f"""CREATE TRIGGER IF NOT EXISTS "{game}_search_insert" AFTER INSERT ON "{sets}" BEGIN {insert} END;""",
+        f"""CREATE TRIGGER IF NOT EXISTS "{game}_search_delete" AFTER DELETE ON "{sets}" BEGIN {delete} END;""",
+        f"""CREATE TRIGGER IF NOT EXISTS "{game}_search_update" AFTER UPDATE OF "{name}", set_id ON "{sets}" BEGIN {delete} {insert} END;""",
+    ]
+
+
+def install_search(conn):
+    """
+    Create the FTS5 trigram index over set names and the triggers that maintain it,
+    for every game whose sets table exists. The index is filled with
+    rebuild_search() whenever a game gets its triggers for the first time.
+
+    Returns:
+        bool: False if this SQLite build has no FTS5 trigram tokenizer
+    """
+    cursor = conn.cursor()
+    games = [game for game, t in GAMES.items() if _table_exists(cursor, t['sets_table'])]
+
+    cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")
+    triggers = {row[0] for row in cursor.fetchall()}
+    needs_rebuild = any(f"{game}_search_insert" not in triggers for game in games)
+    if not needs_rebuild and _table_exists(cursor, SEARCH_TABLE):
+        return True # Already installed, stay read-only
+
+    try:
+        with conn:
+            cursor.execute(CREATE_SEARCH_TABLE)
+            for game in games:
+                for trigger_sql in _search_triggers(game):
+                    cursor.execute(trigger_sql)
+    except sqlite3.OperationalError:
+        return False # SQLite older than 3.34 or built without FTS5
+
+    if needs_rebuild:
+        rebuild_search(conn)
+    return True
+
+
+def rebuild_search(conn):
+    """
+    Refill set_search from the sets tables.
+
+    The index is dropped and created again rather than emptied, since an
+    FTS5 DELETE has to unpick every row's trigrams one by one.
+
+    Returns:
+        int: number of set names indexed
+    """
+    cursor = conn.cursor()
+    indexed = 0
+    with conn:
+        cursor.execute(f"DROP TABLE IF EXISTS {SEARCH_TABLE}")
+        cursor.execute(CREATE_SEARCH_TABLE)
+        for game, t in GAMES.items():
+            if not _table_exists(cursor, t['sets_table']): continue
+            cursor.execute(f"""
+            INSERT INTO {SEARCH_TABLE} (rowid, name, game)
+            SELECT {_rowid(game, 'set_id')}, "{t["name"]}", '{game}' FROM "{t["sets_table"]}" WHERE "{t["name"]}" IS NOT NULL
+            """)
+            indexed += cursor.rowcount
+        cursor.execute(f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}) VALUES ('optimize')")
+    return indexed
+
+
+def trigrams(text):
+    text = text.lower()
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def similarity(a, b):
+    # Jaccard similarity of the two names' trigram sets (either may be passed as a set already)
+    a = a if isinstance(a, set) else trigrams(a)
+    b = b if isinstance(b, set) else trigrams(b)
+    return len(a & b) / len(a | b) if a and b else 0.0
+
+
+def _phrase(text):
+    return '"' + text.replace('"', '""') + '"'
+
+
+def _classify(query, name):
+    query, name = query.lower(), name.lower()
+    if name == query:
+        return 'exact'
+    if name.startswith(query):
+        return 'prefix'
+    if query in name:
+        return 'substring'
+    return None
+
+
+def search_sets(conn, query, limit=20, game=None, fuzzy=True):
+    """
+    Ranked set-name search across both games.
+
+    Exact matches come first, then names starting with the query, then names
+    containing it anywhere, then (if fuzzy) names sharing enough trigrams to
+    catch typos. Within each tier results are ordered by bm25 relevance.
+
+    Args:
+        conn: SQLite database connection
+        query: text to look for, case-insensitive
+        limit: max number of results
+        game: 'pokemon' or 'yugioh' to search one game only
+        fuzzy: add near matches when there are fewer than `limit` direct ones
+    Returns:
+        list: dicts with game, set_id, name, match ('exact', 'prefix', 'substring' or 'fuzzy') and score
+    """
+    query = query.strip()
+    if not query:
+        return []
+    cursor = conn.cursor()
+    game_filter = "AND game = ?" if game else ""
+    params = [game] if game else []
+    stride = len(GAMES)
+    games_by_key = {key: name for name, key in GAME_KEYS.items()}
+
+    if len(query) >= 3:
+        # A phrase of the query's trigrams only matches names containing the whole query
+        cursor.execute(f"""
+        SELECT rowid, name, -bm25({SEARCH_TABLE}) FROM {SEARCH_TABLE}
+        WHERE {SEARCH_TABLE} MATCH ? {game_filter} ORDER BY rank LIMIT ?
+        """, [_phrase(query)] + params + [max(limit * 5, FUZZY_CANDIDATES)])
+    else:
+        # Too short for a trigram, so a prefix scan of the index
+        escaped = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        cursor.execute(f"""
+        SELECT rowid, name, 0.0 FROM {SEARCH_TABLE}
+        WHERE name LIKE ? ESCAPE '\\' {game_filter} LIMIT ?
+        """, [escaped + "%"] + params + [max(limit * 5, FUZZY_CANDIDATES)])
+
+    results = {}
+    for rowid, name, score in cursor.fetchall():
+        match = _classify(query, name)
+        if match:
+            results[rowid] = (match, score, name)
+
+    if fuzzy and len(results) < limit and len(query) >= 3:
+        # A typo only spoils the trigrams around it, and those are rarely in the index at all.
+        # Names holding two of the rarest remaining trigrams are the candidates, scored by overall similarity.
+        query_trigrams = trigrams(query)
+        frequency = []
+        for term in query_trigrams:
+            # Counting stops at FUZZY_CANDIDATES, so a trigram in every name costs no more than a rare one
+            cursor.execute(f"SELECT COUNT(*) FROM (SELECT 1 FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH ? LIMIT ?)", (_phrase(term), FUZZY_CANDIDATES))
+            frequency.append((cursor.fetchone()[0], term))
+        rarest = [term for count, term in sorted(frequency) if count][:FUZZY_TRIGRAMS]
+        if len(rarest) >= 2:
+            candidates = " OR ".join(f"({_phrase(a)} AND {_phrase(b)})" for a, b in itertools.combinations(rarest, 2))
+        else:
+            candidates = " OR ".join(_phrase(term) for term in rarest)
+        rows = []
+        if candidates:
+            cursor.execute(f"""
+            SELECT rowid, name FROM {SEARCH_TABLE}
+            WHERE {SEARCH_TABLE} MATCH ? {game_filter} LIMIT ?
+            """, [candidates] + params + [FUZZY_CANDIDATES])
+            rows = cursor.fetchall()
+        for rowid, name in rows:
+            score = similarity(query_trigrams, name)
+            if rowid not in results and score >= FUZZY_THRESHOLD:
+                results[rowid] = ('fuzzy', score, name)
+
+    ranked = sorted(results.items(), key=lambda item: (MATCH_ORDER[item[1][0]], -item[1][1], item[1][2]))
+    return [{
+        'game': games_by_key[rowid % stride],
+        'set_id': rowid // stride,
+        'name': name,
+        'match': match,
+        'score': round(score, 3),
+    } for rowid, (match, score, name) in ranked[:limit]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Search Pokemon and Yu-Gi-Oh set names")
+    parser.add_argument("query", nargs="?", help="set name or part of one")
+    parser.add_argument("--game", choices=list(GAMES), default=None)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--no-fuzzy", action="store_true", help="only exact, prefix and substring matches")
+    parser.add_argument("--rebuild", action="store_true", help="refill the search index from the sets tables")
+    parser.add_argument("--db", default="tcg_data.db")
+    args = parser.parse_args()
+
+    with open_db(args.db) as conn:
+        if not install_search(conn):
+            print("This SQLite build has no FTS5 trigram tokenizer (needs SQLite 3.34+)")
+            return
+        if args.rebuild:
+            print(f"Indexed {rebuild_search(conn)} set names")
+        if not args.query:
+            return
+
+        start = time.perf_counter()
+        results = search_sets(conn, args.query, args.limit, args.game, not args.no_fuzzy)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        for result in results:
+            print(f"  [{GAMES[result['game']]['label']}] {result['name']} (set {result['set_id']}, {result['match']}, {result['score']})")
+        print(f"{len(results)} match(es) in {elapsed_ms:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
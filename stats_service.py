@@ -0,0 +1,179 @@
+# Brandon Reyes Parra
+
+
+import argparse
+import gzip
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+from db_manager import connect
+from tcg_report import build_report
+
+CACHE_ENTRIES = 64
+MIN_GZIP_BYTES = 512 # Smaller bodies are not worth compressing
+
+
+def _game_payload(report, game):
+    return {'game': game, 'years': sorted(report[game]['sets']), **report[game]}
+
+
+# path -> function building the JSON payload from tcg_report.build_report
+ENDPOINTS = {
+    "/stats": lambda report: report,
+    "/stats/pokemon": lambda report: _game_payload(report, 'pokemon'),
+    "/stats/yugioh": lambda report: _game_payload(report, 'yugioh'),
+    "/stats/combined": lambda report: {'years': report['years'], 'combined_cards': report['combined_cards']},
+}
+
+
+class ResponseCache:
+    """
+    LRU cache of encoded responses keyed on (path, database version).
+
+    Once the database changes the version moves on, so stale entries are never
+    served again and simply fall off the end of the LRU.
+    """
+
+    def __init__(self, max_entries=CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key, entry):
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+
+class StatsService:
+    """
+    One shared read connection plus the response cache. Access is serialized by a lock,
+    which is fine since a cache hit holds it for a few microseconds.
+    """
+
+    def __init__(self, db_name, max_entries=CACHE_ENTRIES):
+        self.conn = connect(db_name, check_same_thread=False, read_only=True) # Run a collector or yearly_summary.py install for the fast path
+        self.cache = ResponseCache(max_entries)
+        self.lock = threading.Lock()
+
+    def version(self):
+        # data_version moves when another connection commits, total_changes if this one ever writes
+        return self.conn.execute("PRAGMA data_version").fetchone()[0], self.conn.total_changes
+
+    def response(self, path):
+        """
+        Encoded response for an endpoint.
+
+        Returns:
+            dict or None: {'body', 'gzip', 'etag'} (gzip is None for small bodies), None for unknown paths
+        """
+        if path not in ENDPOINTS:
+            return None
+        with self.lock:
+            key = (path, self.version())
+            entry = self.cache.get(key)
+            if entry is None:
+                body = json.dumps(ENDPOINTS[path](build_report(self.conn)), sort_keys=True).encode()
+                entry = {
+                    'body': body,
+                    'gzip': gzip.compress(body, mtime=0) if len(body) >= MIN_GZIP_BYTES else None,
+                    'etag': '"' + hashlib.sha256(body).hexdigest()[:32] + '"',
+                }
+                self.cache.put(key, entry)
+            return entry
+
+    def close(self):
+        self.conn.close()
+
+
+class StatsHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        path = urlparse(self.path).path.rstrip("/") or "/"
+        if path == "/health":
+            cache = self.server.service.cache
+            self.send_body(json.dumps({'status': 'ok', 'cache_hits': cache.hits, 'cache_misses': cache.misses}).encode())
+            return
+
+        entry = self.server.service.response(path)
+        if entry is None:
+            self.send_body(json.dumps({'error': 'Not Found', 'endpoints': sorted(ENDPOINTS)}).encode(), status=404)
+            return
+
+        if entry['etag'] in self.headers.get('If-None-Match', ""):
+            self.send_response(304)
+            self.send_header("ETag", entry['etag'])
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        use_gzip = entry['gzip'] is not None and "gzip" in self.headers.get('Accept-Encoding', "")
+        headers = {'ETag': entry['etag'], 'Cache-Control': "no-cache", 'Vary': "Accept-Encoding"}
+        if use_gzip:
+            headers['Content-Encoding'] = "gzip"
+        self.send_body(entry['gzip'] if use_gzip else entry['body'], headers=headers)
+
+    def send_body(self, body, status=200, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass # Dashboards poll, keep the console quiet
+
+
+def start_service(db_name="tcg_data.db", host="127.0.0.1", port=0):
+    """
+    Start the stats service in a background thread.
+
+    Returns:
+        tuple: (server, base_url) - call server.shutdown() and server.service.close() when done
+    """
+    server = ThreadingHTTPServer((host, port), StatsHandler)
+    server.daemon_threads = True
+    server.service = StatsService(db_name)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Read-only JSON service for the yearly Pokemon and Yu-Gi-Oh stats")
+    parser.add_argument("--db", default="tcg_data.db")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), StatsHandler)
+    server.daemon_threads = True
+    server.service = StatsService(args.db)
+    print(f"Stats service listening on http://{args.host}:{args.port} (endpoints: {', '.join(sorted(ENDPOINTS))}, /health)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.service.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+# Lance
+
+import hashlib
+import time
+from datetime import datetime
+
+from bulk_insert import load_date_ids
+from instrumentation import span
+from tcg_schema import GAMES
+
+
+def initialize_sync_state(conn):
+    """
+    Create the sync-state tables. Unique "Pokemon Sets" rows come from the migrations.
+    """
+    cursor = conn.cursor()
+    with conn:
+        # TABLE: one row per upstream set we have stored
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS sync_state (
+            game TEXT NOT NULL,
+            upstream_id TEXT NOT NULL,
+            set_id INTEGER NOT NULL,
+            content_hash TEXT NOT NULL,
+            synced_at TEXT NOT NULL,
+            PRIMARY KEY (game, upstream_id)
+        );
+        """)
+
+        # TABLE: high-water mark of the last sync per game
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS sync_meta (
+            game TEXT PRIMARY KEY,
+            last_marker TEXT,
+            last_synced_at TEXT
+        );
+        """)
+
+
+def content_hash(name, release_date, card_count):
+    return hashlib.sha1(f"{name}\x1f{release_date}\x1f{card_count}".encode()).hexdigest()
+
+
+def get_last_marker(cursor, game):
+    cursor.execute("SELECT last_marker FROM sync_meta WHERE game = ?", (game,))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def sync_records(conn, game, records, marker=None):
+    """
+    Upsert upstream set records keyed on their upstream id.
+
+    Unchanged records (same content hash) are not touched, changed ones are
+    updated in place and new ones inserted. Sets already stored before sync
+    state existed are adopted by (name, date) instead of being duplicated, and
+    rows whose stored columns already match are not rewritten. An update that
+    would clash with another stored set is skipped and its hash not saved, so
+    the next sync retries it.
+
+    Args:
+        conn: SQLite database connection
+        game: 'pokemon' or 'yugioh'
+        records: list of (upstream_id, name, release_date, card_count) tuples
+        marker: optional high-water mark saved for the next delta sync
+    Returns:
+        dict: {'inserted': n, 'updated': n, 'unchanged': n, 'conflicts': n}
+    """
+    t = GAMES[game]
+    cursor = conn.cursor()
+    counts = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'conflicts': 0}
+    now = datetime.now().isoformat(timespec='seconds')
+
+    with span(f"db.sync.{game}", rows=len(records)), conn:
+        cursor.execute("SELECT upstream_id, set_id, content_hash FROM sync_state WHERE game = ?", (game,))
+        state = {upstream_id: (set_id, digest) for upstream_id, set_id, digest in cursor.fetchall()}
+
+        seen = set()
+        changed = []
+        for upstream_id, name, release_date, card_count in records:
+            if upstream_id in seen: continue # Keep the first copy of a repeated id
+            seen.add(upstream_id)
+            digest = content_hash(name, release_date, card_count)
+            if upstream_id in state and state[upstream_id][1] == digest:
+                counts['unchanged'] += 1
+                continue
+            changed.append((upstream_id, name, release_date, card_count, digest))
+
+        if not changed:
+            _save_marker(cursor, game, marker, now)
+            return counts
+
+        date_ids = load_date_ids(cursor, game)
+        new_dates = sorted({row[2] for row in changed if row[2] not in date_ids})
+        if new_dates:
+            cursor.executemany(f'INSERT OR IGNORE INTO "{t["dates_table"]}" ("{t["date"]}") VALUES (?)', [(date,) for date in new_dates])
+            date_ids = load_date_ids(cursor, game)
+
+        cursor.execute(f'SELECT set_id, "{t["name"]}", "{t["count"]}", "{t["date_id"]}" FROM "{t["sets_table"]}"')
+        stored = {set_id: (name, count, date_id) for set_id, name, count, date_id in cursor.fetchall()}
+        set_ids_by_key = {(name, date_id): set_id for set_id, (name, _, date_id) in stored.items()}
+
+        state_rows = []
+        for upstream_id, name, release_date, card_count, digest in changed:
+            date_id = date_ids[release_date]
+            set_id = state[upstream_id][0] if upstream_id in state else None
+            if set_id not in stored:
+                # Not synced before (or its row is gone): adopt a legacy row from before sync state if there is one
+                set_id = set_ids_by_key.get((name, date_id))
+
+            if set_id is None:
+                cursor.execute(f'INSERT INTO "{t["sets_table"]}" ("{t["name"]}", "{t["count"]}", "{t["date_id"]}") VALUES (?, ?, ?)', (name, card_count, date_id))
+                set_id = cursor.lastrowid
+                set_ids_by_key[(name, date_id)] = set_id
+                stored[set_id] = (name, card_count, date_id)
+                counts['inserted'] += 1
+            elif stored[set_id] == (name, card_count, date_id):
+                counts['unchanged'] += 1 # Only the hash was missing or stale
+            else:
+                cursor.execute(f"""
+                UPDATE OR IGNORE "{t["sets_table"]}" SET "{t["name"]}" = ?, "{t["count"]}" = ?, "{t["date_id"]}" = ?
+                WHERE set_id = ?
+                """, (name, card_count, date_id, set_id))
+                if cursor.rowcount != 1:
+                    # Clashes with another stored set; leave the hash alone so the next sync tries again
+                    counts['conflicts'] += 1
+                    continue
+                set_ids_by_key.pop(stored[set_id][0::2], None)
+                set_ids_by_key[(name, date_id)] = set_id
+                stored[set_id] = (name, card_count, date_id)
+                counts['updated'] += 1
+            state_rows.append((game, upstream_id, set_id, digest, now))
+
+        cursor.executemany("INSERT OR REPLACE INTO sync_state (game, upstream_id, set_id, content_hash, synced_at) VALUES (?, ?, ?, ?, ?)", state_rows)
+        _save_marker(cursor, game, marker, now)
+
+    return counts
+
+
+def _save_marker(cursor, game, marker, now):
+    cursor.execute("""
+    INSERT INTO sync_meta (game, last_marker, last_synced_at) VALUES (?, ?, ?)
+    ON CONFLICT(game) DO UPDATE SET last_marker = COALESCE(excluded.last_marker, last_marker), last_synced_at = excluded.last_synced_at
+    """, (game, marker, now))
+
+
+def print_sync_summary(game, counts, elapsed):
+    print("\n" + "-" * 50)
+    print(f"Delta Sync Summary ({GAMES[game]['label']}, {elapsed:.2f}s):")
+    print(f"  - Inserted {counts['inserted']} new sets")
+    print(f"  - Updated {counts['updated']} changed sets")
+    print(f"  - Skipped {counts['unchanged']} unchanged sets")
+    if counts.get('conflicts'):
+        print(f"  - Left {counts['conflicts']} sets unchanged: the update clashed with another stored set")
+    print("-" * 50)
+
+
+def timed_sync(conn, game, records, marker=None):
+    start = time.perf_counter()
+    counts = sync_records(conn, game, records, marker)
+    print_sync_summary(game, counts, time.perf_counter() - start)
+    return counts
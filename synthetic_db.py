@@ -0,0 +1,93 @@
+# Brandon Reyes Parra
+
+
+import argparse
+import os
+import random
+import time
+from datetime import date, timedelta
+
+import pokemon_collection
+import yugioh_collection
+from bulk_insert import insert_triggers_deferred
+from db_manager import connect
+from tcg_schema import GAMES
+
+BATCH_SIZE = 50000
+
+
+def _release_dates(rng, count, start_year, end_year):
+    # Distinct dates spread over the year range, as many as the range allows
+    first, last = date(start_year, 1, 1), date(end_year, 12, 31)
+    span = (last - first).days + 1
+    days = sorted(rng.sample(range(span), min(count, span)))
+    return [first + timedelta(days=d) for d in days]
+
+
+def _fill_game(conn, rng, game, set_count, start_year, end_year):
+    t = GAMES[game]
+    cursor = conn.cursor()
+
+    # Real data has a few sets per release date
+    dates = _release_dates(rng, max(1, set_count // 3), start_year, end_year)
+    with conn:
+        cursor.executemany(f'INSERT INTO "{t["dates_table"]}" ("{t["date"]}") VALUES (?)', [(d.strftime(t["date_format"]),) for d in dates])
+    date_ids = [row[0] for row in cursor.execute(f'SELECT "{t["date_id"]}" FROM "{t["dates_table"]}"')]
+
+    for start in range(0, set_count, BATCH_SIZE):
+        batch = []
+        for i in range(start, min(start + BATCH_SIZE, set_count)):
+            # Mostly normal sized sets with a long tail of huge ones
+            size = int(rng.lognormvariate(4.3, 0.6)) + 1
+            batch.append((f"Synthetic {game} set {i + 1}", size, rng.choice(date_ids)))
+        with conn:
+            cursor.executemany(f'INSERT INTO "{t["sets_table"]}" ("{t["name"]}", "{t["count"]}", "{t["date_id"]}") VALUES (?, ?, ?)', batch)
+
+
+def generate_db(path, pokemon_sets=170, yugioh_sets=1006, start_year=1999, end_year=2025, seed=0):
+    """
+    Build a database with the same schema as tcg_data.db filled with synthetic sets.
+
+    Args:
+        path: database file to create (overwritten if it exists)
+        pokemon_sets: number of "Pokemon Sets" rows
+        yugioh_sets: number of "Yu-Gi-Oh Sets" rows
+        start_year, end_year: release years to spread the sets over
+        seed: random seed, the same arguments always give the same database
+    Returns:
+        float: seconds spent generating
+    """
+    start = time.perf_counter()
+    if os.path.exists(path):
+        os.remove(path)
+
+    # The collectors own the schema, so build it through them
+    conn = connect(path)
+    pokemon_collection.initialize_db(conn)
+    yugioh_collection.initialize_db(conn)
+
+    rng = random.Random(seed)
+    # The summary, histogram and search tables are rebuilt once at the end instead of per row
+    with insert_triggers_deferred(conn, GAMES):
+        _fill_game(conn, rng, 'pokemon', pokemon_sets, start_year, end_year)
+        _fill_game(conn, rng, 'yugioh', yugioh_sets, start_year, end_year)
+    conn.close()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic tcg_data.db-shaped database")
+    parser.add_argument("path")
+    parser.add_argument("--pokemon-sets", type=int, default=170)
+    parser.add_argument("--yugioh-sets", type=int, default=1006)
+    parser.add_argument("--start-year", type=int, default=1999)
+    parser.add_argument("--end-year", type=int, default=2025)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    elapsed = generate_db(args.path, args.pokemon_sets, args.yugioh_sets, args.start_year, args.end_year, args.seed)
+    print(f"Wrote {args.pokemon_sets} Pokemon and {args.yugioh_sets} Yu-Gi-Oh sets to {args.path} in {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
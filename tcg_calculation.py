@@ -1,12 +1,29 @@
 # Brandon Reyes Parra
 
 
-import sqlite3
-from collections import defaultdict
-import matplotlib.pyplot as plt 
-import numpy as np
+import argparse
+import os
 
+from db_manager import open_db
+from growth_analytics import load_series
+from instrumentation import add_arguments, enable, span, timed
+from report_writer import atomic_write, build_model, render_text
+from tcg_stats import get_yearly_stats
+from yearly_summary import install_summary
 
+ROLLING_WINDOW = 3 # Years per window in the rolling average set size chart
+
+
+def pyplot():
+    """
+    Import matplotlib.pyplot on first use so text-only reporting never pays for it.
+    """
+    with span("chart.import_matplotlib"):
+        import matplotlib.pyplot as plt
+    return plt
+
+
+@timed("calc.pokemon_total_per_year")
 def calculate_pokemon_total_per_year(conn):
 
     """
@@ -17,24 +34,9 @@ def calculate_pokemon_total_per_year(conn):
     Returns: 
         dict: {year: total_cards} - total cards released per year
     """
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT rd.releaseDate, SUM(ps.total)
-        FROM "Pokemon Release Dates" rd
-        JOIN "Pokemon Sets" ps ON rd.releaseDate_id = ps.releaseDate_id
-        GROUP BY rd.releaseDate
-    """)
-    
-    results = cursor.fetchall()
-    
-    year_counts = defaultdict(int)
-    for date_str, total in results:
-        if date_str and total is not None: 
-            year = date_str.split('/')[0]
-            year_counts[year] += total
-    
-    return dict(year_counts)
+    return dict(get_yearly_stats(conn).cards['pokemon'])
 
+@timed("calc.pokemon_sets_per_year")
 def calculate_pokemon_sets_per_year(conn):
     
     """
@@ -45,24 +47,25 @@ def calculate_pokemon_sets_per_year(conn):
     Returns:
         dict: {year: count} - number of set per year
     """
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT rd.releaseDate, COUNT(ps.set_id)
-        FROM "Pokemon Release Dates" rd
-        JOIN "Pokemon Sets" ps ON rd.releaseDate_id = ps.releaseDate_id
-        GROUP BY rd.releaseDate
-        """)
-    
-    result = cursor.fetchall()
+    return dict(get_yearly_stats(conn).sets['pokemon'])
 
-    year_counts = defaultdict(int)
-    for date_str, count in result:
-        if date_str:
-            year = date_str.split('/')[0]
-            year_counts[year] += count
-    return dict(year_counts)
-
-def create_pokemon_histogram(data, title, xlabel, ylabel):
+def show_or_save(output_path=None):
+    """
+    Show the current figure, or save it to output_path (one path or a list of paths) and close it.
+    """
+    plt = pyplot()
+    if output_path is None:
+        plt.show()
+        return
+
+    paths = [output_path] if isinstance(output_path, str) else output_path
+    for path in paths:
+        with span("chart.save") as s:
+            plt.savefig(path)
+            s.add(bytes=os.path.getsize(path))
+    plt.close()
+
+def create_pokemon_histogram(data, title, xlabel, ylabel, output_path=None):
     """
     Create a histogram to visualize the the data for Pokemon
 
@@ -72,7 +75,9 @@ def create_pokemon_histogram(data, title, xlabel, ylabel):
         title: Title of the histogram
         xlabel: x-axis 
         ylabel: y-axis 
+        output_path: file path (or list of paths) to save to instead of showing the window
     """
+    plt = pyplot()
     
     years = sorted(data.keys())
     counts = [data[year] for year in years]
@@ -85,8 +90,9 @@ def create_pokemon_histogram(data, title, xlabel, ylabel):
     plt.xticks(rotation=45, ha="right")
     plt.grid(axis='y', alpha=0.75, linestyle='--')
     plt.tight_layout()
-    plt.show()
+    show_or_save(output_path)
 
+@timed("calc.yugioh_total_per_year")
 def calculate_yugioh_total_per_year(conn):
 
     """
@@ -97,25 +103,9 @@ def calculate_yugioh_total_per_year(conn):
     Returns: 
         dict: {year: total_cards} - total cards released per year
     """
-    cursor = conn.cursor()
-    
-    cursor.execute("""
-        SELECT rd.tcg_date, SUM(ps.num_of_cards)
-        FROM "Yu-Gi-Oh Release Dates" rd
-        JOIN "Yu-Gi-Oh Sets" ps ON rd.tcg_date_id = ps.tcg_date_id
-        GROUP BY rd.tcg_date
-    """)
-    
-    results = cursor.fetchall()
-    
-    year_counts = defaultdict(int)
-    for date_str, total in results:
-        if date_str and total is not None:  
-            year = date_str.split('-')[0]
-            year_counts[year] += total
-    
-    return dict(year_counts)
+    return dict(get_yearly_stats(conn).cards['yugioh'])
 
+@timed("calc.yugioh_sets_per_year")
 def calculate_yugioh_sets_per_year(conn):
     
     """
@@ -126,24 +116,9 @@ def calculate_yugioh_sets_per_year(conn):
     Returns:
         dict: {year: count} - number of set per year
     """
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT rd.tcg_date, COUNT(ps.set_id)
-        FROM "Yu-Gi-Oh Release Dates" rd
-        JOIN "Yu-Gi-Oh Sets" ps ON rd.tcg_date_id = ps.tcg_date_id
-        GROUP BY rd.tcg_date
-        """)
-    
-    result = cursor.fetchall()
-
-    year_counts = defaultdict(int)
-    for date_str, count in result:
-        if date_str:
-            year = date_str.split('-')[0]
-            year_counts[year] += count
-    return dict(year_counts)
+    return dict(get_yearly_stats(conn).sets['yugioh'])
 
-def create_yugioh_histogram(data, title, xlabel, ylabel):
+def create_yugioh_histogram(data, title, xlabel, ylabel, output_path=None):
     """
     Create a histogram to visualize the the data for Yu-Gi-Oh
 
@@ -153,7 +128,9 @@ def create_yugioh_histogram(data, title, xlabel, ylabel):
         title: Title of the histogram
         xlabel: x-axis 
         ylabel: y-axis 
+        output_path: file path (or list of paths) to save to instead of showing the window
     """
+    plt = pyplot()
     
     years = sorted(data.keys())
     counts = [data[year] for year in years] 
@@ -167,9 +144,10 @@ def create_yugioh_histogram(data, title, xlabel, ylabel):
     plt.xticks(rotation=45, ha="right")
     plt.grid(axis='y', alpha=0.75, linestyle='--')
     plt.tight_layout()
-    plt.show()
+    show_or_save(output_path)
 
 
+@timed("calc.joining_tables")
 def joining_tables(conn):
 
     """
@@ -179,23 +157,18 @@ def joining_tables(conn):
     tuple with combined data, pokemon data, yugioh data
     
     """
+    stats = get_yearly_stats(conn)
+    return dict(stats.combined), dict(stats.cards['pokemon']), dict(stats.cards['yugioh'])
 
-    pokemon_data = calculate_pokemon_total_per_year(conn)
-    yugioh_data = calculate_yugioh_total_per_year(conn)
-
-    all_years = set(pokemon_data.keys()) | set(yugioh_data.keys())
-    combined_data = {}
-
-    for year in all_years:
-        combined_data[year] = pokemon_data.get(year, 0) + yugioh_data.get(year, 0)
-    return combined_data, pokemon_data, yugioh_data
-
-def create_combined_histogram(pokemon_data, yugioh_data, combined_data):
+def create_combined_histogram(pokemon_data, yugioh_data, combined_data, output_path=None):
     """
 
     Create histogram comparing Pokemon, Yu-Gi-Oh, and combined card release per year and showing the trend and differences.
+    Pass output_path (or a list of paths) to save the figure instead of showing it.
     
     """
+    import numpy as np
+    plt = pyplot()
 
     all_years = sorted(set(pokemon_data.keys()) | set(yugioh_data.keys()))
 
@@ -222,9 +195,10 @@ def create_combined_histogram(pokemon_data, yugioh_data, combined_data):
     ax.legend(loc='best')
 
     plt.tight_layout()
-    plt.show()
+    show_or_save(output_path)
 
 
+@timed("calc.average_cards_per_set")
 def calculate_average_cards_per_set(conn):
     """
     We are going to get the avarege cards per set for each year.
@@ -234,33 +208,34 @@ def calculate_average_cards_per_set(conn):
     tuple: (pokemon_avg_per_set, yugioh_avg_per_set)
 
     """
+    stats = get_yearly_stats(conn)
+    return dict(stats.average['pokemon']), dict(stats.average['yugioh'])
 
-    pokemon_cards = calculate_pokemon_total_per_year(conn)
-    pokemon_sets = calculate_pokemon_sets_per_year(conn)
-    yugioh_cards = calculate_yugioh_total_per_year(conn)
-    yugioh_sets = calculate_yugioh_sets_per_year(conn)
-
-    pokemon_average = {}
-    for year in pokemon_cards.keys():
-        if year in pokemon_sets and pokemon_sets[year] > 0:
-            pokemon_average[year] = round(pokemon_cards[year] / pokemon_sets[year], 1)
+@timed("calc.set_size_distribution")
+def calculate_set_size_distribution(conn):
+    """
+    Median, p90, min, max and standard deviation of set size for each year.
+    Worked out with NumPy over the cached columnar dataset (see columnar.py), so it stays fast with millions of sets.
+    tcg_report and the stats service, which must not import NumPy, get the same numbers from tcg_stats.get_distribution_stats.
 
-    yugioh_average = {}
-    for year in yugioh_cards.keys():
-        if year in yugioh_sets and yugioh_sets[year] > 0:
-            yugioh_average[year] = round(yugioh_cards[year] / yugioh_sets[year], 1)
-    
-    return pokemon_average, yugioh_average
+    Returns:
+    tuple: (pokemon_distribution, yugioh_distribution), each {year: {'sets', 'median', 'p90', 'min', 'max', 'stddev'}}
+    """
+    from columnar import distribution_stats # NumPy only loads for the calculation path
+    distribution = distribution_stats(conn)
+    return dict(distribution['pokemon']), dict(distribution['yugioh'])
 
-def create_average_sets_line_chart(pokemon_average, yugioh_average):
+def create_average_sets_line_chart(pokemon_average, yugioh_average, output_path=None):
     """
     Line Chart: This would show the the average set size trends. 
 
     Args:
         pokemon_average: average cards per set for Pokemon
         yugioh_average: average cards per set for Yu-Gi-Oh
+        output_path: file path (or list of paths) to save to instead of showing the window
 
     """
+    plt = pyplot()
 
     all_years = sorted(set(pokemon_average.keys()) | set (yugioh_average.keys()))
     pokemon_values = [pokemon_average.get(year, 0) for year in all_years]
@@ -279,8 +254,36 @@ def create_average_sets_line_chart(pokemon_average, yugioh_average):
     plt.grid(True, alpha=0.3, linestyle='--')
     plt.xticks(rotation=45, ha='right')
     plt.tight_layout()
-    plt.show()
+    show_or_save(output_path)
+
+def create_rolling_average_chart(pokemon_rolling, yugioh_rolling, window, output_path=None):
+    """
+    Line Chart: average set size over a sliding window of years, which smooths out one-off big sets.
 
+    Args:
+        pokemon_rolling: {year: avg cards per set over the `window` years ending there} for Pokemon
+        yugioh_rolling: same for Yu-Gi-Oh
+        window: window size in years, used in the labels
+        output_path: file path (or list of paths) to save to instead of showing the window
+
+    """
+    plt = pyplot()
+
+    all_years = sorted(set(pokemon_rolling.keys()) | set(yugioh_rolling.keys()))
+
+    plt.figure(figsize=(10, 6))
+    plt.plot(all_years, [pokemon_rolling.get(year) for year in all_years], marker='o', linewidth=2, markersize=6, label=f'Pokemon {window}-Year Avg Set Size', color='skyblue')
+    plt.plot(all_years, [yugioh_rolling.get(year) for year in all_years], marker='s', linewidth=2, markersize=6, label=f'Yu-Gi-Oh {window}-Year Avg Set Size', color='lightcoral')
+
+    plt.xlabel('Year', fontsize=13, fontweight='bold')
+    plt.ylabel('Avg Cards Per Set', fontsize=13, fontweight='bold')
+    plt.legend(fontsize=12, loc='best')
+    plt.grid(True, alpha=0.3, linestyle='--')
+    plt.xticks(rotation=45, ha='right')
+    plt.tight_layout()
+    show_or_save(output_path)
+
+@timed("calc.write_calculation_to_file")
 def write_calculation_to_file(conn, pokemon_total_cards, pokemon_sets, yugioh_total_cards, yugioh_sets, filename='All_calculation.txt'):
 
     """
@@ -301,103 +304,59 @@ def write_calculation_to_file(conn, pokemon_total_cards, pokemon_sets, yugioh_to
     """
 
     pokemon_average, yugioh_average = calculate_average_cards_per_set(conn)
+    pokemon_distribution, yugioh_distribution = calculate_set_size_distribution(conn)
 
-    with open(filename, 'w') as f:
-        all_years = set(pokemon_total_cards.keys()) | set(pokemon_sets.keys()) | set(yugioh_total_cards.keys()) | set(yugioh_sets.keys()) 
-        sorted_years = sorted(list(all_years))
-
-        f.write("Section 1:Pokemon & Yu-Gi-Oh Calculation Results:\n")
-        f.write("Functions Generated Table: calculating total cards and sets released per year\n")
-        f.write("=" * 100 + "\n")
-
-        column_widths = 12
-        year_widths = 6
-
-        header = f'{"Year":<{year_widths}} | {"Pokemon Cards":<{column_widths}} | {"Pokemon Sets":>{column_widths}} | {"Yu-Gi-Oh Cards":<{column_widths}} | {"Yu-Gi-Oh Sets":<{column_widths}}'
-        f.write(header + "\n")
-        f.write("=" * 100 + "\n")
-
-        for year in sorted_years:
-            poke_cards_total = pokemon_total_cards.get(year, 0)
-            poke_sets_total = pokemon_sets.get(year, 0)
-            yugioh_cards_total = yugioh_total_cards.get(year, 0)
-            yugioh_sets_total = yugioh_sets.get(year, 0)
-        
-            row = f'{year:<{year_widths}} | {poke_cards_total:<{column_widths}} | {poke_sets_total:<{column_widths}} | {yugioh_cards_total:<{column_widths}} | {yugioh_sets_total:<{column_widths}}'
-            f.write(row + "\n")
-
-        f.write("=" * 100 + "\n")
-        f.write("Section 2: Average cards per set for all years:\n")
-        f.write("=" * 100 + "\n")
-
-        header_two = f'{"Year":<{year_widths}} | {"Pokemon Avg":<{column_widths}} | {"Yu-Gi-Oh Avg":<{column_widths}}'
-        f.write(header_two + "\n")
-        f.write("=" * 100 + "\n")
-        for year in sorted_years:
-            pokemon_avg = pokemon_average.get(year, 0)
-            yugioh_avg = yugioh_average.get(year, 0)
-            row_two = f'{year:<{year_widths}} | {pokemon_avg:<{column_widths}} | {yugioh_avg:<{column_widths}}'
-            f.write(row_two + "\n")
-
-        poke_years_sorted = sorted(pokemon_average.keys())
-        yugio_years_sorted = sorted(yugioh_average.keys())
-
-        early_years_poke = poke_years_sorted[:5]
-        early_years_yugio = yugio_years_sorted[:5]
-        recent_years_poke = poke_years_sorted[-5:]
-        recent_years_yugio = yugio_years_sorted[-5:]
-
-        f.write("=" * 100 + "\n")
-        f.write("Section 3: Growth Analysis:\n")
-
-        if early_years_poke and recent_years_poke and early_years_yugio and recent_years_yugio:
-            
-            pokemon_early_avg = sum(pokemon_average[year] for year in early_years_poke) / len(early_years_poke)
-            pokemon_recent_avg = sum(pokemon_average[year] for year in recent_years_poke) / len(recent_years_poke)
-            yugioh_early_avg = sum(yugioh_average[year] for year in early_years_yugio) / len(early_years_yugio)
-            yugioh_recent_avg = sum(yugioh_average[year] for year in recent_years_yugio) / len(recent_years_yugio)
-        f.write("=" * 100 + "\n")
-        if pokemon_early_avg > 0:
-            if pokemon_recent_avg > pokemon_early_avg:
-                pokemon_growth = ((pokemon_recent_avg - pokemon_early_avg) / pokemon_early_avg) * 100 
-                f.write(f"Pokemon sets grew by {pokemon_growth:.1f}% (from {pokemon_early_avg:.1f} to {pokemon_recent_avg:.1f} cards per set)\n")
-            else:
-                pokemon_recent_decline = ((pokemon_early_avg - pokemon_recent_avg) / pokemon_early_avg) * 100
-                f.write(f"Pokemon sets declined by {pokemon_recent_decline:.1f}% (from {pokemon_early_avg:.1f} to {pokemon_recent_avg:.1f} cards per set)\n")
-            if yugioh_early_avg > 0:
-                if yugioh_recent_avg > yugioh_early_avg:
-                    yugioh_growth = ((yugioh_recent_avg - yugioh_early_avg) / yugioh_early_avg) * 100
-                    f.write(f"Yu-Gi-Oh sets grew by {yugioh_growth:.1f}% (from {yugioh_early_avg:.1f} to {yugioh_recent_avg:.1f} cards per set)\n")
-                else:
-                    yugioh_decline = ((yugioh_early_avg - yugioh_recent_avg) / yugioh_early_avg) * 100
-                    f.write(f"Yu-Gi-Oh sets declined by {yugioh_decline:.1f}% (from {yugioh_early_avg:.1f} to {yugioh_recent_avg:.1f} cards/set\n")
-        f.write("=" * 100 + "\n")
-    conn.close()
+    # Built in memory and swapped in atomically, see report_writer for the other formats
+    model = build_model(pokemon_total_cards, pokemon_sets, yugioh_total_cards, yugioh_sets, pokemon_average, yugioh_average,
+                        pokemon_distribution, yugioh_distribution)
+    atomic_write(filename, render_text(model))
     print(f"Calculation results written to a {filename}")
 
 def main():
-    conn = sqlite3.connect('tcg_data.db')
-
-    pokemon_total_per_year = calculate_pokemon_total_per_year(conn)
-    create_pokemon_histogram(pokemon_total_per_year, "Total Pokemon Cards Released Per Year", "Year", "Total Cards Released")
-    pokemon_sets_per_year = calculate_pokemon_sets_per_year(conn)
-    create_pokemon_histogram(pokemon_sets_per_year, "Total Pokemon Sets Released Per Year", "Year", "Total Sets Released Per Year")
-    print(f"Pokemon {sum(pokemon_total_per_year.values())} cards, {sum(pokemon_sets_per_year.values())} sets")
-
-    yugioh_total_per_year = calculate_yugioh_total_per_year(conn)
-    create_yugioh_histogram(yugioh_total_per_year, "Total Yu-Gi-Oh Cards Released Per Year", "Year", "Total Cards Released")
-    yugioh_sets_per_year = calculate_yugioh_sets_per_year(conn)
-    create_yugioh_histogram(yugioh_sets_per_year, "Total Yu-Gi-Oh Sets Released Per Year", "Year", "Total Sets Released Per Year")
-    print(f"Yu-Gi-Oh {sum(yugioh_total_per_year.values())} cards, {sum(yugioh_sets_per_year.values())} sets")
+    parser = argparse.ArgumentParser(description="Calculate and chart Pokemon and Yu-Gi-Oh release statistics")
+    parser.add_argument("--render", metavar="DIR", help="write the charts as image files to DIR instead of opening windows")
+    parser.add_argument("--format", nargs="+", default=["png"], help="image formats used with --render, e.g. png svg")
+    parser.add_argument("--jobs", type=int, default=None, help="worker processes used with --render")
+    add_arguments(parser)
+    args = parser.parse_args()
+    enable("tcg_calculation", args.metrics, args.profile)
+
+    with open_db('tcg_data.db') as conn:
+        install_summary(conn) # Schema and summary tables once up front; the reads below never write
+        if args.render:
+            # Headless mode for cron/CI: render in parallel, skip unchanged charts
+            from chart_render import render_all
+            render_all(conn, args.render, args.format, args.jobs)
+            pokemon_total_per_year = calculate_pokemon_total_per_year(conn)
+            pokemon_sets_per_year = calculate_pokemon_sets_per_year(conn)
+            yugioh_total_per_year = calculate_yugioh_total_per_year(conn)
+            yugioh_sets_per_year = calculate_yugioh_sets_per_year(conn)
+            write_calculation_to_file(conn, pokemon_total_per_year, pokemon_sets_per_year, yugioh_total_per_year, yugioh_sets_per_year)
+            return
+
+        pokemon_total_per_year = calculate_pokemon_total_per_year(conn)
+        create_pokemon_histogram(pokemon_total_per_year, "Total Pokemon Cards Released Per Year", "Year", "Total Cards Released")
+        pokemon_sets_per_year = calculate_pokemon_sets_per_year(conn)
+        create_pokemon_histogram(pokemon_sets_per_year, "Total Pokemon Sets Released Per Year", "Year", "Total Sets Released Per Year")
+        print(f"Pokemon {sum(pokemon_total_per_year.values())} cards, {sum(pokemon_sets_per_year.values())} sets")
+
+        yugioh_total_per_year = calculate_yugioh_total_per_year(conn)
+        create_yugioh_histogram(yugioh_total_per_year, "Total Yu-Gi-Oh Cards Released Per Year", "Year", "Total Cards Released")
+        yugioh_sets_per_year = calculate_yugioh_sets_per_year(conn)
+        create_yugioh_histogram(yugioh_sets_per_year, "Total Yu-Gi-Oh Sets Released Per Year", "Year", "Total Sets Released Per Year")
+        print(f"Yu-Gi-Oh {sum(yugioh_total_per_year.values())} cards, {sum(yugioh_sets_per_year.values())} sets")
     
-    combined_data, pokemon_data, yugioh_data = joining_tables(conn) 
-    create_combined_histogram(pokemon_data, yugioh_data, combined_data)
+        combined_data, pokemon_data, yugioh_data = joining_tables(conn) 
+        create_combined_histogram(pokemon_data, yugioh_data, combined_data)
 
-    pokemon_average, yugioh_average = calculate_average_cards_per_set(conn)
-    create_average_sets_line_chart(pokemon_average, yugioh_average)
+        pokemon_average, yugioh_average = calculate_average_cards_per_set(conn)
+        create_average_sets_line_chart(pokemon_average, yugioh_average)
+
+        pokemon_rolling = load_series(conn, 'pokemon').rolling_average_set_size(ROLLING_WINDOW)
+        yugioh_rolling = load_series(conn, 'yugioh').rolling_average_set_size(ROLLING_WINDOW)
+        create_rolling_average_chart(pokemon_rolling, yugioh_rolling, ROLLING_WINDOW)
 
-    write_calculation_to_file(conn, pokemon_total_per_year, pokemon_sets_per_year, yugioh_total_per_year, yugioh_sets_per_year)
-    conn.close()
+        write_calculation_to_file(conn, pokemon_total_per_year, pokemon_sets_per_year, yugioh_total_per_year, yugioh_sets_per_year)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
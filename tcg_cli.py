@@ -0,0 +1,178 @@
+# Lance
+
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pokemon_collection
+import yugioh_collection
+from db_manager import open_db
+from instrumentation import add_arguments, enable, span
+from report_writer import model_from_db, write_reports
+from yearly_summary import install_summary
+
+DB_NAME = "tcg_data.db"
+
+
+def _collect_game(conn, game, args):
+    with span(f"cli.collect.{game}"):
+        if game == 'pokemon':
+            api_key = pokemon_collection.get_api_key(args.api_key_file)
+            if args.mode == 'full':
+                from ingest_pipeline import PokemonSource, run_pipeline
+                return run_pipeline(conn, PokemonSource(api_key, args.pokemon_base_url), fetchers=args.workers)['inserted']
+            return pokemon_collection.collect_to_target(conn, api_key, args.pokemon_target, max_workers=args.workers, base_url=args.pokemon_base_url)[0]
+        if args.mode == 'full':
+            return yugioh_collection.stream_ingest(conn, args.yugioh_base_url)[0]
+        return yugioh_collection.collect_to_target(conn, args.yugioh_target, args.yugioh_base_url)[0]
+
+
+def _collect_game_own_connection(game, args):
+    # SQLite connections stay on the thread that opened them
+    with open_db(args.db) as conn:
+        return _collect_game(conn, game, args)
+
+
+def collect(conn, args):
+    """
+    Bring both games up to their targets (or fetch everything with --mode full).
+
+    With --jobs above 1 the two games are fetched at the same time, each on
+    its own connection; WAL lets their short write transactions take turns.
+
+    Returns:
+        dict: {game: sets inserted}
+    """
+    games = ['pokemon', 'yugioh'] if args.game == 'both' else [args.game]
+    pokemon_collection.initialize_db(conn) # Migrations create both games' tables
+    yugioh_collection.initialize_db(conn)
+
+    if args.jobs > 1 and len(games) > 1:
+        with ThreadPoolExecutor(max_workers=len(games)) as executor:
+            inserted = dict(zip(games, executor.map(lambda game: _collect_game_own_connection(game, args), games)))
+    else:
+        inserted = {game: _collect_game(conn, game, args) for game in games}
+
+    for game, count in inserted.items():
+        current = (pokemon_collection if game == 'pokemon' else yugioh_collection).get_current_state(conn.cursor())
+        print(f"  - {game}: inserted {count} new sets, {current} stored")
+    return inserted
+
+
+def analyze(conn, args):
+    """
+    Print per-game totals and growth. The numbers are cached on the connection,
+    so the report and chart stages that follow reuse them instead of querying again.
+    """
+    with span("cli.analyze"):
+        model = model_from_db(conn)
+    for game, label in (('pokemon', "Pokemon"), ('yugioh', "Yu-Gi-Oh")):
+        cards = sum(row[f"{game}_cards"] for row in model['totals'])
+        sets = sum(row[f"{game}_sets"] for row in model['totals'])
+        print(f"  - {label}: {cards} cards in {sets} sets over {sum(1 for row in model['totals'] if row[f'{game}_sets'])} years")
+    for entry in model['growth']:
+        if entry['change_pct'] is not None:
+            print(f"  - {entry['label']} average set size {entry['early_avg']:.1f} -> {entry['recent_avg']:.1f} ({entry['change_pct']:+.1f}%)")
+    return model
+
+
+def report(conn, args):
+    with span("cli.report"):
+        results = write_reports(conn, args.output, args.format, args.force)
+    for path, written in results.items():
+        print(f"  - {path}: {'written' if written else 'unchanged, skipped'}")
+    return results
+
+
+def charts(conn, args):
+    with span("cli.charts"):
+        from chart_render import render_all # Only the chart stage pays for matplotlib
+        return render_all(conn, args.charts_dir, args.chart_format, args.jobs, args.force)
+
+
+STAGES = {'collect': collect, 'analyze': analyze, 'report': report, 'charts': charts}
+RUN_ALL = ['collect', 'analyze', 'report', 'charts']
+
+
+def run_stages(conn, names, args):
+    """
+    Run stages in order on one connection, printing how long each took.
+
+    Returns:
+        dict: {stage: seconds}
+    """
+    timings = {}
+    for name in names:
+        print(f"[{name}]")
+        start = time.perf_counter()
+        STAGES[name](conn, args)
+        timings[name] = time.perf_counter() - start
+    return timings
+
+
+def main():
+    # Shared options, accepted after any subcommand
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--db", default=DB_NAME)
+    common.add_argument("--jobs", type=int, default=1, help="collect both games at once and render charts in this many processes")
+    add_arguments(common)
+
+    parser = argparse.ArgumentParser(prog="tcg", description="Collect, analyze and report on Pokemon and Yu-Gi-Oh sets in one process")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    commands = {
+        'collect': ['collect'],
+        'analyze': ['analyze'],
+        'report': ['report'],
+        'charts': ['charts'],
+        'run-all': RUN_ALL,
+    }
+    helps = {
+        'collect': "bring the sets tables up to their targets",
+        'analyze': "print totals and growth",
+        'report': "write All_calculation in the chosen formats",
+        'charts': "render every chart to image files",
+        'run-all': "collect -> analyze -> report -> charts",
+    }
+    for command, stages in commands.items():
+        sub = subparsers.add_parser(command, help=helps[command], parents=[common])
+        if 'collect' in stages:
+            sub.add_argument("--game", choices=["pokemon", "yugioh", "both"], default="both")
+            sub.add_argument("--mode", choices=["target", "full"], default="target", help="stop at the targets, or fetch every upstream set")
+            sub.add_argument("--pokemon-target", type=int, default=pokemon_collection.TARGET_SETS)
+            sub.add_argument("--yugioh-target", type=int, default=yugioh_collection.TARGET_SETS)
+            sub.add_argument("--workers", type=int, default=4, help="concurrent requests per game")
+            sub.add_argument("--pokemon-base-url", default=pokemon_collection.POKEMON_API_URL)
+            sub.add_argument("--yugioh-base-url", default=yugioh_collection.YUGIOH_API_URL)
+            sub.add_argument("--api-key-file", default="pokemon_api_key.txt")
+        if 'report' in stages:
+            sub.add_argument("--format", nargs="+", choices=["text", "csv", "json", "markdown"], default=["text"])
+            sub.add_argument("--output", default="All_calculation", help="output path without extension")
+        if 'charts' in stages:
+            sub.add_argument("--charts-dir", default="charts")
+            sub.add_argument("--chart-format", nargs="+", default=["png"])
+        if 'report' in stages or 'charts' in stages:
+            sub.add_argument("--force", action="store_true", help="rewrite outputs even if the data has not changed")
+        if command == 'run-all':
+            sub.add_argument("--skip", nargs="+", choices=RUN_ALL, default=[], help="stages to leave out")
+        sub.set_defaults(stages=stages)
+
+    args = parser.parse_args()
+    enable("tcg_cli", args.metrics, args.profile)
+
+    stages = [stage for stage in args.stages if stage not in getattr(args, 'skip', [])]
+    start = time.perf_counter()
+    with open_db(args.db) as conn:
+        install_summary(conn) # Schema and summary tables once up front; the stages' reads never write
+        timings = run_stages(conn, stages, args)
+
+    total = time.perf_counter() - start
+    print("\n" + "-" * 50)
+    print(f"tcg {args.command}: {total:.2f}s")
+    for name, seconds in timings.items():
+        print(f"  - {name:<8} {seconds:.2f}s")
+    print("-" * 50)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+# Brandon Reyes Parra
+
+
+import argparse
+import subprocess
+import sys
+
+from db_manager import open_db
+from report_writer import write_reports
+from tcg_stats import get_yearly_stats
+from yearly_summary import install_summary
+
+# Modules the report path must never import, and its import-time budget
+HEAVY_MODULES = ("matplotlib", "numpy")
+IMPORT_BUDGET_MS = 100
+
+
+def build_report(conn):
+    """
+    Yearly cards, sets and averages for both games as plain JSON-ready data.
+
+    Returns:
+        dict: {'years': [...], 'pokemon': {...}, 'yugioh': {...}, 'combined_cards': {...}}
+    """
+    stats = get_yearly_stats(conn)
+    report = {'years': sorted(set(stats.sets['pokemon']) | set(stats.sets['yugioh']))}
+    for game in ('pokemon', 'yugioh'):
+        report[game] = {
+            'cards': stats.cards[game],
+            'sets': stats.sets[game],
+            'average_cards_per_set': stats.average[game],
+            'total_cards': sum(stats.cards[game].values()),
+            'total_sets': sum(stats.sets[game].values()),
+        }
+    report['combined_cards'] = stats.combined
+    return report
+
+
+def check_import_time(module="tcg_report", budget_ms=IMPORT_BUDGET_MS):
+    """
+    Import `module` in a fresh interpreter and check it stays fast to start.
+
+    Fails if any HEAVY_MODULES get imported or the cumulative import time
+    reported by `python -X importtime` goes over budget_ms.
+
+    Returns:
+        tuple: (ok, import_ms, heavy modules that were loaded)
+    """
+    code = f"import sys, {module}; print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True, check=True)
+
+    import_us = 0
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        parts = line.split("|")
+        if len(parts) == 3 and parts[2].strip() == module:
+            import_us = int(parts[1].strip())
+    loaded = [name for name in result.stdout.strip().split(",") if name]
+
+    import_ms = import_us / 1000
+    return not loaded and import_ms <= budget_ms, import_ms, loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Text/CSV/JSON/Markdown TCG report without loading the plotting stack")
+    parser.add_argument("--format", nargs="+", choices=["text", "csv", "json", "markdown"], default=["text"], help="one or more output formats")
+    parser.add_argument("--output", default="All_calculation", help="output path without extension")
+    parser.add_argument("--force", action="store_true", help="rewrite even if the data has not changed since the last run")
+    parser.add_argument("--db", default="tcg_data.db")
+    parser.add_argument("--check-import", action="store_true", help="fail if importing the report path gets slow or loads matplotlib/numpy")
+    args = parser.parse_args()
+
+    if args.check_import:
+        ok, import_ms, loaded = check_import_time()
+        print(f"tcg_report import: {import_ms:.1f} ms (budget {IMPORT_BUDGET_MS} ms), heavy modules loaded: {loaded or 'none'}")
+        sys.exit(0 if ok else 1)
+
+    with open_db(args.db) as conn:
+        install_summary(conn) # Schema and summary tables once up front; the reads below never write
+        for path, written in write_reports(conn, args.output, args.format, args.force).items():
+            print(f"{path}: {'written' if written else 'unchanged, skipped'}")
+
+if __name__ == "__main__":
+    main()
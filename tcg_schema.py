@@ -0,0 +1,80 @@
+# Lance
+
+# Table and column names for each game, so shared code can work on either one
+GAMES = {
+    'pokemon': {
+        'label': "Pokemon",
+        'dates_table': "Pokemon Release Dates",
+        'date_id': "releaseDate_id",
+        'date': "releaseDate",
+        'date_format': "%Y/%m/%d",
+        'sets_table': "Pokemon Sets",
+        'name': "name",
+        'count': "total",
+    },
+    'yugioh': {
+        'label': "Yu-Gi-Oh",
+        'dates_table': "Yu-Gi-Oh Release Dates",
+        'date_id': "tcg_date_id",
+        'date': "tcg_date",
+        'date_format': "%Y-%m-%d",
+        'sets_table': "Yu-Gi-Oh Sets",
+        'name': "set_name",
+        'count': "num_of_cards",
+    },
+}
+
+
+def year_sql(conn, game, alias="rd"):
+    """
+    SQL for a release date's year: the indexed year column once add_date_columns
+    has run, otherwise the same value parsed from the date text, so read-only
+    connections to an older database still work.
+    """
+    t = GAMES[game]
+    columns = {row[1] for row in conn.execute(f'PRAGMA table_xinfo("{t["dates_table"]}")')}
+    if 'year' in columns:
+        return f"{alias}.year"
+    return f'CAST(substr({alias}."{t["date"]}", 1, 4) AS INTEGER)'
+
+
+def month_sql(conn, game, alias="rd"):
+    """
+    SQL for a release date's month, falling back to the date text like year_sql.
+    """
+    t = GAMES[game]
+    columns = {row[1] for row in conn.execute(f'PRAGMA table_xinfo("{t["dates_table"]}")')}
+    if 'month' in columns:
+        return f"{alias}.month"
+    return f'CAST(substr({alias}."{t["date"]}", 6, 2) AS INTEGER)'
+
+
+def add_date_columns(conn, game):
+    """
+    Add integer year and month columns to a game's release-date table.
+
+    They are virtual generated columns parsed from the date text (both the
+    1999/01/09 and 2002-03-08 formats), so existing rows get them for free and
+    the collectors do not have to fill them. The (year, month) index lets
+    GROUP BY year and date-range filters run inside SQLite.
+    """
+    t = GAMES[game]
+    cursor = conn.cursor()
+    cursor.execute(f'PRAGMA table_xinfo("{t["dates_table"]}")')
+    columns = {row[1] for row in cursor.fetchall()}
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?", (f"{game}_dates_year_month",))
+    if {'year', 'month'} <= columns and cursor.fetchone():
+        return # Nothing to do, and no transaction to commit
+
+    with conn:
+        if 'year' not in columns:
+            cursor.execute(f"""
+            ALTER TABLE "{t["dates_table"]}" ADD COLUMN year INTEGER
+                GENERATED ALWAYS AS (CAST(substr("{t["date"]}", 1, 4) AS INTEGER)) VIRTUAL
+            """)
+        if 'month' not in columns:
+            cursor.execute(f"""
+            ALTER TABLE "{t["dates_table"]}" ADD COLUMN month INTEGER
+                GENERATED ALWAYS AS (CAST(substr("{t["date"]}", 6, 2) AS INTEGER)) VIRTUAL
+            """)
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS "{game}_dates_year_month" ON "{t["dates_table"]}" (year, month, "{t["date_id"]}")')
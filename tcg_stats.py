@@ -0,0 +1,196 @@
+# Brandon Reyes Parra
+
+
+import math
+
+from instrumentation import span
+from tcg_schema import GAMES, year_sql
+from yearly_summary import is_installed
+
+
+SUMMARY_QUERY = """
+    SELECT game, year, card_total, set_count FROM yearly_summary
+"""
+
+# Fallback without yearly_summary: one of these per game whose tables exist, joined with UNION ALL
+YEARLY_STATS_QUERY = """
+    SELECT '{game}', {year}, SUM(s."{count}"), COUNT(s.set_id)
+    FROM "{dates_table}" rd
+    JOIN "{sets_table}" s ON rd."{date_id}" = s."{date_id}"
+    WHERE {year} > 0
+    GROUP BY {year}
+"""
+
+# Per-year spread read off a histogram of (year, cards, sets): running totals
+# over the sizes find the sets either side of each percentile's position
+DISTRIBUTION_QUERY = """
+    WITH histogram AS ({histogram}),
+    cumulative AS (
+        SELECT year, cards, sets,
+            SUM(sets) OVER (PARTITION BY year ORDER BY cards) AS below,
+            SUM(sets) OVER (PARTITION BY year) AS n
+        FROM histogram
+    )
+    SELECT year, n, MIN(cards), MAX(cards), SUM(cards * sets) * 1.0 / n, SUM(cards * cards * sets) * 1.0 / n,
+        MIN(CASE WHEN below > CAST((n - 1) * 0.5 AS INTEGER) THEN cards END),
+        MIN(CASE WHEN below > MIN(CAST((n - 1) * 0.5 AS INTEGER) + 1, n - 1) THEN cards END),
+        MIN(CASE WHEN below > CAST((n - 1) * 0.9 AS INTEGER) THEN cards END),
+        MIN(CASE WHEN below > MIN(CAST((n - 1) * 0.9 AS INTEGER) + 1, n - 1) THEN cards END)
+    FROM cumulative
+    GROUP BY year
+"""
+
+# set_size_histogram is kept current by triggers
+HISTOGRAM_TABLE = """
+    SELECT year, cards, sets FROM set_size_histogram WHERE game = '{game}'
+"""
+
+# Fallback while one game's tables are still missing
+HISTOGRAM_SCAN = """
+    SELECT {year} AS year, COALESCE(s."{count}", 0) AS cards, COUNT(*) AS sets
+    FROM "{sets_table}" s
+    JOIN "{dates_table}" rd ON rd."{date_id}" = s."{date_id}"
+    WHERE {year} > 0
+    GROUP BY {year}, cards
+"""
+
+_stats_cache = {} # id(conn) -> (conn, version, YearlyStats)
+_distribution_cache = {} # id(conn) -> (conn, version, {game: {year: {...}}})
+
+
+class YearlyStats:
+    """
+    Per-year card sums, set counts and averages for both games, built from one grouped query.
+
+    Every dict is keyed by the year as a string, like '1999'.
+    """
+
+    def __init__(self, rows):
+        self.cards = {'pokemon': {}, 'yugioh': {}}
+        self.sets = {'pokemon': {}, 'yugioh': {}}
+        for game, year, card_sum, set_count in rows:
+            year = str(year)
+            if card_sum is not None:
+                self.cards[game][year] = card_sum
+            self.sets[game][year] = set_count
+
+        self.average = {'pokemon': {}, 'yugioh': {}}
+        for game in self.cards:
+            for year, card_sum in self.cards[game].items():
+                if self.sets[game].get(year, 0) > 0:
+                    self.average[game][year] = round(card_sum / self.sets[game][year], 1)
+
+        all_years = set(self.cards['pokemon']) | set(self.cards['yugioh'])
+        self.combined = {year: self.cards['pokemon'].get(year, 0) + self.cards['yugioh'].get(year, 0) for year in all_years}
+
+
+def _existing_games(conn):
+    # Games whose release-date and sets tables both exist
+    names = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    return [game for game, t in GAMES.items() if t['sets_table'] in names and t['dates_table'] in names]
+
+
+def yearly_stats_query(conn, games):
+    """
+    The fallback per-year query over the given games' tables, or None if there are none.
+    """
+    if not games:
+        return None
+    return " UNION ALL ".join(YEARLY_STATS_QUERY.format(game=game, year=year_sql(conn, game), **GAMES[game]) for game in games)
+
+
+def _data_version(conn):
+    # data_version only moves for commits from other connections, total_changes covers our own
+    return conn.execute("PRAGMA data_version").fetchone()[0], conn.total_changes
+
+
+def get_yearly_stats(conn):
+    """
+    Return the YearlyStats for this connection, recomputing only when the database changed.
+    Never writes: without yearly_summary (see install_summary) it joins the sets tables instead.
+
+    Args:
+        conn: SQLite database connection
+    Returns:
+        YearlyStats
+    """
+    cached = _stats_cache.get(id(conn))
+    if cached and cached[0] is conn and cached[1] == _data_version(conn):
+        return cached[2]
+
+    # yearly_summary is kept current by triggers, so this reads O(years) rows
+    with span("stats.query") as s:
+        version = _data_version(conn)
+        if is_installed(conn, 'summary'):
+            rows = conn.execute(SUMMARY_QUERY).fetchall()
+        else:
+            query = yearly_stats_query(conn, _existing_games(conn))
+            rows = conn.execute(query).fetchall() if query else []
+        s.add(rows=len(rows))
+
+    stats = YearlyStats(rows)
+    _stats_cache[id(conn)] = (conn, version, stats)
+    return stats
+
+
+def _interpolate(n, p, low, high):
+    # Linear interpolation between the two ranks around position (n - 1) * p, like numpy's default
+    position = (n - 1) * p
+    return low + (high - low) * (position - int(position))
+
+
+def get_distribution_stats(conn):
+    """
+    Per-year spread of set sizes: median, p90, min, max and standard deviation.
+
+    Read from the trigger-maintained set_size_histogram, so the cost grows with
+    the number of distinct (year, size) pairs rather than the number of sets.
+    Percentiles interpolate like numpy's default; the standard deviation is the
+    population one. Cached per connection like get_yearly_stats, and like it
+    never writes: without the histogram it groups the sets tables instead.
+
+    Args:
+        conn: SQLite database connection
+    Returns:
+        dict: {'pokemon': {year: {'median', 'p90', 'min', 'max', 'stddev', 'sets'}}, 'yugioh': {...}}
+    """
+    cached = _distribution_cache.get(id(conn))
+    if cached and cached[0] is conn and cached[1] == _data_version(conn):
+        return cached[2]
+
+    distribution = {}
+    with span("stats.distribution_query") as s:
+        has_histogram = is_installed(conn, 'histogram')
+        games = _existing_games(conn)
+        for game, t in GAMES.items():
+            distribution[game] = {}
+            if game not in games:
+                continue
+            if has_histogram:
+                histogram = HISTOGRAM_TABLE.format(game=game)
+            else:
+                histogram = HISTOGRAM_SCAN.format(year=year_sql(conn, game), **t)
+            rows = conn.execute(DISTRIBUTION_QUERY.format(histogram=histogram)).fetchall()
+            s.add(rows=len(rows))
+            for year, n, low, high, mean, mean_square, median_low, median_high, p90_low, p90_high in rows:
+                distribution[game][str(year)] = {
+                    'median': round(_interpolate(n, 0.5, median_low, median_high), 1),
+                    'p90': round(_interpolate(n, 0.9, p90_low, p90_high), 1),
+                    'min': low,
+                    'max': high,
+                    'stddev': round(math.sqrt(max(mean_square - mean * mean, 0.0)), 1),
+                    'sets': n,
+                }
+
+    _distribution_cache[id(conn)] = (conn, _data_version(conn), distribution)
+    return distribution
+
+
+def clear_stats_cache(conn=None):
+    # Drop one connection's cached stats, or everything
+    if conn is None:
+        _stats_cache.clear()
+        _distribution_cache.clear()
+    else:
+        _stats_cache.pop(id(conn), None)
+        _distribution_cache.pop(id(conn), None)
@@ -0,0 +1,75 @@
+# Lance
+
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+
+import bulk_insert
+import pokemon_collection
+from db_manager import connect
+from yearly_summary import is_installed, verify_histogram, verify_summary
+
+
+def _records(prefix, count):
+    return [(f"{prefix} {i}", f"20{i % 20:02d}/01/01", i % 200) for i in range(count)]
+
+
+class BulkInsertTest(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.TemporaryDirectory()
+        self.conn = connect(os.path.join(self.workdir.name, "bulk.db"))
+        pokemon_collection.initialize_db(self.conn)
+
+    def tearDown(self):
+        self.conn.close()
+        self.workdir.cleanup()
+
+    def _assert_derived_tables_current(self):
+        self.assertEqual(verify_summary(self.conn), [])
+        self.assertEqual(verify_histogram(self.conn), [])
+        self.assertTrue(is_installed(self.conn, 'summary') and is_installed(self.conn, 'histogram'))
+        sets = self.conn.execute('SELECT COUNT(*) FROM "Pokemon Sets"').fetchone()[0]
+        self.assertEqual(self.conn.execute("SELECT COUNT(*) FROM set_search WHERE game = 'pokemon'").fetchone()[0], sets)
+
+    def test_large_batch_defers_triggers(self):
+        self.assertEqual(bulk_insert.bulk_insert_sets(self.conn, 'pokemon', _records("Bulk", bulk_insert.DEFER_TRIGGERS_MIN_ROWS)),
+                         bulk_insert.DEFER_TRIGGERS_MIN_ROWS)
+        self._assert_derived_tables_current()
+
+    def test_small_batch_keeps_triggers(self):
+        bulk_insert.bulk_insert_sets(self.conn, 'pokemon', _records("Bulk", bulk_insert.DEFER_TRIGGERS_MIN_ROWS))
+        self.assertEqual(bulk_insert.bulk_insert_sets(self.conn, 'pokemon', _records("More", 50)), 50)
+        self._assert_derived_tables_current()
+
+    def test_triggers_come_back_after_a_failed_load(self):
+        with self.assertRaises(RuntimeError):
+            with bulk_insert.insert_triggers_deferred(self.conn, ['pokemon']):
+                raise RuntimeError("load failed")
+        bulk_insert.bulk_insert_sets(self.conn, 'pokemon', _records("After", 10))
+        self._assert_derived_tables_current()
+
+    def test_new_dates_are_resolved_and_stats_returned(self):
+        stats = {}
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            bulk_insert.bulk_insert_sets(self.conn, 'pokemon', _records("Old", 10), stats=stats)
+            # Half the dates are stored already, the rest are new and more than one IN chunk
+            records = _records("New", 10) + [(f"Late {i}", f"{2100 + i // 300}/{i % 12 + 1:02d}/{i % 25 + 1:02d}", i) for i in range(bulk_insert.MAX_VARIABLES + 50)]
+            bulk_insert.bulk_insert_sets(self.conn, 'pokemon', records, stats=stats)
+
+        self.assertEqual(output.getvalue(), "")
+        self.assertEqual(stats['rows'], 20 + bulk_insert.MAX_VARIABLES + 50)
+        self.assertGreater(stats['seconds'], 0)
+        mismatched = self.conn.execute("""
+        SELECT COUNT(*) FROM "Pokemon Sets" s
+        LEFT JOIN "Pokemon Release Dates" rd ON rd.releaseDate_id = s.releaseDate_id
+        WHERE rd.releaseDate IS NULL OR (s.name LIKE 'Late %' AND rd.releaseDate NOT LIKE '21__/%')
+        """).fetchone()[0]
+        self.assertEqual(mismatched, 0)
+        self._assert_derived_tables_current()
+
+
+if __name__ == "__main__":
+    unittest.main()
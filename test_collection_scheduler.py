@@ -0,0 +1,88 @@
+# Lance
+
+import asyncio
+import os
+import tempfile
+import time
+import unittest
+
+import requests
+
+import collection_scheduler
+import mock_api
+import pokemon_collection
+import yugioh_collection
+from db_manager import connect
+
+
+def _stored(conn, table):
+    return conn.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0]
+
+
+class SchedulerTest(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.TemporaryDirectory()
+        self.conn = connect(os.path.join(self.workdir.name, "scheduler.db"))
+        pokemon_collection.initialize_db(self.conn)
+        yugioh_collection.initialize_db(self.conn)
+        self.pokemon_sets = mock_api.make_pokemon_sets(120)
+        self.yugioh_sets = mock_api.make_yugioh_sets(80)
+
+    def tearDown(self):
+        self.conn.close()
+        self.workdir.cleanup()
+
+    def _serve(self, **conditions):
+        server, base_url = mock_api.start_server(self.pokemon_sets, self.yugioh_sets, **conditions)
+        self.addCleanup(server.shutdown)
+        return server, base_url
+
+    def test_retries_throttled_requests_with_backoff(self):
+        server, base_url = self._serve(throttle_rate=0.3, seed=7)
+        adapters = [collection_scheduler.PokemonAdapter(base_url=f"{base_url}/v2", page_size=10),
+                    collection_scheduler.YugiohAdapter(base_url=f"{base_url}/api/v7")]
+        for adapter in adapters:
+            adapter.rate = 50 # Keep the run short; backoff still applies to every 429
+        results = asyncio.run(collection_scheduler.run_all(self.conn, adapters))
+
+        self.assertGreater(server.stats['throttled'], 0)
+        self.assertEqual(sum(stats['retries'] for stats in results.values()), server.stats['throttled'])
+        self.assertEqual(sum(stats['errors'] for stats in results.values()), 0)
+        self.assertEqual(results['pokemon']['inserted'], len(self.pokemon_sets))
+        self.assertEqual(results['yugioh']['inserted'], len(self.yugioh_sets))
+
+    def test_gives_up_after_max_retries(self):
+        server, base_url = self._serve(throttle_rate=1.0)
+        adapter = collection_scheduler.YugiohAdapter(base_url=f"{base_url}/api/v7")
+        bucket = collection_scheduler.TokenBucket(100, 100)
+        stats = {'requests': 0, 'retries': 0}
+        with self.assertRaises(requests.exceptions.HTTPError):
+            asyncio.run(collection_scheduler.fetch_with_retry(adapter, bucket, adapter.initial_requests()[0], stats, max_retries=2, base_delay=0.01))
+        self.assertEqual((stats['requests'], stats['retries']), (3, 2))
+        self.assertLess(bucket.rate, bucket.max_rate) # Every 429 slows the bucket down
+
+    def test_rate_limit_is_respected(self):
+        # The server answers 429 above 20 requests per second; the adapter asks for 10
+        server, base_url = self._serve(rate_limit=20)
+        adapter = collection_scheduler.PokemonAdapter(base_url=f"{base_url}/v2", page_size=10)
+        adapter.rate, adapter.burst = 10, 1
+        start = time.perf_counter()
+        results = asyncio.run(collection_scheduler.run_all(self.conn, [adapter], concurrency=4))
+        elapsed = time.perf_counter() - start
+
+        self.assertEqual(server.stats['throttled'], 0)
+        self.assertEqual(results['pokemon']['requests'], 12)
+        self.assertGreaterEqual(elapsed, 11 / 10 * 0.9) # 12 requests, one at a time after the first token
+        self.assertEqual(_stored(self.conn, "Pokemon Sets"), len(self.pokemon_sets))
+
+    def test_token_bucket_adapts(self):
+        bucket = collection_scheduler.TokenBucket(8, 1)
+        bucket.slow_down()
+        self.assertEqual(bucket.rate, 4)
+        for _ in range(100):
+            bucket.speed_up()
+        self.assertEqual(bucket.rate, 8)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+# Lance
+
+import os
+import tempfile
+import unittest
+
+import mock_api
+import pokemon_collection
+import yugioh_collection
+from db_manager import connect
+from yearly_summary import verify_summary
+
+
+class ResyncTest(unittest.TestCase):
+    """
+    Every collection mode run twice against the mock API: the second run must store nothing new.
+    """
+
+    def setUp(self):
+        self.workdir = tempfile.TemporaryDirectory()
+        self.cwd = os.getcwd()
+        os.chdir(self.workdir.name) # The response cache lives in the working directory
+        self.conn = connect("collectors.db")
+        pokemon_collection.initialize_db(self.conn)
+        yugioh_collection.initialize_db(self.conn)
+
+        self.pokemon_sets = mock_api.make_pokemon_sets(130)
+        self.yugioh_sets = mock_api.make_yugioh_sets(90)
+        server, base_url = mock_api.start_server(self.pokemon_sets, self.yugioh_sets, latency=0.01)
+        self.addCleanup(server.shutdown)
+        self.pokemon_url = f"{base_url}/v2"
+        self.yugioh_url = f"{base_url}/api/v7"
+
+    def tearDown(self):
+        self.conn.close()
+        os.chdir(self.cwd)
+        self.workdir.cleanup()
+
+    def _stored(self, game):
+        module = pokemon_collection if game == 'pokemon' else yugioh_collection
+        return module.get_current_state(self.conn.cursor())
+
+    def _assert_all_stored_once(self):
+        self.assertEqual(self._stored('pokemon'), len(self.pokemon_sets))
+        self.assertEqual(self._stored('yugioh'), len(self.yugioh_sets))
+        self.assertEqual(verify_summary(self.conn), [])
+
+    def test_full_sync_twice(self):
+        self.assertEqual(pokemon_collection.sync_all_sets(self.conn, None, page_size=50, base_url=self.pokemon_url), (130, True))
+        self.assertEqual(yugioh_collection.stream_ingest(self.conn, self.yugioh_url, batch_size=40), (90, True))
+        self.assertEqual(pokemon_collection.sync_all_sets(self.conn, None, page_size=50, base_url=self.pokemon_url), (0, True))
+        self.assertEqual(yugioh_collection.stream_ingest(self.conn, self.yugioh_url, batch_size=40), (0, True))
+        self._assert_all_stored_once()
+
+    def test_collect_to_target_then_full_sync(self):
+        # Pokemon runs add whole pages of 25, Yu-Gi-Oh stops at the target itself
+        self.assertEqual(pokemon_collection.collect_to_target(self.conn, None, 60, page_size=50, base_url=self.pokemon_url), (75, True))
+        self.assertEqual(yugioh_collection.collect_to_target(self.conn, 60, self.yugioh_url), (60, True))
+        self.assertEqual(pokemon_collection.sync_all_sets(self.conn, None, page_size=50, base_url=self.pokemon_url), (55, True))
+        self.assertEqual(yugioh_collection.stream_ingest(self.conn, self.yugioh_url), (30, True))
+        self._assert_all_stored_once()
+
+    def test_delta_sync_twice(self):
+        first = pokemon_collection.delta_sync(self.conn, None, page_size=50, base_url=self.pokemon_url)
+        self.assertEqual((first['inserted'], first['updated']), (130, 0))
+        first = yugioh_collection.delta_sync(self.conn, self.yugioh_url)
+        self.assertEqual((first['inserted'], first['updated']), (90, 0))
+
+        second = pokemon_collection.delta_sync(self.conn, None, page_size=50, base_url=self.pokemon_url)
+        self.assertEqual((second['inserted'], second['updated']), (0, 0))
+        second = yugioh_collection.delta_sync(self.conn, self.yugioh_url)
+        self.assertEqual((second['inserted'], second['updated'], second['unchanged']), (0, 0, 90))
+        self._assert_all_stored_once()
+
+
+if __name__ == "__main__":
+    unittest.main()
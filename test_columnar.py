@@ -0,0 +1,51 @@
+# Brandon Reyes Parra
+
+
+import os
+import tempfile
+import unittest
+
+import columnar
+from db_manager import connect
+from synthetic_db import generate_db
+from tcg_stats import get_distribution_stats
+from yearly_summary import install_summary
+
+
+class ColumnarDistributionTest(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.workdir.name, "synthetic.db")
+        self.cache_dir = os.path.join(self.workdir.name, "columnar_cache")
+        generate_db(self.db_path, 2000, 2000)
+        self.conn = connect(self.db_path)
+        install_summary(self.conn)
+
+    def tearDown(self):
+        self.conn.close()
+        self.workdir.cleanup()
+
+    def test_matches_sql_distribution(self):
+        self.assertEqual(columnar.distribution_stats(self.conn, self.cache_dir), get_distribution_stats(self.conn))
+
+    def test_cache_is_invalidated_by_writes(self):
+        before = columnar.distribution_stats(self.conn, self.cache_dir)
+        with self.conn:
+            self.conn.execute('UPDATE "Pokemon Sets" SET total = total + 1000 WHERE set_id = 1')
+        after = columnar.distribution_stats(self.conn, self.cache_dir)
+        self.assertNotEqual(before['pokemon'], after['pokemon'])
+        self.assertEqual(after, get_distribution_stats(self.conn))
+
+    def test_reading_never_alters_the_schema(self):
+        schema = self.conn.execute("SELECT sql FROM sqlite_master ORDER BY name").fetchall()
+        columnar.distribution_stats(self.conn, self.cache_dir)
+        self.assertEqual(self.conn.execute("SELECT sql FROM sqlite_master ORDER BY name").fetchall(), schema)
+
+    def test_empty_database(self):
+        conn = connect(":memory:")
+        self.assertEqual(columnar.distribution_stats(conn, self.cache_dir), {'pokemon': {}, 'yugioh': {}})
+        conn.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
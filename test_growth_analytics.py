@@ -0,0 +1,60 @@
+# Brandon Reyes Parra
+
+
+import os
+import sqlite3
+import tempfile
+import unittest
+
+import migrations
+from db_manager import connect
+from growth_analytics import TimeSeries, load_series
+
+
+class AverageSizeGrowthTest(unittest.TestCase):
+    def setUp(self):
+        # year: (cards, sets) -> cards per set 10, 20, none, 40
+        self.series = TimeSeries('year', {2000: (20, 2), 2001: (60, 3), 2003: (40, 1)})
+
+    def test_year_over_year_avg_size(self):
+        growth = self.series.year_over_year('avg_size')
+        self.assertEqual(growth['2001'], 100.0)
+        self.assertIsNone(growth['2002']) # no sets that year
+        self.assertIsNone(growth['2003']) # nothing to compare against
+
+    def test_year_over_year_cards_unchanged(self):
+        self.assertEqual(self.series.year_over_year('cards')['2001'], 200.0)
+
+    def test_cagr_avg_size_is_ratio_of_window_sums(self):
+        # 10 cards per set in 2000, 40 in 2003: doubling every 1.5 years
+        self.assertAlmostEqual(self.series.cagr(0, 4, metric='avg_size'), (4 ** (1 / 3) - 1) * 100)
+
+    def test_cagr_avg_size_weights_by_sets(self):
+        # Two-year windows two years apart: (20 + 60) / (2 + 3) = 16 against (0 + 40) / (0 + 1) = 40, not a mean of averages
+        self.assertAlmostEqual(self.series.cagr(0, 4, metric='avg_size', width=2), ((40 / 16) ** (1 / 2) - 1) * 100)
+
+    def test_cagr_avg_size_without_sets(self):
+        self.assertIsNone(TimeSeries('year', {2000: (0, 0), 2001: (10, 1)}).cagr(0, 2, metric='avg_size'))
+
+
+class LoadSeriesTest(unittest.TestCase):
+    def test_read_only_database_without_date_columns(self):
+        # Only migration 1: no year/month columns, and a mode=ro connection cannot add them
+        with tempfile.TemporaryDirectory() as workdir:
+            path = os.path.join(workdir, "old.db")
+            conn = sqlite3.connect(path)
+            migrations.migrate(conn, target=1)
+            with conn:
+                conn.execute('INSERT INTO "Pokemon Release Dates" VALUES (1, "1999/03/09")')
+                conn.execute('INSERT INTO "Pokemon Sets" (name, total, releaseDate_id) VALUES ("Base", 102, 1)')
+            conn.close()
+
+            read_only = connect(path, read_only=True)
+            series = load_series(read_only, 'pokemon', 'month')
+            read_only.close()
+        self.assertEqual(series.labels, ["1999-03"])
+        self.assertEqual(series.cards.window_sum(0, 1), 102)
+
+
+if __name__ == "__main__":
+    unittest.main()
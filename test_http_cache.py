@@ -0,0 +1,54 @@
+# Lance
+
+import marshal
+import os
+import tempfile
+import unittest
+
+import http_cache
+import mock_api
+
+
+class HttpCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self.workdir.name, "cache")
+        self.sets = mock_api.make_yugioh_sets(50)
+        self.server, base_url = mock_api.start_server([], self.sets)
+        self.addCleanup(self.server.shutdown)
+        self.url = f"{base_url}/api/v7/cardsets.php"
+
+    def tearDown(self):
+        self.workdir.cleanup()
+
+    def _get(self, url=None, max_bytes=http_cache.MAX_CACHE_BYTES):
+        return http_cache.cached_get_json(url or self.url, cache_dir=self.cache_dir, max_bytes=max_bytes)
+
+    def test_revalidated_from_the_snapshot_without_leftover_files(self):
+        self.assertEqual(self._get(), (self.sets, 'downloaded'))
+        self.assertEqual(self._get(), (self.sets, 'revalidated'))
+        self.assertFalse([name for name in os.listdir(self.cache_dir) if name.endswith(".tmp")])
+
+    def test_snapshot_from_another_python_is_not_loaded(self):
+        self._get()
+        meta_path, _, parsed_path = http_cache._entry_paths(self.cache_dir, self.url)
+        meta = http_cache._read_meta(meta_path)
+        meta['parsed_format'] = "2.7/marshal2"
+        http_cache._write_meta(meta_path, meta)
+        with open(parsed_path, 'wb') as f:
+            marshal.dump(["stale"], f)
+        self.assertEqual(self._get(), (self.sets, 'revalidated')) # Served from the gzip body instead
+
+    def test_entry_just_stored_is_not_evicted(self):
+        other_url = self.url.replace("cardsets.php", "cardinfo.php")
+        self._get(other_url)
+        self._get(max_bytes=1)
+
+        meta_path = http_cache._entry_paths(self.cache_dir, self.url)[0]
+        self.assertIsNotNone(http_cache._read_meta(meta_path))
+        self.assertIsNone(http_cache._read_meta(http_cache._entry_paths(self.cache_dir, other_url)[0]))
+        self.assertEqual(self._get(max_bytes=1), (self.sets, 'revalidated'))
+
+
+if __name__ == "__main__":
+    unittest.main()
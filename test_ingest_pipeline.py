@@ -0,0 +1,115 @@
+# Lance
+
+import os
+import tempfile
+import time
+import unittest
+
+import requests
+
+import mock_api
+import pokemon_collection
+import yugioh_collection
+from db_manager import connect
+from ingest_pipeline import PokemonSource, YugiohSource, run_pipeline
+from yearly_summary import verify_summary
+
+
+class MockConditionsTest(unittest.TestCase):
+    """
+    The conditions mock_api injects, seen from a plain client.
+    """
+
+    def _start(self, **conditions):
+        server, base_url = mock_api.start_server(mock_api.make_pokemon_sets(10), mock_api.make_yugioh_sets(10), **conditions)
+        self.addCleanup(server.shutdown)
+        return server, f"{base_url}/v2/sets"
+
+    def test_throttle_rate_answers_429_with_retry_after(self):
+        server, url = self._start(throttle_rate=0.5, seed=3)
+        statuses = [requests.get(url, timeout=5) for _ in range(40)]
+        throttled = [r for r in statuses if r.status_code == 429]
+        self.assertEqual(len(throttled), server.stats['throttled'])
+        self.assertTrue(0 < len(throttled) < 40)
+        self.assertTrue(all(r.headers.get('Retry-After') == '0' for r in throttled))
+
+    def test_error_rate_answers_5xx(self):
+        server, url = self._start(error_rate=1.0)
+        response = requests.get(url, timeout=5)
+        self.assertIn(response.status_code, mock_api.ERROR_STATUSES)
+        self.assertEqual(server.stats['errors'], 1)
+
+    def test_rate_limit_throttles_a_burst(self):
+        server, url = self._start(rate_limit=5)
+        with requests.Session() as session:
+            statuses = [session.get(url, timeout=5).status_code for _ in range(12)]
+        self.assertEqual(statuses[:5], [200] * 5)
+        self.assertIn(429, statuses[5:])
+
+    def test_latency(self):
+        server, url = self._start(latency=0.1)
+        start = time.perf_counter()
+        requests.get(url, timeout=5)
+        self.assertGreaterEqual(time.perf_counter() - start, 0.1)
+
+
+class PipelineTest(unittest.TestCase):
+    """
+    run_pipeline against the mock API, with latency and injected failures.
+    """
+
+    def setUp(self):
+        self.workdir = tempfile.TemporaryDirectory()
+        self.cwd = os.getcwd()
+        os.chdir(self.workdir.name)
+        self.conn = connect("pipeline.db")
+        pokemon_collection.initialize_db(self.conn) # As ingest_pipeline's main does
+        yugioh_collection.initialize_db(self.conn)
+
+        self.pokemon_sets = mock_api.make_pokemon_sets(130)
+        self.yugioh_sets = mock_api.make_yugioh_sets(90)
+        self.server, base_url = mock_api.start_server(self.pokemon_sets, self.yugioh_sets, latency=0.01)
+        self.addCleanup(self.server.shutdown)
+        self.pokemon_url = f"{base_url}/v2"
+        self.yugioh_url = f"{base_url}/api/v7"
+
+    def tearDown(self):
+        self.conn.close()
+        os.chdir(self.cwd)
+        self.workdir.cleanup()
+
+    def _stored(self, table):
+        return self.conn.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0]
+
+    def _run(self, game):
+        source = PokemonSource(None, self.pokemon_url, page_size=20) if game == 'pokemon' else YugiohSource(self.yugioh_url, batch_size=25)
+        return run_pipeline(self.conn, source, batch_rows=40)
+
+    def test_run_twice_stores_every_set_once(self):
+        first = {game: self._run(game) for game in ('pokemon', 'yugioh')}
+        self.assertEqual((first['pokemon']['inserted'], first['pokemon']['errors']), (130, []))
+        self.assertEqual((first['yugioh']['inserted'], first['yugioh']['errors']), (90, []))
+
+        for game in ('pokemon', 'yugioh'):
+            self.assertEqual(self._run(game)['inserted'], 0)
+        self.assertEqual(self._stored("Pokemon Sets"), 130)
+        self.assertEqual(self._stored("Yu-Gi-Oh Sets"), 90)
+        self.assertEqual(verify_summary(self.conn), [])
+
+    def test_failed_pages_are_reported_and_filled_by_a_rerun(self):
+        self.server.error_rate = 0.3
+        self.server.random.seed(11)
+        result = self._run('pokemon')
+        self.assertEqual(len(result['errors']), self.server.stats['errors'])
+        self.assertGreater(self.server.stats['errors'], 0)
+        self.assertEqual(self._stored("Pokemon Sets"), result['inserted'])
+
+        self.server.error_rate = 0
+        rerun = self._run('pokemon')
+        self.assertEqual(rerun['errors'], [])
+        self.assertEqual(result['inserted'] + rerun['inserted'], 130)
+        self.assertEqual(self._stored("Pokemon Sets"), 130)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+# Lance
+
+import os
+import sqlite3
+import tempfile
+import unittest
+
+import migrations
+from db_manager import connect
+from synthetic_db import generate_db
+
+
+def _schema(conn):
+    return conn.execute("SELECT type, name, sql FROM sqlite_master ORDER BY name").fetchall()
+
+
+class QueryPlanTest(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.workdir.name, "synthetic.db")
+        generate_db(self.db_path, 500, 500) # Built through the collectors' initialize_db, so fully migrated
+        self.conn = connect(self.db_path)
+
+    def tearDown(self):
+        self.conn.close()
+        self.workdir.cleanup()
+
+    def _plan(self, sql):
+        return [row[3] for row in self.conn.execute("EXPLAIN QUERY PLAN " + sql).fetchall()]
+
+    def test_migrated_to_latest(self):
+        self.assertEqual(migrations.current_version(self.conn), migrations.LATEST_VERSION)
+        self.assertEqual(migrations.migrate(self.conn), [])
+
+    def test_calculation_queries_use_expected_index(self):
+        for label, sql, _ in migrations.plan_queries():
+            game = label.split()[0]
+            expected = "USING PRIMARY KEY" if "histogram table" in label else f"USING COVERING INDEX {game}_sets_date_count"
+            with self.subTest(query=label):
+                self.assertTrue(any(expected in step for step in self._plan(sql)), self._plan(sql))
+        self.assertEqual(migrations.check_query_plans(self.conn), ([], []))
+
+    def test_scan_regression_is_caught(self):
+        with self.conn:
+            self.conn.execute('DROP INDEX pokemon_sets_date_count')
+            self.conn.execute('DROP INDEX pokemon_dates_year_month')
+        failures, _ = migrations.check_query_plans(self.conn)
+        self.assertTrue(failures)
+        self.assertTrue(all(label.startswith("pokemon") for label, _ in failures))
+
+    def test_check_never_writes(self):
+        # Migrated only: no summary tables, so the histogram queries are skipped rather than installed
+        conn = connect(os.path.join(self.workdir.name, "migrated.db"))
+        migrations.migrate(conn)
+        schema = _schema(conn)
+        failures, skipped = migrations.check_query_plans(conn)
+        self.assertEqual(failures, [])
+        self.assertEqual({label for label, _ in skipped}, {"pokemon size distribution (histogram table)", "yugioh size distribution (histogram table)"})
+        self.assertEqual(_schema(conn), schema)
+        conn.close()
+
+
+class UniquePokemonSetsTest(unittest.TestCase):
+    def test_references_move_to_the_surviving_set(self):
+        conn = sqlite3.connect(":memory:")
+        conn.execute("PRAGMA foreign_keys = ON")
+        migrations.migrate(conn, target=4)
+        with conn:
+            conn.execute('INSERT INTO "Pokemon Release Dates" VALUES (1, "1999/01/09")')
+            conn.executemany('INSERT INTO "Pokemon Sets" (set_id, name, total, releaseDate_id) VALUES (?, ?, 102, 1)', [(1, "Base"), (2, "Base"), (3, "Jungle")])
+            conn.execute('CREATE TABLE "Pokemon Cards" (card_id INTEGER PRIMARY KEY, upstream_id TEXT UNIQUE, set_id INTEGER REFERENCES "Pokemon Sets" (set_id))')
+            conn.executemany('INSERT INTO "Pokemon Cards" (upstream_id, set_id) VALUES (?, ?)', [("base1-1", 2), ("base2-1", 3)])
+            conn.execute("CREATE TABLE sync_state (game TEXT, upstream_id TEXT, set_id INTEGER, content_hash TEXT, synced_at TEXT)")
+            conn.executemany("INSERT INTO sync_state VALUES (?, ?, ?, '', '')", [("pokemon", "base1", 2), ("yugioh", "LOB", 2)])
+
+        self.assertEqual(migrations.migrate(conn), [5])
+        self.assertEqual(conn.execute('SELECT set_id FROM "Pokemon Sets" ORDER BY set_id').fetchall(), [(1,), (3,)])
+        self.assertEqual(conn.execute('SELECT upstream_id, set_id FROM "Pokemon Cards" ORDER BY card_id').fetchall(), [("base1-1", 1), ("base2-1", 3)])
+        self.assertEqual(conn.execute("SELECT game, set_id FROM sync_state ORDER BY game").fetchall(), [("pokemon", 1), ("yugioh", 2)])
+        self.assertEqual(conn.execute("PRAGMA foreign_key_check").fetchall(), [])
+        conn.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,36 @@
+# Brandon Reyes Parra
+
+import os
+import subprocess
+import sys
+import unittest
+
+import tcg_report
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class ImportTimeTest(unittest.TestCase):
+    """
+    tcg_report must start fast: no plotting stack and under IMPORT_BUDGET_MS.
+    """
+
+    def test_import_skips_heavy_modules_and_stays_in_budget(self):
+        result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import tcg_report"],
+                                capture_output=True, text=True, check=True, cwd=REPO_DIR)
+
+        imported = {}
+        for line in result.stderr.splitlines():
+            # import time: self [us] | cumulative | imported package
+            parts = line.split("|")
+            if len(parts) == 3 and parts[1].strip().isdigit():
+                imported[parts[2].strip()] = int(parts[1].strip())
+
+        self.assertIn("tcg_report", imported)
+        for heavy in tcg_report.HEAVY_MODULES:
+            self.assertFalse([name for name in imported if name == heavy or name.startswith(heavy + ".")], heavy)
+        self.assertLessEqual(imported["tcg_report"] / 1000, tcg_report.IMPORT_BUDGET_MS)
+
+
+if __name__ == "__main__":
+    unittest.main()
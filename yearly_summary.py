@@ -0,0 +1,307 @@
+# Brandon Reyes Parra
+
+
+import argparse
+
+from db_manager import open_db
+from migrations import migrate
+from tcg_schema import GAMES, add_date_columns
+
+
+def _table_exists(cursor, name):
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,))
+    return cursor.fetchone() is not None
+
+
+def _summary_triggers(game):
+    """
+    SQL for the triggers that keep yearly_summary in step with one game's sets table.
+    """
+    t = GAMES[game]
+    sets, dates, date_id, date, count = t['sets_table'], t['dates_table'], t['date_id'], t['date'], t['count']
+
+    def add(row, sign):
+        # Upsert the row's year with +/- its card count and one set
+        return f"""
+        INSERT INTO yearly_summary (game, year, card_total, set_count)
+        SELECT '{game}', year, {sign}COALESCE({row}."{count}", 0), {sign}1 FROM "{dates}" WHERE "{date_id}" = {row}."{date_id}" AND year > 0
+        ON CONFLICT(game, year) DO UPDATE SET card_total = card_total + excluded.card_total, set_count = set_count + excluded.set_count;
+        """
+
+    cleanup = f"DELETE FROM yearly_summary WHERE game = '{game}' AND set_count <= 0;"
+
+    return [
+        f"""
+        CREATE TRIGGER IF NOT EXISTS "{game}_summary_insert" AFTER INSERT ON "{sets}"
+        BEGIN {add('NEW', '')} END;
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS "{game}_summary_delete" AFTER DELETE ON "{sets}"
+        BEGIN {add('OLD', '-')} {cleanup} END;
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS "{game}_summary_update" AFTER UPDATE OF "{count}", "{date_id}" ON "{sets}"
+        BEGIN {add('OLD', '-')} {add('NEW', '')} {cleanup} END;
+        """,
+        # A corrected release date moves all of its sets to another year
+        f"""
+        CREATE TRIGGER IF NOT EXISTS "{game}_summary_date_update" AFTER UPDATE OF "{date}" ON "{dates}"
+        WHEN OLD.year IS NOT NEW.year
+        BEGIN
+            INSERT INTO yearly_summary (game, year, card_total, set_count)
+            SELECT '{game}', OLD.year, -COALESCE(SUM("{count}"), 0), -COUNT(*) FROM "{sets}" WHERE "{date_id}" = OLD."{date_id}" AND OLD.year > 0
+            ON CONFLICT(game, year) DO UPDATE SET card_total = card_total + excluded.card_total, set_count = set_count + excluded.set_count;
+            INSERT INTO yearly_summary (game, year, card_total, set_count)
+            SELECT '{game}', NEW.year, COALESCE(SUM("{count}"), 0), COUNT(*) FROM "{sets}" WHERE "{date_id}" = NEW."{date_id}" AND NEW.year > 0
+            ON CONFLICT(game, year) DO UPDATE SET card_total = card_total + excluded.card_total, set_count = set_count + excluded.set_count;
+            {cleanup}
+        END;
+        """,
+    ]
+
+
+def _histogram_triggers(game):
+    """
+    SQL for the triggers that keep set_size_histogram (sets per year and card count) in step with one game's sets table.
+    """
+    t = GAMES[game]
+    sets, dates, date_id, date, count = t['sets_table'], t['dates_table'], t['date_id'], t['date'], t['count']
+
+    def add(row, sign):
+        return f"""
+        INSERT INTO set_size_histogram (game, year, cards, sets)
+        SELECT '{game}', year, COALESCE({row}."{count}", 0), {sign}1 FROM "{dates}" WHERE "{date_id}" = {row}."{date_id}" AND year > 0
+        ON CONFLICT(game, year, cards) DO UPDATE SET sets = sets + excluded.sets;
+        """
+
+    def cleanup(row):
+        # Only the bucket the old row left can have dropped to zero
+        return f"""
+        DELETE FROM set_size_histogram WHERE game = '{game}' AND sets <= 0
+            AND year = (SELECT year FROM "{dates}" WHERE "{date_id}" = {row}."{date_id}") AND cards = COALESCE({row}."{count}", 0);
+        """
+
+    def move(year, sign):
+        return f"""
+        INSERT INTO set_size_histogram (game, year, cards, sets)
+        SELECT '{game}', {year}, COALESCE("{count}", 0), {sign}COUNT(*) FROM "{sets}" WHERE "{date_id}" = OLD."{date_id}" AND {year} > 0
+        GROUP BY COALESCE("{count}", 0)
+        ON CONFLICT(game, year, cards) DO UPDATE SET sets = sets + excluded.sets;
+        """
+
+    return [
+        f"""
+        CREATE TRIGGER IF NOT EXISTS "{game}_histogram_insert" AFTER INSERT ON "{sets}"
+        BEGIN {add('NEW', '')} END;
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS "{game}_histogram_delete" AFTER DELETE ON "{sets}"
+        BEGIN {add('OLD', '-')} {cleanup('OLD')} END;
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS "{game}_histogram_update" AFTER UPDATE OF "{count}", "{date_id}" ON "{sets}"
+        BEGIN {add('OLD', '-')} {add('NEW', '')} {cleanup('OLD')} END;
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS "{game}_histogram_date_update" AFTER UPDATE OF "{date}" ON "{dates}"
+        WHEN OLD.year IS NOT NEW.year
+        BEGIN
+            {move('OLD.year', '-')} {move('NEW.year', '')}
+            DELETE FROM set_size_histogram WHERE game = '{game}' AND year = OLD.year AND sets <= 0;
+        END;
+        """,
+    ]
+
+
+def _expected_rows(cursor, game):
+    # Recompute one game's summary straight from the sets table
+    t = GAMES[game]
+    cursor.execute(f"""
+        SELECT rd.year, COALESCE(SUM(s."{t["count"]}"), 0), COUNT(s.set_id)
+        FROM "{t["dates_table"]}" rd
+        JOIN "{t["sets_table"]}" s ON rd."{t["date_id"]}" = s."{t["date_id"]}"
+        WHERE rd.year > 0
+        GROUP BY rd.year
+    """)
+    return {year: (card_total, set_count) for year, card_total, set_count in cursor.fetchall()}
+
+
+def _expected_histogram(cursor, game):
+    # Recompute one game's histogram straight from the sets table
+    t = GAMES[game]
+    cursor.execute(f"""
+        SELECT rd.year, COALESCE(s."{t["count"]}", 0), COUNT(*)
+        FROM "{t["dates_table"]}" rd
+        JOIN "{t["sets_table"]}" s ON rd."{t["date_id"]}" = s."{t["date_id"]}"
+        WHERE rd.year > 0
+        GROUP BY rd.year, COALESCE(s."{t["count"]}", 0)
+    """)
+    return {(year, cards): sets for year, cards, sets in cursor.fetchall()}
+
+
+def is_installed(conn, kind='summary'):
+    """
+    Read-only check that yearly_summary (kind='summary') or set_size_histogram
+    (kind='histogram') exists and has triggers on every game whose tables exist.
+    """
+    cursor = conn.cursor()
+    table = 'yearly_summary' if kind == 'summary' else 'set_size_histogram'
+    if not _table_exists(cursor, table):
+        return False
+    cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")
+    triggers = {row[0] for row in cursor.fetchall()}
+    return all(f"{game}_{kind}_insert" in triggers for game, t in GAMES.items() if _table_exists(cursor, t['sets_table']))
+
+
+def install_summary(conn):
+    """
+    Create yearly_summary, set_size_histogram and their triggers for every
+    game whose tables exist. Each table is filled with rebuild_summary() /
+    rebuild_histogram() whenever a game gets its triggers for the first time.
+
+    Returns:
+        bool: True if the summary covers both games
+    """
+    migrate(conn) # One lookup once the schema is current
+    cursor = conn.cursor()
+    games = [game for game, t in GAMES.items() if _table_exists(cursor, t['sets_table']) and _table_exists(cursor, t['dates_table'])]
+
+    cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")
+    triggers = {row[0] for row in cursor.fetchall()}
+    needs_rebuild = any(f"{game}_summary_insert" not in triggers for game in games)
+    needs_histogram = any(f"{game}_histogram_insert" not in triggers for game in games)
+    if not needs_rebuild and not needs_histogram and _table_exists(cursor, 'yearly_summary') and _table_exists(cursor, 'set_size_histogram'):
+        return len(games) == len(GAMES) # Already installed, stay read-only
+
+    for game in games:
+        add_date_columns(conn, game)
+
+    with conn:
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS yearly_summary (
+            game TEXT NOT NULL,
+            year INTEGER NOT NULL,
+            card_total INTEGER NOT NULL,
+            set_count INTEGER NOT NULL,
+            PRIMARY KEY (game, year)
+        );
+        """)
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS set_size_histogram (
+            game TEXT NOT NULL,
+            year INTEGER NOT NULL,
+            cards INTEGER NOT NULL,
+            sets INTEGER NOT NULL,
+            PRIMARY KEY (game, year, cards)
+        ) WITHOUT ROWID;
+        """)
+        for game in games:
+            for trigger_sql in _summary_triggers(game) + _histogram_triggers(game):
+                cursor.execute(trigger_sql)
+
+    if needs_rebuild:
+        rebuild_summary(conn)
+    if needs_histogram:
+        rebuild_histogram(conn)
+    return len(games) == len(GAMES)
+
+
+def rebuild_summary(conn):
+    """
+    Throw away yearly_summary and recompute it from the sets tables.
+
+    Returns:
+        int: number of summary rows written
+    """
+    cursor = conn.cursor()
+    rows = []
+    with conn:
+        for game, t in GAMES.items():
+            if not _table_exists(cursor, t['sets_table']): continue
+            rows.extend((game, year, card_total, set_count) for year, (card_total, set_count) in _expected_rows(cursor, game).items())
+        cursor.execute("DELETE FROM yearly_summary")
+        cursor.executemany("INSERT INTO yearly_summary (game, year, card_total, set_count) VALUES (?, ?, ?, ?)", rows)
+    return len(rows)
+
+
+def rebuild_histogram(conn):
+    """
+    Throw away set_size_histogram and recompute it from the sets tables.
+
+    Returns:
+        int: number of histogram rows written
+    """
+    cursor = conn.cursor()
+    rows = []
+    with conn:
+        for game, t in GAMES.items():
+            if not _table_exists(cursor, t['sets_table']): continue
+            rows.extend((game, year, cards, sets) for (year, cards), sets in _expected_histogram(cursor, game).items())
+        cursor.execute("DELETE FROM set_size_histogram")
+        cursor.executemany("INSERT INTO set_size_histogram (game, year, cards, sets) VALUES (?, ?, ?, ?)", rows)
+    return len(rows)
+
+
+def verify_histogram(conn):
+    """
+    Diff the live set_size_histogram against a from-scratch recomputation.
+
+    Returns:
+        list: (game, (year, cards), live sets or None, expected sets or None) for every mismatch
+    """
+    cursor = conn.cursor()
+    mismatches = []
+    for game, t in GAMES.items():
+        if not _table_exists(cursor, t['sets_table']): continue
+        expected = _expected_histogram(cursor, game)
+        cursor.execute("SELECT year, cards, sets FROM set_size_histogram WHERE game = ?", (game,))
+        live = {(year, cards): sets for year, cards, sets in cursor.fetchall()}
+        for key in sorted(set(expected) | set(live)):
+            if live.get(key) != expected.get(key):
+                mismatches.append((game, key, live.get(key), expected.get(key)))
+    return mismatches
+
+
+def verify_summary(conn):
+    """
+    Diff the live yearly_summary against a from-scratch recomputation.
+
+    Returns:
+        list: (game, year, live (cards, sets) or None, expected (cards, sets) or None) for every mismatch
+    """
+    cursor = conn.cursor()
+    mismatches = []
+    for game, t in GAMES.items():
+        if not _table_exists(cursor, t['sets_table']): continue
+        expected = _expected_rows(cursor, game)
+        cursor.execute("SELECT year, card_total, set_count FROM yearly_summary WHERE game = ?", (game,))
+        live = {year: (card_total, set_count) for year, card_total, set_count in cursor.fetchall()}
+        for year in sorted(set(expected) | set(live)):
+            if live.get(year) != expected.get(year):
+                mismatches.append((game, year, live.get(year), expected.get(year)))
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the trigger-backed yearly_summary and set_size_histogram tables")
+    parser.add_argument("command", choices=["install", "rebuild", "verify"])
+    parser.add_argument("--db", default="tcg_data.db")
+    args = parser.parse_args()
+
+    with open_db(args.db) as conn:
+        install_summary(conn)
+
+        if args.command == "rebuild":
+            print(f"Rebuilt yearly_summary: {rebuild_summary(conn)} rows")
+            print(f"Rebuilt set_size_histogram: {rebuild_histogram(conn)} rows")
+        elif args.command == "verify":
+            for table, mismatches in (("yearly_summary", verify_summary(conn)), ("set_size_histogram", verify_histogram(conn))):
+                for game, key, live, expected in mismatches:
+                    print(f"  {game} {key}: live {live} != expected {expected}")
+                print(f"{table} is {'OUT OF DATE' if mismatches else 'up to date'} ({len(mismatches)} mismatches)")
+        else:
+            print("yearly_summary, set_size_histogram and triggers installed")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,35 +1,36 @@
 # Lance
 
-import requests
+import argparse
+import os
 import sqlite3
 
-def initialize_db(db_name):
-    conn = sqlite3.connect(db_name)
+import requests
+
+from bulk_insert import bulk_insert_sets, format_insert_stats
+from db_manager import connect, open_db
+from http_cache import cached_get_json
+from instrumentation import add_arguments, enable, span
+from json_stream import iter_json_array
+from migrations import migrate
+from set_search import install_search
+from sync_state import initialize_sync_state, timed_sync
+from yearly_summary import install_summary
+
+YUGIOH_URL_ENV = "TCG_YUGIOH_API_URL" # Points every script at another server, e.g. mock_api.py
+YUGIOH_API_URL = os.environ.get(YUGIOH_URL_ENV) or "https://db.ygoprodeck.com/api/v7"
+RUN_PAGE_SIZE = 25 # Sets added per run in the default one-page-per-run mode
+TARGET_SETS = 1006
+
+def initialize_db(db):
+    # Takes an open connection, or a file name to open one (the caller closes it either way)
+    conn = db if isinstance(db, sqlite3.Connection) else connect(db)
     cursor = conn.cursor()
     cursor.execute("PRAGMA foreign_keys = ON;") # Foreign keys need to be explicitly turned on
 
-    # TABLE 1: Yu-Gi-Oh Release Dates (tcg_date_id, tcg_date)
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS "Yu-Gi-Oh Release Dates" (
-        tcg_date_id INTEGER PRIMARY KEY,
-        tcg_date TEXT UNIQUE NOT NULL
-    );
-    """)
-
-    # TABLE 2: Yu-Gi-Oh Sets (set_id, num_of_cards, tcg_date_id)
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS "Yu-Gi-Oh Sets" (
-        set_id INTEGER PRIMARY KEY,
-        set_name TEXT,
-        num_of_cards INTEGER,
-        tcg_date_id INTEGER,
-        FOREIGN KEY (tcg_date_id) 
-            REFERENCES "Yu-Gi-Oh Release Dates" (tcg_date_id)
-        UNIQUE(set_name, tcg_date_id)
-    );
-    """)
-    
-    conn.commit()
+    # Tables, indexes and date columns all come from the versioned migrations
+    migrate(conn)
+    install_summary(conn)
+    install_search(conn)
     return conn
 
 
@@ -40,15 +41,28 @@ def get_current_state(cursor):
     return total_sets
 
 
-def fetch_and_insert_data(conn, page_number, limit):
+def iter_valid_sets(set_infos):
+    # Yields (set_name, tcg_date, num_of_cards) for every complete set
+    for set_info in set_infos:
+        set_name = set_info.get('set_name')
+        tcg_date = set_info.get('tcg_date')
+        num_of_cards = set_info.get('num_of_cards')
+
+        # Filtering out incomplete data
+        if not all([set_name, tcg_date, num_of_cards is not None]): continue
+        yield (set_name, tcg_date, num_of_cards)
+
+
+def fetch_and_insert_data(conn, page_number, limit, base_url=YUGIOH_API_URL, stats=None):
     # Feedback for user
     print(f"-> Fetching page {page_number} (Page Size: 25)...")
     
     # FETCHING DATA
+    # cardsets.php always returns every set, so it goes through the on-disk cache
+    # and unchanged payloads are served locally instead of downloaded and parsed again
     try:
-        response = requests.get(f"https://db.ygoprodeck.com/api/v7/cardsets.php") 
-        response.raise_for_status()
-        all_sets = response.json()
+        all_sets, cache_status = cached_get_json(f"{base_url}/cardsets.php")
+        print(f"-> cardsets.php {cache_status}")
     except requests.exceptions.RequestException as e:
         print(f"Error fetching data from API: {e}")
         return 0, False
@@ -63,57 +77,165 @@ def fetch_and_insert_data(conn, page_number, limit):
         return 0, False
 
     # INSERTING DATA
-    cursor = conn.cursor()
+    records = list(iter_valid_sets(all_sets[start_index:]))
+    sets_inserted_count = bulk_insert_sets(conn, 'yugioh', records, limit, stats)
+
+    return sets_inserted_count, True
+
+
+def collect_to_target(conn, target=TARGET_SETS, base_url=YUGIOH_API_URL):
+    """
+    Store the same sets repeated one-page-per-run invocations would until `target`
+    is met, from a single (cached) cardsets.php download and one transaction.
+
+    Returns:
+        tuple: (sets_inserted, success)
+    """
+    total_sets = get_current_state(conn.cursor())
+    if total_sets >= target:
+        return 0, True
+
+    try:
+        all_sets, cache_status = cached_get_json(f"{base_url}/cardsets.php")
+        print(f"-> cardsets.php {cache_status}")
+    except requests.exceptions.RequestException as e:
+        print(f"Error fetching data from API: {e}")
+        return 0, False
+
+    start_index = (total_sets // RUN_PAGE_SIZE) * RUN_PAGE_SIZE
+    if not all_sets or start_index >= len(all_sets):
+        return 0, False
+
+    records = list(iter_valid_sets(all_sets[start_index:]))
+    return bulk_insert_sets(conn, 'yugioh', records, target - total_sets), True
+
+
+def stream_ingest(conn, base_url=YUGIOH_API_URL, batch_size=500, session=None, stats=None):
+    """
+    Stream cardsets.php straight into the database.
+
+    The body is parsed incrementally while it downloads and every batch_size
+    valid sets are committed in their own transaction, so memory stays flat
+    however big the payload is and inserts start before the download ends.
+    A stats dict, if given, collects the insert rows and seconds (see bulk_insert_sets).
+
+    Returns:
+        tuple: (sets_inserted, success)
+    """
+    http = session or requests
     sets_inserted_count = 0
-    current_index = start_index
-
-    with conn: 
-        while sets_inserted_count < limit and current_index < len(all_sets):
-            set_info = all_sets[current_index]
-            current_index += 1
-            set_name = set_info.get('set_name')
-            tcg_date = set_info.get('tcg_date')
-            num_of_cards = set_info.get('num_of_cards')
-            
-            # Filtering out incomplete data
-            if not all([set_name, tcg_date, num_of_cards is not None]): continue
-
-            cursor.execute("INSERT OR IGNORE INTO 'Yu-Gi-Oh Release Dates' (tcg_date) VALUES (?)", (tcg_date,))
-            cursor.execute("SELECT tcg_date_id FROM 'Yu-Gi-Oh Release Dates' WHERE tcg_date = ?", (tcg_date,))
-            tcg_date_id = cursor.fetchone()[0]
-
-            cursor.execute("""
-            INSERT OR IGNORE INTO "Yu-Gi-Oh Sets" (set_name, num_of_cards, tcg_date_id)
-            VALUES (?, ?, ?)
-            """, (set_name, num_of_cards, tcg_date_id)) 
-            
-            if cursor.rowcount > 0:
-                sets_inserted_count += 1
+    batch = []
 
+    try:
+        with span("yugioh.stream") as s, http.get(f"{base_url}/cardsets.php", stream=True, timeout=60) as response:
+            response.raise_for_status()
+            for record in iter_valid_sets(iter_json_array(response.iter_content(64 * 1024))):
+                batch.append(record)
+                if len(batch) >= batch_size:
+                    sets_inserted_count += bulk_insert_sets(conn, 'yugioh', batch, stats=stats)
+                    s.add(rows=len(batch))
+                    batch = []
+            s.add(rows=len(batch), bytes=response.raw.tell())
+    except (requests.exceptions.RequestException, ValueError) as e:
+        print(f"Error streaming data from API: {e}")
+        return sets_inserted_count, False
+
+    if batch:
+        sets_inserted_count += bulk_insert_sets(conn, 'yugioh', batch, stats=stats)
     return sets_inserted_count, True
 
 
+def delta_sync(conn, base_url=YUGIOH_API_URL):
+    """
+    Sync sets keyed on their upstream set_code instead of the row count.
+
+    cardsets.php has no change timestamps, so the conditional request in the
+    response cache avoids re-downloading an unchanged payload and the per-set
+    content hash decides which rows actually need writing.
+
+    Returns:
+        dict: {'inserted': n, 'updated': n, 'unchanged': n} or None on a fetch error
+    """
+    initialize_sync_state(conn)
+
+    try:
+        all_sets, cache_status = cached_get_json(f"{base_url}/cardsets.php")
+        print(f"-> cardsets.php {cache_status}")
+    except requests.exceptions.RequestException as e:
+        print(f"Error fetching data from API: {e}")
+        return None
+
+    records = []
+    for set_info in all_sets or []:
+        set_code = set_info.get('set_code')
+        set_name = set_info.get('set_name')
+        tcg_date = set_info.get('tcg_date')
+        num_of_cards = set_info.get('num_of_cards')
+
+        # Filtering out incomplete data
+        if not all([set_code, set_name, tcg_date, num_of_cards is not None]): continue
+        records.append((set_code, set_name, tcg_date, num_of_cards))
+
+    return timed_sync(conn, 'yugioh', records)
+
+
 def main():
-    with sqlite3.connect("tcg_data.db") as conn:
+    parser = argparse.ArgumentParser(description="Collect Yu-Gi-Oh TCG sets into tcg_data.db")
+    parser.add_argument("--base-url", default=YUGIOH_API_URL, help=f"API root, e.g. a local stub server (or set {YUGIOH_URL_ENV})")
+    parser.add_argument("--target", type=int, default=TARGET_SETS, help=f"sets to collect in one-page-per-run mode (default {TARGET_SETS})")
+    parser.add_argument("--delta", action="store_true", help="sync every set that changed upstream since the last sync")
+    parser.add_argument("--stream", action="store_true", help="stream every set into the database as cardsets.php downloads")
+    parser.add_argument("--pipeline", action="store_true", help="like --stream, with download, parsing and writing in separate threads")
+    add_arguments(parser)
+    args = parser.parse_args()
+    enable("yugioh_collection", args.metrics, args.profile)
+
+    with open_db("tcg_data.db") as conn:
         cursor = conn.cursor()
-        initialize_db("tcg_data.db") 
+        initialize_db(conn)
         total_sets = get_current_state(cursor) 
 
+        if args.delta:
+            delta_sync(conn, args.base_url)
+            return
+
+        if args.pipeline:
+            from ingest_pipeline import YugiohSource, print_pipeline_report, run_pipeline
+            print_pipeline_report('yugioh', run_pipeline(conn, YugiohSource(args.base_url)))
+            return
+
+        if args.stream:
+            stats = {}
+            sets_inserted, fetch_success = stream_ingest(conn, args.base_url, stats=stats)
+            if stats:
+                print(format_insert_stats('yugioh', stats))
+
+            # Feedback for user
+            print("\n" + "-" * 50)
+            print("Run Summary (Streaming):")
+            print(f"  - Inserted {sets_inserted} new sets!")
+            print(f"  - Total sets in databse: {total_sets + sets_inserted}")
+            print("-" * 50)
+            return
+
         # Feedback for user
-        print(f"DATABASE STATUS: {total_sets} sets currently stored (Target: 1006)")
-        if total_sets >= 1006:
+        print(f"DATABASE STATUS: {total_sets} sets currently stored (Target: {args.target})")
+        if total_sets >= args.target:
             print("\n" + "-" * 50)
             print("Target met. Congratulations!")
             print("-" * 50)
             return
 
-        next_page = (total_sets // 25) + 1
+        next_page = (total_sets // RUN_PAGE_SIZE) + 1
         
         # Preventing insertion of extra rows
-        items_needed = 1006 - total_sets
-        limit = min(25, items_needed)
+        items_needed = args.target - total_sets
+        limit = min(RUN_PAGE_SIZE, items_needed)
 
-        sets_inserted, fetch_success = fetch_and_insert_data(conn, next_page, limit)
+        stats = {}
+        sets_inserted, fetch_success = fetch_and_insert_data(conn, next_page, limit, args.base_url, stats)
+        if stats:
+            print(format_insert_stats('yugioh', stats))
         if sets_inserted > 0:
             new_total_sets = total_sets + sets_inserted
 
@@ -121,7 +243,7 @@ def main():
             print("\n" + "-" * 50)
             print(f"Run Summary (Page {next_page}):")
             print(f"  - Inserted {sets_inserted} new sets!")
-            print(f"  - Total sets in databse: {new_total_sets} out of 1006")
+            print(f"  - Total sets in databse: {new_total_sets} out of {args.target}")
             print("-" * 50)
         elif fetch_success is False and next_page > 1:
             print("\n" + "-" * 50)